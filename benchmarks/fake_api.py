@@ -0,0 +1,163 @@
+"""In-process stand-in for the Hypon Cloud API.
+
+Serves the responses of the WireMock mappings in ``wiremock/mappings`` for any
+system ID, with configurable latency, HTTP error rate and rate of expired
+token (code 50008) responses.
+"""
+from __future__ import annotations
+import argparse
+import http.server
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+MAPPINGS_DIR = Path(__file__).resolve().parent.parent / "wiremock" / "mappings"
+
+PLANT_PATH = re.compile(r"^/plant/[^/]+/(monitor|production2|status)$")
+
+
+def load_responses(mappings_dir: Path = MAPPINGS_DIR) -> dict[str, Any]:
+    """Map "login" and each endpoint name to the JSON body of its mapping."""
+    responses: dict[str, Any] = {}
+    for path in sorted(mappings_dir.glob("*.json")):
+        mapping = json.loads(path.read_text())
+        request = mapping["request"]
+        url = request.get("url") or request.get("urlPathPattern", "")
+        name = url.rstrip("/").rsplit("/", 1)[-1]
+        # Several systems share an endpoint, the first mapping wins
+        responses.setdefault(name, mapping["response"]["jsonBody"])
+    return responses
+
+
+class FakeApiStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.logins = 0
+        self.errors = 0
+        self.expired = 0
+
+    def count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    # Keep-alive, like the real API
+    protocol_version = "HTTP/1.1"
+    server: FakeHyponApi
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if self.path != "/login":
+            self._send(404, {"code": 40400})
+            return
+        self.server.stats.count("logins")
+        self._send(200, self.server.responses["login"])
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        match = PLANT_PATH.match(path)
+        if not match:
+            self._send(404, {"code": 40400})
+            return
+
+        api = self.server
+        api.stats.count("requests")
+        if api.latency:
+            time.sleep(api.latency)
+        if api.random.random() < api.error_rate:
+            api.stats.count("errors")
+            self._send(500, {"code": 50000, "message": "injected error"})
+        elif api.random.random() < api.expired_rate:
+            api.stats.count("expired")
+            self._send(200, {"code": 50008, "message": "User authentication failed"})
+        else:
+            self._send(200, api.responses[match.group(1)])
+
+    def _send(self, status: int, body: Any) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Silence default logging
+        pass
+
+
+class FakeHyponApi(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """Fake Hypon Cloud API listening on localhost.
+
+    Args:
+        latency: Delay added to each plant request, in seconds
+        error_rate: Fraction of plant requests answered with HTTP 500
+        expired_rate: Fraction of plant requests answered with code 50008
+        seed: Seed of the error injection, for reproducible runs
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            error_rate: float = 0.0,
+            expired_rate: float = 0.0,
+            seed: int | None = 0,
+            port: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.expired_rate = expired_rate
+        self.random = random.Random(seed)
+        self.responses = load_responses()
+        self.stats = FakeApiStats()
+        super().__init__(("127.0.0.1", port), _Handler)
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> FakeHyponApi:
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> FakeHyponApi:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Hypon Cloud API")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.05, help="Latency, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of HTTP 500 responses")
+    parser.add_argument("--expired-rate", type=float, default=0.0, help="Fraction of code 50008 responses")
+    args = parser.parse_args()
+
+    api = FakeHyponApi(args.latency, args.error_rate, args.expired_rate, port=args.port)
+    print(f"Fake Hypon API listening on {api.url}")
+    try:
+        api.serve_forever()
+    except KeyboardInterrupt:
+        api.server_close()
+
+
+if __name__ == "__main__":
+    main()
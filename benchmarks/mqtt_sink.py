@@ -0,0 +1,131 @@
+"""In-process MQTT sink.
+
+Accepts MQTT 3.1.1 clients and swallows their messages, counting them. It
+implements just enough of the protocol for the daemon's MqttClient: CONNECT,
+PUBLISH (QoS 0 and 1), PINGREQ and DISCONNECT.
+"""
+from __future__ import annotations
+import socket
+import socketserver
+import threading
+
+CONNECT = 1
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+PINGREQ = 12
+DISCONNECT = 14
+
+
+class SinkStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.bytes = 0
+        self.topics: dict[str, int] = {}
+
+    def record(self, topic: str, size: int) -> None:
+        with self._lock:
+            self.messages += 1
+            self.bytes += size
+            self.topics[topic] = self.topics.get(topic, 0) + 1
+
+    def topic_counts(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self.topics)
+
+
+def _read_exact(sock: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Client closed the connection")
+        data += chunk
+    return data
+
+
+def _read_packet(sock: socket.socket) -> tuple[int, int, bytes]:
+    header = _read_exact(sock, 1)[0]
+    length = 0
+    multiplier = 1
+    while True:
+        byte = _read_exact(sock, 1)[0]
+        length += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+    return header >> 4, header & 0x0F, _read_exact(sock, length)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: MqttSink
+
+    def handle(self):
+        sock = self.request
+        try:
+            while True:
+                packet_type, flags, body = _read_packet(sock)
+                if packet_type == CONNECT:
+                    sock.sendall(bytes([0x20, 2, 0, 0]))
+                elif packet_type == PUBLISH:
+                    self._publish(sock, flags, body)
+                elif packet_type == SUBSCRIBE:
+                    # SUBACK granting QoS 0 to every filter
+                    count = self._count_filters(body[2:])
+                    sock.sendall(bytes([0x90, 2 + count]) + body[:2] + bytes(count))
+                elif packet_type == PINGREQ:
+                    sock.sendall(bytes([0xD0, 0]))
+                elif packet_type == DISCONNECT:
+                    return
+        except (ConnectionError, OSError):
+            return
+
+    def _publish(self, sock: socket.socket, flags: int, body: bytes) -> None:
+        topic_length = int.from_bytes(body[:2], "big")
+        topic = body[2:2 + topic_length].decode()
+        offset = 2 + topic_length
+        qos = (flags >> 1) & 0x03
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+            sock.sendall(bytes([PUBACK << 4, 2]) + packet_id)
+        self.server.stats.record(topic, len(body) - offset)
+
+    @staticmethod
+    def _count_filters(payload: bytes) -> int:
+        count = 0
+        offset = 0
+        while offset < len(payload):
+            offset += 2 + int.from_bytes(payload[offset:offset + 2], "big") + 1
+            count += 1
+        return count
+
+
+class MqttSink(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """MQTT broker stand-in listening on localhost, counting messages."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0):
+        self.stats = SinkStats()
+        super().__init__(("127.0.0.1", port), _Handler)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> MqttSink:
+        threading.Thread(target=self.serve_forever, name="mqtt-sink", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> MqttSink:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Replay of captured API responses through the fetch and publish pipeline.
+
+Answers the requests of the threaded engine from a capture file recorded
+with CAPTURE_PATH, so real traffic is merged and published to the MQTT sink
+without reaching the cloud API. Reports the cycle time, publishes per second,
+CPU time and peak RSS.
+
+Usage:
+    python -m benchmarks.replay_benchmark capture.jsonl.gz --cycles 10 --speed 0
+    python -m benchmarks.replay_benchmark capture.jsonl.gz --profile replay.prof
+"""
+from __future__ import annotations
+import argparse
+import cProfile
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from unittest.mock import patch
+
+from hyponcloud2mqtt.auth import AuthSession
+from hyponcloud2mqtt.capture import read_capture
+from hyponcloud2mqtt.config import Config
+from hyponcloud2mqtt.data_fetcher import DataFetcher, EndpointCache
+from hyponcloud2mqtt.main import Daemon
+from hyponcloud2mqtt.mqtt_client import MqttClient
+from hyponcloud2mqtt.worker_pool import WorkerPool
+
+from .mqtt_sink import MqttSink
+from .run_benchmarks import _data_messages, _peak_rss_mb, _settle
+
+PLANT_URL = re.compile(r"^(.*)/plant/([^/]+)/")
+
+
+@dataclass
+class Result:
+    systems: int
+    cycles: int
+    cycle_avg: float
+    publishes: int
+    publishes_per_sec: float
+    cpu_seconds: float
+    peak_rss_mb: float
+
+
+def captured_systems(path: str) -> tuple[str, list[str]]:
+    """API base URL and system IDs of a capture, in order of appearance."""
+    base_url = ""
+    system_ids: dict[str, None] = {}
+    for entry in read_capture(path):
+        match = PLANT_URL.match(entry.url)
+        if match:
+            base_url = match.group(1)
+            system_ids.setdefault(match.group(2))
+    if not system_ids:
+        raise ValueError(f"No plant responses in {path}")
+    return base_url, list(system_ids)
+
+
+def run(path: str, cycles: int, speed: float, concurrency: int, sink: MqttSink) -> Result:
+    """Run fetch cycles answered from the capture and measure them."""
+    base_url, system_ids = captured_systems(path)
+    config = Config(
+        http_url=base_url,
+        system_ids=system_ids,
+        http_interval=60,
+        mqtt_broker="127.0.0.1",
+        mqtt_port=sink.port,
+        mqtt_topic="replay",
+        mqtt_availability_topic="replay/status",
+        api_username="replay",
+        api_password="replay",
+        health_server_enabled=False,
+        fetch_concurrency=concurrency,
+        replay_path=path,
+        replay_speed=speed)
+
+    mqtt_client = MqttClient(
+        config.mqtt_broker, config.mqtt_port, config.mqtt_topic,
+        config.mqtt_availability_topic, client_id="replay",
+        max_inflight=config.mqtt_max_inflight)
+    if not mqtt_client.connect(timeout=5):
+        raise RuntimeError("Could not connect to the MQTT sink")
+
+    with patch("signal.signal"):
+        daemon = Daemon(config)
+    pool = WorkerPool(config.fetch_concurrency * 3)
+    auth = AuthSession(config, pool_maxsize=max(10, pool.max_workers))
+    fetchers = [
+        DataFetcher(config, system_id, auth, pool, EndpointCache())
+        for system_id in config.system_ids]
+    executor = ThreadPoolExecutor(max_workers=min(concurrency, len(fetchers))) if concurrency > 1 else None
+
+    published_before = _data_messages(sink, config)
+    durations = []
+    cpu_start = time.process_time()
+    start = time.monotonic()
+    try:
+        for _ in range(cycles):
+            cycle_start = time.monotonic()
+            daemon._run_cycle(fetchers, mqtt_client, config, executor)
+            mqtt_client.flush(timeout=30)
+            durations.append(time.monotonic() - cycle_start)
+        elapsed = time.monotonic() - start
+        cpu_seconds = time.process_time() - cpu_start
+        _settle(sink)
+    finally:
+        if executor:
+            executor.shutdown(wait=True)
+        pool.shutdown(wait=True)
+        auth.close()
+        mqtt_client.disconnect()
+
+    publishes = _data_messages(sink, config) - published_before
+    return Result(
+        systems=len(system_ids),
+        cycles=cycles,
+        cycle_avg=sum(durations) / len(durations),
+        publishes=publishes,
+        publishes_per_sec=publishes / elapsed if elapsed else 0.0,
+        cpu_seconds=cpu_seconds,
+        peak_rss_mb=_peak_rss_mb())
+
+
+def main(argv: list[str] | None = None) -> Result:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", help="Capture file recorded with CAPTURE_PATH")
+    parser.add_argument("--cycles", type=int, default=3, help="Fetch cycles to replay")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Captured latency divisor, 0 for no delay")
+    parser.add_argument("--concurrency", type=int, default=10, help="Systems fetched at once")
+    parser.add_argument("--profile", help="Write cProfile statistics to this file")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("hyponcloud2mqtt").setLevel(logging.CRITICAL)
+
+    profiler = cProfile.Profile() if args.profile else None
+    with MqttSink() as sink:
+        if profiler:
+            profiler.enable()
+        result = run(args.capture, args.cycles, args.speed, args.concurrency, sink)
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+
+    print(f"{'systems':>8} {'cycles':>7} {'cycle avg':>10} {'pub/s':>10} {'cpu s':>8} {'rss MB':>8}")
+    print(f"{result.systems:>8} {result.cycles:>7} {result.cycle_avg:>10.3f} "
+          f"{result.publishes_per_sec:>10.1f} {result.cpu_seconds:>8.2f} {result.peak_rss_mb:>8.1f}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
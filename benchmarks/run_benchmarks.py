@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Throughput benchmark of the fetch and publish pipeline.
+
+Runs fetch cycles of the threaded engine against the fake Hypon API and the
+MQTT sink for an increasing number of system IDs, and reports cycle time,
+publishes per second, CPU time and peak RSS.
+
+Usage:
+    python -m benchmarks.run_benchmarks --systems 1 10 100 1000 --latency 0.05
+
+The fake API runs in-process by default, so CPU and RSS include it. Start it
+separately (python -m benchmarks.fake_api) and pass --api-url to only measure
+the daemon.
+"""
+from __future__ import annotations
+import argparse
+import json
+import logging
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from unittest.mock import patch
+
+from hyponcloud2mqtt.auth import AuthSession
+from hyponcloud2mqtt.config import Config
+from hyponcloud2mqtt.data_fetcher import DataFetcher, EndpointCache
+from hyponcloud2mqtt.main import Daemon
+from hyponcloud2mqtt.mqtt_client import MqttClient
+from hyponcloud2mqtt.worker_pool import WorkerPool
+
+from .fake_api import FakeHyponApi
+from .mqtt_sink import MqttSink
+
+
+@dataclass
+class Result:
+    systems: int
+    cycles: int
+    cycle_avg: float
+    cycle_max: float
+    publishes: int
+    publishes_per_sec: float
+    cpu_seconds: float
+    peak_rss_mb: float
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _data_messages(sink: MqttSink, config: Config) -> int:
+    """Messages received on the state topics, availability excluded."""
+    return sum(count for topic, count in sink.stats.topic_counts().items() if topic != config.mqtt_availability_topic)
+
+
+def _settle(sink: MqttSink, quiet: float = 0.2, timeout: float = 5.0) -> None:
+    """Wait until the sink stopped receiving messages."""
+    deadline = time.monotonic() + timeout
+    count = -1
+    while sink.stats.messages != count and time.monotonic() < deadline:
+        count = sink.stats.messages
+        time.sleep(quiet)
+
+
+def run_scenario(
+        systems: int,
+        cycles: int,
+        concurrency: int,
+        api_url: str,
+        sink: MqttSink) -> Result:
+    """Run fetch cycles for the given number of systems and measure them."""
+    config = Config(
+        http_url=api_url,
+        system_ids=[f"bench_{i:04d}" for i in range(systems)],
+        http_interval=60,
+        mqtt_broker="127.0.0.1",
+        mqtt_port=sink.port,
+        mqtt_topic="bench",
+        mqtt_availability_topic="bench/status",
+        api_username="bench",
+        api_password="bench",
+        health_server_enabled=False,
+        fetch_concurrency=concurrency)
+
+    mqtt_client = MqttClient(
+        config.mqtt_broker, config.mqtt_port, config.mqtt_topic,
+        config.mqtt_availability_topic, client_id=f"bench-{systems}",
+        max_inflight=config.mqtt_max_inflight)
+    if not mqtt_client.connect(timeout=5):
+        raise RuntimeError("Could not connect to the MQTT sink")
+
+    # Daemon installs signal handlers, not needed here
+    with patch("signal.signal"):
+        daemon = Daemon(config)
+    pool = WorkerPool(config.fetch_concurrency * 3)
+    auth = AuthSession(config, pool_maxsize=max(10, pool.max_workers))
+    # No endpoint intervals: every endpoint is fetched on every cycle
+    fetchers = [
+        DataFetcher(config, system_id, auth, pool, EndpointCache())
+        for system_id in config.system_ids]
+    executor = ThreadPoolExecutor(max_workers=min(concurrency, systems)) if concurrency > 1 else None
+
+    published_before = _data_messages(sink, config)
+    durations = []
+    cpu_start = time.process_time()
+    start = time.monotonic()
+    try:
+        for _ in range(cycles):
+            cycle_start = time.monotonic()
+            daemon._run_cycle(fetchers, mqtt_client, config, executor)
+            mqtt_client.flush(timeout=30)
+            durations.append(time.monotonic() - cycle_start)
+        elapsed = time.monotonic() - start
+        cpu_seconds = time.process_time() - cpu_start
+        # Flushed messages are written, let the sink read them
+        _settle(sink)
+    finally:
+        if executor:
+            executor.shutdown(wait=True)
+        pool.shutdown(wait=True)
+        mqtt_client.disconnect()
+
+    publishes = _data_messages(sink, config) - published_before
+    return Result(
+        systems=systems,
+        cycles=cycles,
+        cycle_avg=sum(durations) / len(durations),
+        cycle_max=max(durations),
+        publishes=publishes,
+        publishes_per_sec=publishes / elapsed if elapsed else 0.0,
+        cpu_seconds=cpu_seconds,
+        peak_rss_mb=_peak_rss_mb())
+
+
+def _print_table(results: list[Result]) -> None:
+    print(f"{'systems':>8} {'cycle avg':>10} {'cycle max':>10} {'pub/s':>10} {'cpu s':>8} {'rss MB':>8}")
+    for r in results:
+        print(f"{r.systems:>8} {r.cycle_avg:>10.3f} {r.cycle_max:>10.3f} "
+              f"{r.publishes_per_sec:>10.1f} {r.cpu_seconds:>8.2f} {r.peak_rss_mb:>8.1f}")
+
+
+def main(argv: list[str] | None = None) -> list[Result]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--systems", type=int, nargs="+", default=[1, 10, 100, 1000],
+                        help="Numbers of system IDs to benchmark")
+    parser.add_argument("--cycles", type=int, default=3, help="Fetch cycles per scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="Systems fetched at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake API latency, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of HTTP 500 responses")
+    parser.add_argument("--expired-rate", type=float, default=0.0, help="Fraction of code 50008 responses")
+    parser.add_argument("--api-url", help="Use an external fake API instead of an in-process one")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    # Errors are expected when injected, keep the output readable
+    logging.getLogger("hyponcloud2mqtt").setLevel(logging.CRITICAL)
+
+    api = None
+    if not args.api_url:
+        api = FakeHyponApi(args.latency, args.error_rate, args.expired_rate).start()
+    results = []
+    try:
+        with MqttSink() as sink:
+            for systems in args.systems:
+                results.append(run_scenario(
+                    systems, args.cycles, args.concurrency, args.api_url or api.url, sink))
+    finally:
+        if api:
+            api.stop()
+
+    _print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Microbenchmark of the JSON backends on the daemon's hot path.
+
+Times, for every installed backend, the decoding of the three API responses
+of a plant and the encoding of its state payload and discovery payloads, as
+done for each fetch. The "json (legacy)" row is the previous path: text
+decoded by response.json(), payloads encoded with json.dumps then to UTF-8
+by paho.
+
+Usage:
+    python -m benchmarks.serialization_benchmark --iterations 20000
+"""
+from __future__ import annotations
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from hyponcloud2mqtt.config import Config
+from hyponcloud2mqtt.data_merger import merge_api_data
+from hyponcloud2mqtt.discovery import discovery_messages
+from hyponcloud2mqtt.serialization import available_backends
+
+from .fake_api import load_responses
+
+
+@dataclass
+class Result:
+    backend: str
+    decode_us: float
+    encode_us: float
+    speedup: float
+
+
+def _workload() -> tuple[list[bytes], list[Any]]:
+    responses = load_responses()
+    documents = [json.dumps(responses[name]).encode() for name in ("monitor", "production2", "status")]
+    state = merge_api_data(responses["monitor"], responses["production2"], responses["status"])
+    config = Config(
+        http_url="http://127.0.0.1", system_ids=["1"], http_interval=60,
+        mqtt_broker="localhost", mqtt_port=1883, mqtt_topic="hypon",
+        mqtt_availability_topic="hypon/status")
+    return documents, [state, *discovery_messages(config, "1").values()]
+
+
+def _time(function: Callable[[], Any], iterations: int) -> float:
+    """Microseconds per call, best of 3 runs."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return best / iterations * 1e6
+
+
+def run(iterations: int) -> list[Result]:
+    documents, payloads = _workload()
+    codecs: dict[str, tuple[Callable[[bytes], Any], Callable[[Any], Any]]] = {
+        "json (legacy)": (
+            lambda document: json.loads(document.decode()), lambda data: json.dumps(data).encode()),
+    }
+    for backend in available_backends().values():
+        codecs[backend.name] = (backend.loads, backend.dumps)
+
+    results = []
+    for name, (loads, dumps) in codecs.items():
+        decode = _time(lambda: [loads(document) for document in documents], iterations)
+        encode = _time(lambda: [dumps(payload) for payload in payloads], iterations)
+        results.append(Result(name, decode, encode, 0.0))
+
+    baseline = results[0].decode_us + results[0].encode_us
+    for result in results:
+        result.speedup = baseline / (result.decode_us + result.encode_us)
+    return results
+
+
+def main(argv: list[str] | None = None) -> list[Result]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000, help="Plant fetches per timing")
+    args = parser.parse_args(argv)
+
+    results = run(args.iterations)
+    print(f"{'backend':>14} {'decode us':>10} {'encode us':>10} {'speedup':>8}")
+    for result in results:
+        print(f"{result.backend:>14} {result.decode_us:>10.2f} {result.encode_us:>10.2f} {result.speedup:>7.2f}x")
+    return results
+
+
+if __name__ == "__main__":
+    main()
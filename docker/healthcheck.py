@@ -3,6 +3,7 @@
 Simple health check script for hyponcloud2mqtt daemon.
 Checks if the main process is running and responsive by querying the internal HTTP server.
 """
+import os
 import sys
 import urllib.request
 import urllib.error
@@ -10,8 +11,9 @@ import urllib.error
 
 def main():
     try:
-        # Query the internal health endpoint
-        with urllib.request.urlopen("http://localhost:8080/health", timeout=2) as response:
+        # Query the internal health endpoint, on the port of the daemon
+        port = os.getenv("HEALTH_PORT", "8080")
+        with urllib.request.urlopen(f"http://localhost:{port}/health", timeout=2) as response:
             if response.status == 200:
                 sys.exit(0)
             else:
@@ -0,0 +1,276 @@
+"""asyncio fetch engine.
+
+Runs the HTTP requests of every system on a single event loop with aiohttp,
+so hundreds of plants only need a handful of threads. Login and token refresh
+are rare and stay on the shared, blocking AuthSession, run off the loop.
+Results are published by one dedicated thread, in the order they arrive.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from .auth import AuthSession
+from .data_fetcher import EndpointCache
+from .data_merger import ExtractionPlan, compile_fields, merge_api_data
+from .http_client import (
+    AuthenticationError, endpoint_name, parse_api_response, record_outcome, record_request)
+from . import metrics, serialization
+from .scheduler import Scheduler
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - depends on the installed extras
+    aiohttp = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncFetcher:
+    """asyncio counterpart of DataFetcher for a single system."""
+
+    def __init__(
+            self,
+            config,
+            system_id: str,
+            auth: AuthSession,
+            http: Any,
+            endpoints: EndpointCache | None = None,
+            plan: ExtractionPlan | None = None):
+        self.config = config
+        self.system_id = system_id
+        self.auth = auth
+        self.http = http
+        self.endpoints = endpoints if endpoints is not None else EndpointCache()
+        self.plan = plan if plan is not None else compile_fields(config.extra_fields)
+
+        # Construct plant-specific base URL
+        plant_base_url = f"{config.http_url.rstrip('/')}/plant/{system_id}"
+        self.urls = {
+            "monitor": f"{plant_base_url}/monitor?refresh=true",
+            "production": f"{plant_base_url}/production2",
+            "status": f"{plant_base_url}/status",
+        }
+
+    async def _fetch(self, url: str, token: str | None) -> Any | None:
+        endpoint = endpoint_name(url)
+        breaker = self.auth.breakers.get(endpoint)
+        if breaker is not None and not breaker.allow():
+            logger.debug(f"Circuit breaker for {endpoint} is open, skipping {url}")
+            return None
+        if self.auth.rate_limiter is not None:
+            wait = self.auth.rate_limiter.reserve()
+            if wait:
+                await asyncio.sleep(wait)
+
+        start = time.monotonic()
+        result = "error"
+        try:
+            data, result = await self._fetch_data(url, token)
+            return data
+        except AuthenticationError:
+            result = "auth_expired"
+            raise
+        finally:
+            record_request(endpoint, start, result)
+            record_outcome(breaker, result)
+
+    async def _fetch_data(self, url: str, token: str | None) -> tuple[Any | None, str]:
+        """Fetch an endpoint, returning the data and the result as HttpClient does."""
+        logger.debug(f"Fetching data from {url}")
+        headers = {"Authorization": f"Bearer {token}"} if token else None
+        try:
+            data = await self._get_json(url, headers)
+        except aiohttp.ClientConnectorCertificateError as e:
+            logger.error(
+                f"SSL certificate verification failed for {url}: {e}")
+            logger.error(
+                "Consider setting VERIFY_SSL=false if using self-signed certificates")
+            return None, "error"
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"Error fetching data from {url}: {e!r}")
+            # A client error rejects this plant, not the endpoint
+            return None, "api_error" if e.status < 500 else "error"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error fetching data from {url}: {e!r}")
+            return None, "error"
+        except ValueError as e:
+            logger.error(f"Error parsing JSON response: {e}")
+            return None, "api_error"
+
+        data = parse_api_response(data, url)
+        return data, "success" if data is not None else "api_error"
+
+    async def _get_json(self, url: str, headers: dict | None) -> Any:
+        """GET a JSON document, retrying when the API cannot be reached."""
+        attempt = 0
+        while True:
+            try:
+                start = time.monotonic()
+                async with self.http.get(url, headers=headers) as response:
+                    logger.debug(
+                        f"Response received from {url}, status code: {response.status}")
+                    body = await response.read()
+                    if self.auth.capture is not None:
+                        self.auth.capture.record(url, response.status, time.monotonic() - start, body)
+                    response.raise_for_status()
+                    return serialization.loads(body)
+            except aiohttp.ClientConnectorCertificateError:
+                raise
+            except aiohttp.ClientConnectorError as e:
+                if attempt >= self.config.http_retries:
+                    raise
+                delay = self.config.http_retry_backoff * 2 ** attempt
+                attempt += 1
+                logger.debug(f"Could not connect to {url} ({e!r}), retrying in {delay} seconds")
+                await asyncio.sleep(delay)
+
+    async def fetch_all(self) -> dict | None:
+        due = self.endpoints.due()
+        results: list[Any] = [None] * len(due)
+
+        # Retry loop for authentication handling
+        max_retries = 2
+        for attempt in range(max_retries):
+            token = self.auth.token
+            # Fetch the due endpoints concurrently on the event loop
+            results = list(await asyncio.gather(
+                *(self._fetch(self.urls[name], token) for name in due),
+                return_exceptions=True))
+
+            if not any(isinstance(r, AuthenticationError) for r in results):
+                break
+
+            results = [None] * len(due)
+            logger.warning(
+                f"Authentication failed during fetch (attempt {attempt + 1}/{max_retries})")
+            if attempt < max_retries - 1:
+                # Login is blocking and rare: run it off the event loop
+                if await asyncio.to_thread(self.auth.refresh, token):
+                    continue  # Retry the loop
+                break  # Stop retrying
+            else:
+                logger.error("Max retries reached for authentication")
+
+        for i, result in enumerate(results):
+            if isinstance(result, BaseException):
+                logger.error(f"Unexpected error during fetch: {result}")
+                results[i] = None
+
+        # Endpoints that were not due use their last known response
+        monitor_data, production_data, status_data = self.endpoints.resolve(
+            dict(zip(due, results)))
+
+        # Check if all requests failed
+        if monitor_data is None and production_data is None and status_data is None:
+            logger.warning("All API requests failed or returned None")
+            return None
+
+        # Merge data
+        return merge_api_data(monitor_data, production_data, status_data, self.plan)
+
+
+class AsyncEngine:
+    """Fetch loop running every system on one asyncio event loop.
+
+    Args:
+        config: Daemon configuration
+        auth: Shared account session providing the Bearer token
+        handle_result: Called with (system_id, merged_data) on a single
+            publishing thread, as publishing and history writes may block
+        should_run: Returns False once the daemon is stopping
+        ensure_connected: Blocking MQTT (re)connection, run off the loop;
+            returns False if the daemon stopped while reconnecting
+        scheduler: Timeline deciding when each system is fetched
+        endpoint_cache_factory: Creates the per-endpoint cache of a system
+        heartbeat: Called after each system and while sleeping
+    """
+
+    def __init__(
+            self,
+            config,
+            auth: AuthSession,
+            handle_result: Callable[[str, dict | None], None],
+            should_run: Callable[[], bool],
+            ensure_connected: Callable[[], bool],
+            scheduler: Scheduler,
+            endpoint_cache_factory: Callable[[], EndpointCache] = EndpointCache,
+            heartbeat: Callable[[], None] = lambda: None):
+        if aiohttp is None:
+            raise RuntimeError(
+                "engine 'asyncio' requires aiohttp, install hyponcloud2mqtt[async]")
+        self.config = config
+        self.auth = auth
+        self.handle_result = handle_result
+        self.should_run = should_run
+        self.ensure_connected = ensure_connected
+        self.scheduler = scheduler
+        self.endpoint_cache_factory = endpoint_cache_factory
+        self.heartbeat = heartbeat
+
+    def run(self) -> None:
+        asyncio.run(self._main())
+
+    async def _main(self) -> None:
+        config = self.config
+        connector = aiohttp.TCPConnector(
+            limit=config.http_pool_maxsize or max(10, config.fetch_concurrency * 3),
+            ssl=True if config.verify_ssl else False)
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=config.http_connect_timeout, sock_read=config.http_read_timeout)
+        if config.http2:
+            logger.warning("aiohttp only speaks HTTP/1.1, http2 is ignored by the asyncio engine")
+
+        plan = compile_fields(config.extra_fields)
+        # Publishing blocks when the MQTT window is full: one thread, off the loop
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="async-publish") as publisher:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+                fetchers = {
+                    system_id: AsyncFetcher(
+                        config, system_id, self.auth, http, self.endpoint_cache_factory(), plan)
+                    for system_id in config.system_ids}
+                semaphore = asyncio.Semaphore(config.fetch_concurrency)
+                logger.info(
+                    f"Starting asyncio engine for {len(fetchers)} systems, "
+                    f"fetching every {self.scheduler.interval} seconds")
+
+                while self.should_run():
+                    # Check MQTT connection before fetching
+                    if not await asyncio.to_thread(self.ensure_connected):
+                        break
+
+                    due = self.scheduler.due()
+                    if due:
+                        logger.debug(
+                            f"Starting fetch cycle for {len(due)} systems (interval: {self.scheduler.interval}s)")
+                        start = time.monotonic()
+                        await asyncio.gather(
+                            *(self._process(fetchers[system_id], semaphore, publisher) for system_id in due))
+                        metrics.CYCLE_DURATION.observe(time.monotonic() - start)
+
+                    await self._sleep_until(self.scheduler.next_deadline())
+
+    async def _sleep_until(self, deadline: float) -> None:
+        # Sleep in short intervals to respond to signals faster
+        while self.should_run():
+            self.heartbeat()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(1.0, remaining))
+
+    async def _process(
+            self, fetcher: AsyncFetcher, semaphore: asyncio.Semaphore, publisher: ThreadPoolExecutor) -> None:
+        async with semaphore:
+            if not self.should_run():
+                return
+            logger.debug(f"Fetching data for system_id: {fetcher.system_id}")
+            start = time.monotonic()
+            merged_data = await fetcher.fetch_all()
+            metrics.SYSTEM_FETCH_DURATION.set(time.monotonic() - start, system_id=fetcher.system_id)
+        await asyncio.get_running_loop().run_in_executor(
+            publisher, self.handle_result, fetcher.system_id, merged_data)
+        # Long cycles of many systems must not look stuck
+        self.heartbeat()
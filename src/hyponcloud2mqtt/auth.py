@@ -0,0 +1,362 @@
+from __future__ import annotations
+import base64
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import requests
+from . import serialization
+from .capture import CaptureWriter
+from .http_client import record_request
+from .resilience import CircuitBreakers, RateLimiter
+from .transport import build_adapter
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# Tokens rejected younger than this were revoked rather than expired
+MIN_LEARNED_LIFETIME = 60.0
+
+
+def _jwt_expiry(token: str) -> float | None:
+    """Return the "exp" claim of a JWT token, None for opaque tokens."""
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4)))
+    except ValueError:
+        return None
+    expiry = claims.get("exp") if isinstance(claims, dict) else None
+    return float(expiry) if isinstance(expiry, (int, float)) else None
+
+
+class AuthSession:
+    """Account-level HTTP session shared by every DataFetcher.
+
+    Holds a single pooled keep-alive ``requests.Session`` and the Bearer token
+    of the account, so N system IDs only need one login and one token refresh.
+
+    The token lifetime is taken from the configuration, from the expiry of a
+    JWT token, or learned from the age of the token when the API rejects it;
+    rejections of younger tokens than MIN_LEARNED_LIFETIME are not learned.
+    Once known, a background thread re-logs in shortly before expiry, so
+    requests do not fail with code 50008 first. The token may be cached on
+    disk, readable by the owner only, to skip the login on restart.
+
+    Processes sharing the cache, such as the workers of the supervisor, log
+    in one at a time behind a lock file next to it, and reuse the token
+    obtained by another process instead of logging in again.
+    """
+
+    def __init__(self, config, pool_maxsize: int = 10):
+        self.config = config
+        self.base_url = config.http_url.rstrip('/')
+        self.timeout = config.http_timeout
+        self.session = requests.Session()
+        self.session.verify = self.config.verify_ssl
+        adapter = build_adapter(config, config.http_pool_maxsize or pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.token: str | None = None
+        # time.monotonic() of the last successful login
+        self.token_issued_at: float | None = None
+        # Unix times of the login and of the expected expiry of the token
+        self.token_issued_wall: float | None = None
+        self.token_expires_at: float | None = None
+        # Lifetime observed when the API last rejected a token
+        self.learned_lifetime: float | None = None
+        self._lock = threading.Lock()
+        self._refresher: threading.Thread | None = None
+        self._stop_refresher = threading.Event()
+        # Shared by every request to the API, including logins
+        self.rate_limiter = (
+            RateLimiter(config.api_rate_limit, config.api_rate_burst)
+            if config.api_rate_limit else None)
+        self.breakers = CircuitBreakers(
+            config.circuit_breaker_threshold, config.circuit_breaker_reset_timeout)
+        # Records the plant responses, closed by the daemon on shutdown
+        self.capture = CaptureWriter(config.capture_path) if config.capture_path else None
+
+    @property
+    def has_credentials(self) -> bool:
+        return bool(self.config.api_username and self.config.api_password)
+
+    def login(self) -> str | None:
+        """
+        Login to the API and retrieve Bearer token.
+        """
+        if not self.has_credentials:
+            logger.warning("No API credentials provided, skipping login")
+            return None
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        start = time.monotonic()
+        token = self._login()
+        record_request("login", start, "success" if token else "error")
+        return token
+
+    def _login(self) -> str | None:
+        login_url = f"{self.base_url}/login"
+        logger.info(f"Attempting login to {login_url}")
+        payload = {
+            "username": self.config.api_username,
+            "password": self.config.api_password,
+            "oem": None
+        }
+
+        try:
+            response = self.session.post(login_url, json=payload, timeout=self.timeout)
+            logger.debug(
+                f"Login request sent, status code: {response.status_code}")
+            response.raise_for_status()
+            data = response.json()
+
+            if not isinstance(data, dict):
+                logger.error(f"Login response is not a JSON object: {data}")
+                return None
+
+            code = data.get("code")
+            if code != 20000:
+                logger.error(f"Login failed with code {code}")
+                return None
+
+            token = data.get("data", {}).get("token")
+            if not token:
+                logger.error("No token in login response")
+                return None
+
+            logger.info("Successfully logged in and retrieved token")
+            return token
+
+        except requests.RequestException as e:
+            logger.error(f"Error during login: {e}")
+            return None
+        except ValueError as e:
+            logger.error(f"Error parsing login response: {e}")
+            return None
+
+    def _set_token(self, token: str, issued_at: float | None = None, persist: bool = True) -> None:
+        now = time.time()
+        issued_at = now if issued_at is None else issued_at
+        self.token = token
+        self.token_issued_at = time.monotonic() - (now - issued_at)
+        self.token_issued_wall = issued_at
+        self.token_expires_at = self._expiry(token, issued_at)
+        self.session.headers.update({"Authorization": f"Bearer {token}"})
+        if persist:
+            self._save_cache()
+
+    def _expiry(self, token: str, issued_at: float) -> float | None:
+        if self.config.token_lifetime:
+            return issued_at + self.config.token_lifetime
+        expiry = _jwt_expiry(token)
+        if expiry is not None:
+            return expiry
+        if self.learned_lifetime:
+            return issued_at + self.learned_lifetime
+        return None
+
+    def _refresh_margin(self) -> float:
+        """Seconds before expiry at which the token is refreshed."""
+        if self.token_expires_at is None or self.token_issued_wall is None:
+            return 0.0
+        lifetime = self.token_expires_at - self.token_issued_wall
+        return min(float(self.config.token_refresh_margin), lifetime / 2)
+
+    def _load_cache(self) -> bool:
+        """Restore a cached token of the same account, unless it expires soon."""
+        path = self.config.token_cache_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            if os.stat(path).st_mode & 0o077:
+                logger.warning(f"Token cache {path} is readable by other users, restricting it")
+                os.chmod(path, 0o600)
+            with open(path) as f:
+                cached = json.load(f)
+            if (cached.get("url"), cached.get("username")) != (self.base_url, self.config.api_username):
+                logger.info("Token cache belongs to another account, ignoring it")
+                return False
+            learned_lifetime = cached.get("learned_lifetime")
+            if isinstance(learned_lifetime, (int, float)) and learned_lifetime >= MIN_LEARNED_LIFETIME:
+                self.learned_lifetime = learned_lifetime
+            self._set_token(cached["token"], cached["issued_at"], persist=False)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Could not read token cache {path}: {e}")
+            return False
+
+        if self.token_expires_at is not None and time.time() >= self.token_expires_at - self._refresh_margin():
+            logger.info("Cached token expires soon, logging in again")
+            return False
+        logger.info("Using cached API token")
+        return True
+
+    def _save_cache(self) -> None:
+        path = self.config.token_cache_path
+        if not path:
+            return
+        cached = {
+            "url": self.base_url,
+            "username": self.config.api_username,
+            "token": self.token,
+            "issued_at": self.token_issued_wall,
+            "learned_lifetime": self.learned_lifetime,
+        }
+        try:
+            serialization.write_json_file(path, cached)
+        except OSError as e:
+            logger.warning(f"Could not write token cache {path}: {e}")
+
+    @contextlib.contextmanager
+    def _cache_lock(self):
+        """Hold the lock of the token cache, shared by every process using it."""
+        path = self.config.token_cache_path
+        if not path or fcntl is None:
+            yield
+            return
+        try:
+            lock_file = open(f"{path}.lock", "a")
+        except OSError as e:
+            logger.warning(f"Could not open token cache lock {path}.lock: {e}")
+            yield
+            return
+        with lock_file:
+            # Released when the file is closed
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _load_newer_cache(self, stale_token: str | None) -> bool:
+        """Adopt a valid token cached by another process in place of stale_token."""
+        if self._load_cache() and self.token != stale_token:
+            logger.info("Token already refreshed by another process")
+            return True
+        return False
+
+    def close(self) -> None:
+        """Close the HTTP connections and the capture file."""
+        self.session.close()
+        if self.capture is not None:
+            self.capture.close()
+
+    def ensure_logged_in(self) -> None:
+        """Login once for the whole account, exit if credentials are rejected."""
+        with self._lock, self._cache_lock():
+            if self.token is not None or not self.has_credentials:
+                return
+            if self._load_cache():
+                return
+
+            token = self.login()
+            if not token:
+                logger.critical("Failed to retrieve Bearer token")
+                sys.exit(1)
+            self._set_token(token)
+
+    def try_login(self) -> bool:
+        """Login now, bypassing the token cache, without exiting on failure.
+
+        Returns:
+            True if the credentials were accepted
+        """
+        with self._lock:
+            token = self.login()
+            if not token:
+                return False
+            self._set_token(token)
+            return True
+
+    def refresh(self, stale_token: str | None) -> bool:
+        """Refresh the token after a 50008 response.
+
+        Concurrent callers holding the same stale token trigger a single login:
+        the first one re-logs in, the others reuse the token it obtained.
+
+        Returns:
+            True if a fresh token is available, False otherwise
+        """
+        with self._lock, self._cache_lock():
+            if self.token is not None and self.token != stale_token:
+                logger.debug("Token already refreshed by another fetcher")
+                return True
+
+            if self.token is not None and self.token_issued_wall is not None:
+                self._learn_lifetime(self.token, time.time() - self.token_issued_wall)
+            if self._load_newer_cache(stale_token):
+                return True
+
+            logger.info("Attempting to re-login...")
+            new_token = self.login()
+            if not new_token:
+                logger.error("Re-authentication failed")
+                return False
+
+            logger.info("Successfully re-authenticated, updating session token")
+            self._set_token(new_token)
+            return True
+
+    def _learn_lifetime(self, token: str, age: float) -> None:
+        """Learn the token lifetime from the age of a rejected token."""
+        if self.config.token_lifetime or _jwt_expiry(token) is not None:
+            # A known lifetime is never shrunk by an early rejection
+            logger.info(f"Token rejected after {age:.0f} seconds, before its expiry")
+        elif age < MIN_LEARNED_LIFETIME:
+            logger.warning(f"Token rejected after {age:.0f} seconds, probably revoked, lifetime not learned")
+        else:
+            self.learned_lifetime = age
+            logger.info(f"Token rejected after {age:.0f} seconds")
+
+    def refresh_if_expiring(self, now: float | None = None) -> bool:
+        """Re-login when the token is about to expire.
+
+        Returns:
+            True if the token was refreshed
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.token is None or self.token_expires_at is None:
+                return False
+            if now < self.token_expires_at - self._refresh_margin():
+                return False
+
+            with self._cache_lock():
+                if self._load_newer_cache(self.token):
+                    return True
+                logger.info("Token expires soon, refreshing it")
+                token = self.login()
+                if not token:
+                    logger.warning("Proactive token refresh failed, keeping the current token")
+                    return False
+                self._set_token(token)
+                return True
+
+    def start_refresher(self, interval: float = 30.0) -> None:
+        """Check the token expiry every interval seconds in a background thread."""
+        if self._refresher is not None or not self.has_credentials:
+            return
+        self._stop_refresher.clear()
+        self._refresher = threading.Thread(
+            target=self._refresh_loop, args=(interval,), name="token-refresh", daemon=True)
+        self._refresher.start()
+
+    def stop_refresher(self) -> None:
+        if self._refresher is None:
+            return
+        self._stop_refresher.set()
+        self._refresher.join()
+        self._refresher = None
+
+    def _refresh_loop(self, interval: float) -> None:
+        while not self._stop_refresher.wait(interval):
+            try:
+                self.refresh_if_expiring()
+            except Exception as e:
+                logger.error(f"Unexpected error during token refresh: {e}")
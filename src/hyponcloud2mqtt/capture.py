@@ -0,0 +1,191 @@
+"""Capture of the API responses, and their replay.
+
+With ``capture_path`` set, every plant response received from the cloud (URL,
+status, latency and raw body) is appended to a gzip compressed JSON lines
+file. With ``replay_path`` set, the requests session answers from such a
+capture instead of the cloud, with the captured latency or faster: real
+traffic for profiling the merge and publish pipeline without hitting the API,
+and a regression corpus for new inverter models.
+
+Login responses are not captured, so captures hold no token. Worker processes
+each write their own file, suffixed with their index; a capture path naming
+none of them replays all the per-worker files.
+"""
+from __future__ import annotations
+import glob
+import gzip
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Iterable, Iterator, NamedTuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# Served to the login requests of a replayed session
+REPLAY_LOGIN = b'{"code": 20000, "data": {"token": "replay"}, "message": "Success"}'
+_NOT_FOUND = b'{"code": 40400, "message": "Not captured"}'
+
+
+class CaptureEntry(NamedTuple):
+    # Unix time the response was received
+    t: float
+    url: str
+    status: int
+    # Seconds between the request and the response
+    elapsed: float
+    body: bytes
+
+
+class CaptureWriter:
+    """Appends responses to a gzip compressed JSON lines capture file.
+
+    Writes of concurrent fetchers are serialized; each run appends a new gzip
+    member, read back as a single stream.
+    """
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        logger.info(f"Capturing API responses to {path}")
+
+    def record(self, url: str, status: int, elapsed: float, body: bytes) -> None:
+        line = json.dumps({
+            "t": round(self._clock(), 3),
+            "url": url,
+            "status": status,
+            "elapsed": round(elapsed, 4),
+            "body": body.decode("utf-8", "replace"),
+        })
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def capture_files(path: str) -> list[str]:
+    """The capture file, or the per-worker files path.0, path.1... without it."""
+    if os.path.exists(path):
+        return [path]
+    files = [
+        name for name in glob.glob(f"{glob.escape(path)}.*")
+        if re.fullmatch(r"\d+", name[len(path) + 1:])]
+    return sorted(files, key=lambda name: int(name[len(path) + 1:])) or [path]
+
+
+def _read_file(path: str) -> Iterator[CaptureEntry]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                yield CaptureEntry(
+                    entry["t"], entry["url"], entry["status"], entry["elapsed"], entry["body"].encode())
+
+
+def read_capture(path: str) -> Iterator[CaptureEntry]:
+    """Entries of a capture, in capture order across the per-worker files."""
+    files = capture_files(path)
+    if len(files) == 1:
+        return _read_file(files[0])
+    return heapq.merge(*(_read_file(name) for name in files), key=lambda entry: entry.t)
+
+
+def replay(
+        entries: Iterable[CaptureEntry],
+        speed: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep) -> Iterator[CaptureEntry]:
+    """Yield entries on the timeline of the capture, speed times faster.
+
+    A speed of 0 yields them as fast as possible.
+    """
+    first = None
+    start = clock()
+    for entry in entries:
+        if first is None:
+            first = entry.t
+        if speed:
+            delay = (entry.t - first) / speed - (clock() - start)
+            if delay > 0:
+                sleep(delay)
+        yield entry
+
+
+def _replay_key(url: str) -> str:
+    # The host is ignored: a capture can be replayed against any http_url
+    parsed = urlparse(url)
+    return f"{parsed.path}?{parsed.query}" if parsed.query else parsed.path
+
+
+class ReplayAdapter(BaseAdapter):
+    """requests adapter answering from a capture instead of the cloud API.
+
+    The captured responses of a URL are served in order, starting over once
+    exhausted, each delayed by its captured latency divided by speed (0 for
+    no delay). Logins always succeed; URLs absent from the capture get a 404.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            speed: float = 1.0,
+            sleep: Callable[[float], None] = time.sleep):
+        super().__init__()
+        self.speed = speed
+        self._sleep = sleep
+        self._responses: dict[str, list[CaptureEntry]] = {}
+        for entry in read_capture(path):
+            self._responses.setdefault(_replay_key(entry.url), []).append(entry)
+        self._served: dict[str, int] = {}
+        self._lock = threading.Lock()
+        logger.info(
+            f"Replaying {sum(len(entries) for entries in self._responses.values())} responses "
+            f"of {len(self._responses)} URLs from {path}")
+
+    def _next(self, key: str) -> CaptureEntry | None:
+        entries = self._responses.get(key)
+        if not entries:
+            return None
+        with self._lock:
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+        return entries[index % len(entries)]
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        key = _replay_key(request.url)
+        if request.method == "POST" and key.endswith("/login"):
+            return self._build_response(request, 200, REPLAY_LOGIN)
+        entry = self._next(key)
+        if entry is None:
+            logger.warning(f"No captured response for {request.url}")
+            return self._build_response(request, 404, _NOT_FOUND)
+        if self.speed:
+            self._sleep(entry.elapsed / self.speed)
+        return self._build_response(request, entry.status, entry.body)
+
+    @staticmethod
+    def _build_response(request, status: int, body: bytes) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+        response._content = body
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self) -> None:
+        pass
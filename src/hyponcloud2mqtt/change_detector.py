@@ -0,0 +1,105 @@
+from __future__ import annotations
+import logging
+import threading
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeDetector:
+    """Decide whether a system's merged payload is worth publishing.
+
+    Keeps the last published payload of each system and reports a change when
+    a field appears, disappears or moves by more than its deadband (exact
+    comparison for fields without one).
+
+    Args:
+        deadbands: Absolute tolerance per numeric field, e.g. {"power_pv": 5}
+        full_refresh_cycles: Publish anyway after this many consecutive
+            skipped cycles, so retained and Home Assistant state stay
+            correct; 0 disables the forced refresh
+    """
+
+    def __init__(
+            self,
+            deadbands: dict[str, float] | None = None,
+            full_refresh_cycles: int = 10):
+        self.deadbands = deadbands or {}
+        self.full_refresh_cycles = full_refresh_cycles
+        self._last: dict[str, dict[str, Any]] = {}
+        self._skipped: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def should_publish(self, system_id: str, payload: dict[str, Any]) -> bool:
+        """Return True if the payload must be published, and remember it."""
+        with self._lock:
+            last = self._last.get(system_id)
+            skipped = self._skipped.get(system_id, 0)
+            refresh_due = 0 < self.full_refresh_cycles <= skipped
+
+            if last is None or refresh_due or self._changed(last, payload):
+                self._last[system_id] = dict(payload)
+                self._skipped[system_id] = 0
+                return True
+
+            self._skipped[system_id] = skipped + 1
+            return False
+
+    def forget(self, system_id: str | None = None) -> None:
+        """Drop the last published payload of a system (all if None)."""
+        with self._lock:
+            if system_id is None:
+                self._last.clear()
+                self._skipped.clear()
+            else:
+                self._last.pop(system_id, None)
+                self._skipped.pop(system_id, None)
+
+    def _changed(self, last: dict[str, Any], payload: dict[str, Any]) -> bool:
+        if last.keys() != payload.keys():
+            return True
+
+        for key, value in payload.items():
+            previous = last[key]
+            deadband = self.deadbands.get(key)
+            if deadband is not None and _is_number(value) and _is_number(previous):
+                if abs(value - previous) > deadband:
+                    return True
+            elif value != previous:
+                return True
+        return False
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class FieldTracker:
+    """Last published value of every field, for per-field topics.
+
+    Unlike ChangeDetector, which works on whole payloads, it reports which
+    individual fields changed so only those are published.
+    """
+
+    def __init__(self):
+        self._last: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def changed_fields(self, system_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+        """Return the fields whose value changed, and remember them."""
+        with self._lock:
+            last = self._last.setdefault(system_id, {})
+            changed = {key: value for key, value in payload.items()
+                       if key not in last or last[key] != value}
+            last.update(changed)
+            return changed
+
+    def forget(self, system_id: str | None = None, key: str | None = None) -> None:
+        """Drop the last published value of a field, a system or everything."""
+        with self._lock:
+            if system_id is None:
+                self._last.clear()
+            elif key is None:
+                self._last.pop(system_id, None)
+            else:
+                self._last.get(system_id, {}).pop(key, None)
@@ -1,11 +1,17 @@
 from __future__ import annotations
 import os
 import logging
-from dataclasses import dataclass
-from typing import List, Any
+from dataclasses import dataclass, field
+from typing import Dict, List, Any
+from .data_merger import compile_fields
+from .serialization import BACKEND_NAMES
 
 logger = logging.getLogger(__name__)
 
+# Systems in flight by default on the asyncio engine, which is meant for large
+# fleets; the threads engine fetches one system at a time by default
+ASYNC_FETCH_CONCURRENCY = 50
+
 
 @dataclass
 class Config:
@@ -27,9 +33,88 @@ class Config:
     dry_run: bool = False
     ha_discovery_enabled: bool = True
     ha_discovery_prefix: str = "homeassistant"
+    ha_discovery_state_path: str | None = None
+    ha_discovery_rate: float = 50.0
+    ha_discovery_spread: float = 5.0
     device_name: str = "hyponcloud2mqtt"
     health_server_enabled: bool = True
+    health_host: str = "0.0.0.0"
+    health_port: int = 8080
     mqtt_client_id: str = "hyponcloud2mqtt"
+    fetch_concurrency: int = 1
+    worker_pool_size: int | None = None
+    engine: str = "threads"
+    mqtt_max_inflight: int = 100
+    schedule_jitter: float = 0.0
+    schedule_phase_spread: bool = False
+    schedule_overrun: str = "skip"
+    monitor_interval: int | None = None
+    production_interval: int | None = None
+    status_interval: int | None = None
+    delta_publishing: bool = False
+    delta_deadbands: Dict[str, float] = field(default_factory=dict)
+    delta_full_refresh_cycles: int = 10
+    mqtt_per_field_topics: bool = False
+    outbox_path: str | None = None
+    outbox_max_messages: int = 10000
+    outbox_max_age: int = 86400
+    outbox_drain_rate: float = 10.0
+    history_path: str | None = None
+    history_raw_retention: int = 86400
+    history_rollup_retention: int = 604800
+    history_hourly_retention: int = 31536000
+    health_max_staleness: int | None = None
+    health_heartbeat_timeout: int = 300
+    extra_fields: List[Dict[str, Any]] = field(default_factory=list)
+    worker_processes: int = 1
+    shard_strategy: str = "hash"
+    adaptive_polling: bool = False
+    adaptive_min_interval: int | None = None
+    adaptive_max_interval: int = 1800
+    api_rate_limit: float | None = None
+    api_rate_burst: int | None = None
+    circuit_breaker_threshold: int = 5
+    circuit_breaker_reset_timeout: int = 60
+    token_lifetime: int | None = None
+    token_refresh_margin: int = 300
+    token_cache_path: str | None = None
+    http_connect_timeout: float = 10.0
+    http_read_timeout: float = 10.0
+    http_pool_connections: int = 10
+    http_pool_maxsize: int | None = None
+    http_retries: int = 2
+    http_retry_backoff: float = 0.5
+    http2: bool = False
+    json_backend: str = "auto"
+    capture_path: str | None = None
+    replay_path: str | None = None
+    replay_speed: float = 1.0
+    config_watch_interval: int | None = None
+
+    @property
+    def http_timeout(self) -> tuple[float, float]:
+        """(connect, read) timeouts of API requests, in seconds."""
+        return self.http_connect_timeout, self.http_read_timeout
+
+    def endpoint_intervals(self) -> dict[str, int]:
+        """Polling interval of each endpoint, defaulting to http_interval."""
+        return {
+            "monitor": self.monitor_interval or self.http_interval,
+            "production": self.production_interval or self.http_interval,
+            "status": self.status_interval or self.http_interval,
+        }
+
+    @property
+    def cycle_interval(self) -> int:
+        """Interval of the fetch scheduler: the shortest endpoint interval."""
+        return min(self.endpoint_intervals().values())
+
+    @property
+    def max_fetch_interval(self) -> int:
+        """Longest interval between two fetches of a system."""
+        if self.adaptive_polling:
+            return max(self.cycle_interval, self.adaptive_max_interval)
+        return self.cycle_interval
 
     @classmethod
     def load(cls, config_path: str | None = None) -> "Config":  # noqa: C901
@@ -54,8 +139,110 @@ class Config:
             "dry_run": False,
             "ha_discovery_enabled": True,
             "ha_discovery_prefix": "homeassistant",
+            # Hashes of the retained discovery configs, None keeps them in memory
+            "ha_discovery_state_path": None,
+            # Discovery messages per second when Home Assistant comes online, 0 for no limit
+            "ha_discovery_rate": 50.0,
+            # Maximum random delay in seconds before republishing discovery
+            "ha_discovery_spread": 5.0,
             "device_name": "hyponcloud2mqtt",
             "mqtt_client_id": "hyponcloud2mqtt",
+            # 1, or ASYNC_FETCH_CONCURRENCY with the asyncio engine
+            "fetch_concurrency": None,
+            # Defaults to 3 workers (one per endpoint) per concurrent fetch
+            "worker_pool_size": None,
+            # "threads" or "asyncio" (requires the aiohttp extra)
+            "engine": "threads",
+            "mqtt_max_inflight": 100,
+            # Random delay (seconds) added to each scheduled fetch
+            "schedule_jitter": 0.0,
+            # Spread systems evenly over the interval instead of all at once
+            "schedule_phase_spread": False,
+            # "skip" or "catch_up" missed cycles when a fetch overruns
+            "schedule_overrun": "skip",
+            # Per-endpoint polling intervals, default to http_interval
+            "monitor_interval": None,
+            "production_interval": None,
+            "status_interval": None,
+            # Skip state publishes when no field changed beyond its deadband
+            "delta_publishing": False,
+            "delta_deadbands": {},
+            "delta_full_refresh_cycles": 10,
+            # Also publish each field to {mqtt_topic}/{system_id}/{field}
+            "mqtt_per_field_topics": False,
+            # SQLite file buffering state payloads while MQTT is down
+            "outbox_path": None,
+            "outbox_max_messages": 10000,
+            # Seconds
+            "outbox_max_age": 86400,
+            # Buffered messages published per second after reconnect
+            "outbox_drain_rate": 10.0,
+            # SQLite file keeping the history of the merged readings
+            "history_path": None,
+            # Seconds raw readings, 5 minute and hourly aggregates are kept
+            "history_raw_retention": 86400,
+            "history_rollup_retention": 604800,
+            "history_hourly_retention": 31536000,
+            # /readyz: seconds without successful fetch before a system is
+            # stale, defaults to 3 fetch intervals
+            "health_max_staleness": None,
+            # /livez: seconds without fetch loop heartbeat before it is stuck
+            "health_heartbeat_timeout": 300,
+            # Additional fields extracted from the API responses, see
+            # data_merger.DEFAULT_FIELDS for the format
+            "extra_fields": [],
+            "health_host": "0.0.0.0",
+            "health_port": 8080,
+            # Split system_ids across this many worker processes
+            "worker_processes": 1,
+            # "hash" (consistent hashing) or "count" (equal contiguous chunks)
+            "shard_strategy": "hash",
+            # Poll idle systems (no production, inverters or gateway offline)
+            # less often, between the min and max intervals (seconds)
+            "adaptive_polling": False,
+            # Defaults to the fetch interval
+            "adaptive_min_interval": None,
+            "adaptive_max_interval": 1800,
+            # Requests per second to the API for all systems, unlimited if
+            # unset; the burst defaults to one second worth of requests
+            "api_rate_limit": None,
+            "api_rate_burst": None,
+            # Consecutive failures opening the circuit breaker of an endpoint
+            # (0 disables it), and seconds before a probe request is let through
+            "circuit_breaker_threshold": 5,
+            "circuit_breaker_reset_timeout": 60,
+            # Seconds a token is valid, otherwise read from JWT tokens or
+            # learned when the API rejects a token
+            "token_lifetime": None,
+            # Seconds before expiry at which the token is refreshed
+            "token_refresh_margin": 300,
+            # File caching the token across restarts, created with mode 0600
+            "token_cache_path": None,
+            # Seconds to open a connection to the API and to wait for a response
+            "http_connect_timeout": 10.0,
+            "http_read_timeout": 10.0,
+            # Connection pools kept, and connections per pool (defaults to
+            # the number of HTTP workers)
+            "http_pool_connections": 10,
+            "http_pool_maxsize": None,
+            # Retries of requests that could not reach the API, with
+            # exponential backoff (seconds)
+            "http_retries": 2,
+            "http_retry_backoff": 0.5,
+            # Multiplex requests over one HTTP/2 connection (threads engine,
+            # requires the http2 extra)
+            "http2": False,
+            # "auto" (fastest installed), "orjson", "ujson" or "json"
+            "json_backend": "auto",
+            # Gzip JSON lines file recording every plant response
+            "capture_path": None,
+            # Capture file answering the API requests instead of the cloud
+            "replay_path": None,
+            # Replayed latency divisor, 0 to answer without delay
+            "replay_speed": 1.0,
+            # Seconds between checks of the config file for changes, None to
+            # reload on SIGHUP only
+            "config_watch_interval": None,
         }
 
         # Load from file if exists
@@ -93,6 +280,68 @@ class Config:
             except ValueError:
                 pass
 
+        fetch_concurrency_env = os.getenv("FETCH_CONCURRENCY")
+        if fetch_concurrency_env:
+            try:
+                config["fetch_concurrency"] = int(fetch_concurrency_env)
+            except ValueError:
+                pass
+
+        worker_pool_size_env = os.getenv("WORKER_POOL_SIZE")
+        if worker_pool_size_env:
+            try:
+                config["worker_pool_size"] = int(worker_pool_size_env)
+            except ValueError:
+                pass
+
+        for endpoint in ("monitor", "production", "status"):
+            endpoint_interval_env = os.getenv(f"{endpoint.upper()}_INTERVAL")
+            if endpoint_interval_env:
+                try:
+                    config[f"{endpoint}_interval"] = int(endpoint_interval_env)
+                except ValueError:
+                    pass
+
+        schedule_jitter_env = os.getenv("SCHEDULE_JITTER")
+        if schedule_jitter_env:
+            try:
+                config["schedule_jitter"] = float(schedule_jitter_env)
+            except ValueError:
+                pass
+
+        schedule_phase_spread_env = os.getenv("SCHEDULE_PHASE_SPREAD")
+        if schedule_phase_spread_env:
+            config["schedule_phase_spread"] = schedule_phase_spread_env.lower() in ("true", "1", "yes")
+
+        if os.getenv("SCHEDULE_OVERRUN"):
+            config["schedule_overrun"] = os.getenv("SCHEDULE_OVERRUN", "").lower()
+
+        delta_publishing_env = os.getenv("DELTA_PUBLISHING")
+        if delta_publishing_env:
+            config["delta_publishing"] = delta_publishing_env.lower() in ("true", "1", "yes")
+
+        # Env Var for delta_deadbands (comma-separated field=deadband pairs)
+        delta_deadbands_env = os.getenv("DELTA_DEADBANDS")
+        if delta_deadbands_env:
+            deadbands = {}
+            for item in delta_deadbands_env.split(','):
+                key, _, value = item.partition('=')
+                try:
+                    deadbands[key.strip()] = float(value)
+                except ValueError:
+                    logger.warning(f"Ignoring invalid DELTA_DEADBANDS entry: {item}")
+            config["delta_deadbands"] = deadbands
+
+        delta_full_refresh_cycles_env = os.getenv("DELTA_FULL_REFRESH_CYCLES")
+        if delta_full_refresh_cycles_env:
+            try:
+                config["delta_full_refresh_cycles"] = int(delta_full_refresh_cycles_env)
+            except ValueError:
+                pass
+
+        if os.getenv("ENGINE"):
+            config["engine"] = os.getenv("ENGINE", "").lower()
+
         if os.getenv("MQTT_BROKER"):
             config["mqtt_broker"] = os.getenv("MQTT_BROKER")
 
@@ -120,6 +369,142 @@ class Config:
         if os.getenv("MQTT_PASSWORD"):
             config["mqtt_password"] = os.getenv("MQTT_PASSWORD")
 
+        mqtt_max_inflight_env = os.getenv("MQTT_MAX_INFLIGHT")
+        if mqtt_max_inflight_env:
+            try:
+                config["mqtt_max_inflight"] = int(mqtt_max_inflight_env)
+            except ValueError:
+                pass
+
+        mqtt_per_field_topics_env = os.getenv("MQTT_PER_FIELD_TOPICS")
+        if mqtt_per_field_topics_env:
+            config["mqtt_per_field_topics"] = mqtt_per_field_topics_env.lower() in ("true", "1", "yes")
+
+        if os.getenv("OUTBOX_PATH"):
+            config["outbox_path"] = os.getenv("OUTBOX_PATH")
+
+        for outbox_key, outbox_type in (("outbox_max_messages", int), ("outbox_max_age", int),
+                                        ("outbox_drain_rate", float)):
+            outbox_env = os.getenv(outbox_key.upper())
+            if outbox_env:
+                try:
+                    config[outbox_key] = outbox_type(outbox_env)
+                except ValueError:
+                    pass
+
+        if os.getenv("HISTORY_PATH"):
+            config["history_path"] = os.getenv("HISTORY_PATH")
+
+        for history_key in ("history_raw_retention", "history_rollup_retention", "history_hourly_retention"):
+            history_env = os.getenv(history_key.upper())
+            if history_env:
+                try:
+                    config[history_key] = int(history_env)
+                except ValueError:
+                    pass
+
+        for health_key in ("health_max_staleness", "health_heartbeat_timeout"):
+            health_env = os.getenv(health_key.upper())
+            if health_env:
+                try:
+                    config[health_key] = int(health_env)
+                except ValueError:
+                    pass
+
+        health_port_env = os.getenv("HEALTH_PORT")
+        if health_port_env:
+            try:
+                config["health_port"] = int(health_port_env)
+            except ValueError:
+                pass
+
+        worker_processes_env = os.getenv("WORKER_PROCESSES")
+        if worker_processes_env:
+            try:
+                config["worker_processes"] = int(worker_processes_env)
+            except ValueError:
+                pass
+
+        if os.getenv("SHARD_STRATEGY"):
+            config["shard_strategy"] = os.getenv("SHARD_STRATEGY", "").lower()
+
+        adaptive_polling_env = os.getenv("ADAPTIVE_POLLING")
+        if adaptive_polling_env:
+            config["adaptive_polling"] = adaptive_polling_env.lower() in ("true", "1", "yes")
+
+        for adaptive_key in ("adaptive_min_interval", "adaptive_max_interval"):
+            adaptive_env = os.getenv(adaptive_key.upper())
+            if adaptive_env:
+                try:
+                    config[adaptive_key] = int(adaptive_env)
+                except ValueError:
+                    pass
+
+        for resilience_key, resilience_type in (
+                ("api_rate_limit", float), ("api_rate_burst", int),
+                ("circuit_breaker_threshold", int), ("circuit_breaker_reset_timeout", int)):
+            resilience_env = os.getenv(resilience_key.upper())
+            if resilience_env:
+                try:
+                    config[resilience_key] = resilience_type(resilience_env)
+                except ValueError:
+                    pass
+
+        for discovery_key in ("ha_discovery_rate", "ha_discovery_spread"):
+            discovery_env = os.getenv(discovery_key.upper())
+            if discovery_env:
+                try:
+                    config[discovery_key] = float(discovery_env)
+                except ValueError:
+                    pass
+
+        for token_key in ("token_lifetime", "token_refresh_margin"):
+            token_env = os.getenv(token_key.upper())
+            if token_env:
+                try:
+                    config[token_key] = int(token_env)
+                except ValueError:
+                    pass
+
+        for http_key, http_type in (
+                ("http_connect_timeout", float), ("http_read_timeout", float),
+                ("http_pool_connections", int), ("http_pool_maxsize", int),
+                ("http_retries", int), ("http_retry_backoff", float)):
+            http_env = os.getenv(http_key.upper())
+            if http_env:
+                try:
+                    config[http_key] = http_type(http_env)
+                except ValueError:
+                    pass
+
+        http2_env = os.getenv("HTTP2")
+        if http2_env:
+            config["http2"] = http2_env.lower() in ("true", "1", "yes")
+
+        if os.getenv("JSON_BACKEND"):
+            config["json_backend"] = os.getenv("JSON_BACKEND", "").lower()
+
+        for capture_key in ("capture_path", "replay_path"):
+            if os.getenv(capture_key.upper()):
+                config[capture_key] = os.getenv(capture_key.upper())
+
+        replay_speed_env = os.getenv("REPLAY_SPEED")
+        if replay_speed_env:
+            try:
+                config["replay_speed"] = float(replay_speed_env)
+            except ValueError:
+                pass
+
+        config_watch_interval_env = os.getenv("CONFIG_WATCH_INTERVAL")
+        if config_watch_interval_env:
+            try:
+                config["config_watch_interval"] = int(config_watch_interval_env)
+            except ValueError:
+                pass
+
+        if os.getenv("TOKEN_CACHE_PATH"):
+            config["token_cache_path"] = os.getenv("TOKEN_CACHE_PATH")
+
         if os.getenv("MQTT_CLIENT_ID"):
             config["mqtt_client_id"] = os.getenv("MQTT_CLIENT_ID")
 
@@ -143,6 +528,9 @@ class Config:
         if os.getenv("HA_DISCOVERY_PREFIX"):
             config["ha_discovery_prefix"] = os.getenv("HA_DISCOVERY_PREFIX")
 
+        if os.getenv("HA_DISCOVERY_STATE_PATH"):
+            config["ha_discovery_state_path"] = os.getenv("HA_DISCOVERY_STATE_PATH")
+
         if os.getenv("DEVICE_NAME"):
             config["device_name"] = os.getenv("DEVICE_NAME")
 
@@ -200,12 +588,226 @@ class Config:
             logger.warning(
                 f"http_interval is very large ({http_interval}s), consider reducing it")
 
+        # Validate per-endpoint intervals
+        cycle_interval = http_interval
+        for endpoint in ("monitor", "production", "status"):
+            endpoint_interval = config.get(f"{endpoint}_interval")
+            if endpoint_interval is None:
+                continue
+            if not isinstance(endpoint_interval, int) or endpoint_interval <= 0:
+                raise ValueError(
+                    f"{endpoint}_interval must be a positive integer, got: {endpoint_interval}")
+            cycle_interval = min(cycle_interval, endpoint_interval)
+
+        # Validate schedule
+        schedule_jitter = config.get("schedule_jitter", 0)
+        if not isinstance(schedule_jitter, (int, float)) or schedule_jitter < 0:
+            raise ValueError(
+                f"schedule_jitter must be a non-negative number, got: {schedule_jitter}")
+        if schedule_jitter >= cycle_interval:
+            raise ValueError(
+                f"schedule_jitter must be lower than the fetch interval, got: {schedule_jitter}")
+        schedule_overrun = config.get("schedule_overrun")
+        if schedule_overrun not in ("skip", "catch_up"):
+            raise ValueError(
+                f"schedule_overrun must be 'skip' or 'catch_up', got: {schedule_overrun}")
+
+        # Validate adaptive polling
+        adaptive_min_interval = config.get("adaptive_min_interval")
+        if adaptive_min_interval is None:
+            adaptive_min_interval = cycle_interval
+        elif not isinstance(adaptive_min_interval, int) or adaptive_min_interval <= 0:
+            raise ValueError(
+                f"adaptive_min_interval must be a positive integer, got: {adaptive_min_interval}")
+        adaptive_max_interval = config.get("adaptive_max_interval", 0)
+        if not isinstance(adaptive_max_interval, int) or adaptive_max_interval < adaptive_min_interval:
+            raise ValueError(
+                f"adaptive_max_interval must be an integer not lower than the minimum interval "
+                f"({adaptive_min_interval}s), got: {adaptive_max_interval}")
+
+        # Validate rate limiter and circuit breakers
+        api_rate_limit = config.get("api_rate_limit")
+        if api_rate_limit is not None and (
+                not isinstance(api_rate_limit, (int, float)) or api_rate_limit <= 0):
+            raise ValueError(
+                f"api_rate_limit must be a positive number, got: {api_rate_limit}")
+        api_rate_burst = config.get("api_rate_burst")
+        if api_rate_burst is not None and (not isinstance(api_rate_burst, int) or api_rate_burst < 1):
+            raise ValueError(
+                f"api_rate_burst must be a positive integer, got: {api_rate_burst}")
+        circuit_breaker_threshold = config.get("circuit_breaker_threshold", 0)
+        if not isinstance(circuit_breaker_threshold, int) or circuit_breaker_threshold < 0:
+            raise ValueError(
+                f"circuit_breaker_threshold must be a non-negative integer, got: {circuit_breaker_threshold}")
+        circuit_breaker_reset_timeout = config.get("circuit_breaker_reset_timeout", 0)
+        if not isinstance(circuit_breaker_reset_timeout, int) or circuit_breaker_reset_timeout < 1:
+            raise ValueError(
+                f"circuit_breaker_reset_timeout must be a positive integer, got: {circuit_breaker_reset_timeout}")
+
+        # Validate discovery republishing
+        for discovery_key in ("ha_discovery_rate", "ha_discovery_spread"):
+            discovery_value = config.get(discovery_key, 0)
+            if not isinstance(discovery_value, (int, float)) or discovery_value < 0:
+                raise ValueError(
+                    f"{discovery_key} must be a non-negative number, got: {discovery_value}")
+
+        # Validate token refresh
+        token_lifetime = config.get("token_lifetime")
+        if token_lifetime is not None and (not isinstance(token_lifetime, int) or token_lifetime < 1):
+            raise ValueError(
+                f"token_lifetime must be a positive integer, got: {token_lifetime}")
+        token_refresh_margin = config.get("token_refresh_margin", 0)
+        if not isinstance(token_refresh_margin, int) or token_refresh_margin < 0:
+            raise ValueError(
+                f"token_refresh_margin must be a non-negative integer, got: {token_refresh_margin}")
+
+        # Validate HTTP transport
+        for http_key in ("http_connect_timeout", "http_read_timeout"):
+            http_value = config.get(http_key, 0)
+            if not isinstance(http_value, (int, float)) or http_value <= 0:
+                raise ValueError(
+                    f"{http_key} must be a positive number, got: {http_value}")
+        http_pool_connections = config.get("http_pool_connections", 0)
+        if not isinstance(http_pool_connections, int) or http_pool_connections < 1:
+            raise ValueError(
+                f"http_pool_connections must be a positive integer, got: {http_pool_connections}")
+        http_pool_maxsize = config.get("http_pool_maxsize")
+        if http_pool_maxsize is not None and (
+                not isinstance(http_pool_maxsize, int) or http_pool_maxsize < 1):
+            raise ValueError(
+                f"http_pool_maxsize must be a positive integer, got: {http_pool_maxsize}")
+        http_retries = config.get("http_retries", 0)
+        if not isinstance(http_retries, int) or http_retries < 0:
+            raise ValueError(
+                f"http_retries must be a non-negative integer, got: {http_retries}")
+        http_retry_backoff = config.get("http_retry_backoff", 0)
+        if not isinstance(http_retry_backoff, (int, float)) or http_retry_backoff < 0:
+            raise ValueError(
+                f"http_retry_backoff must be a non-negative number, got: {http_retry_backoff}")
+
+        # Validate JSON backend
+        json_backend = config.get("json_backend")
+        if json_backend not in ("auto", *BACKEND_NAMES):
+            raise ValueError(
+                f"json_backend must be one of auto, {', '.join(BACKEND_NAMES)}, got: {json_backend}")
+
+        # Validate delta publishing
+        delta_deadbands = config.get("delta_deadbands") or {}
+        if not isinstance(delta_deadbands, dict) or not all(
+                isinstance(v, (int, float)) and v >= 0 for v in delta_deadbands.values()):
+            raise ValueError(
+                f"delta_deadbands must map field names to non-negative numbers, got: {delta_deadbands}")
+        delta_full_refresh_cycles = config.get("delta_full_refresh_cycles", 0)
+        if not isinstance(delta_full_refresh_cycles, int) or delta_full_refresh_cycles < 0:
+            raise ValueError(
+                f"delta_full_refresh_cycles must be a non-negative integer, got: {delta_full_refresh_cycles}")
+
+        # Validate fetch concurrency
+        if config.get("fetch_concurrency") is None:
+            config["fetch_concurrency"] = ASYNC_FETCH_CONCURRENCY if config.get("engine") == "asyncio" else 1
+        fetch_concurrency = config.get("fetch_concurrency", 1)
+        if not isinstance(fetch_concurrency, int) or fetch_concurrency < 1:
+            raise ValueError(
+                f"fetch_concurrency must be a positive integer, got: {fetch_concurrency}")
+
+        # Validate worker pool size
+        worker_pool_size = config.get("worker_pool_size")
+        if worker_pool_size is not None and (
+                not isinstance(worker_pool_size, int) or worker_pool_size < 1):
+            raise ValueError(
+                f"worker_pool_size must be a positive integer, got: {worker_pool_size}")
+
+        # Validate fetch engine
+        engine = config.get("engine")
+        if engine not in ("threads", "asyncio"):
+            raise ValueError(
+                f"engine must be 'threads' or 'asyncio', got: {engine}")
+
+        # Validate capture and replay
+        if config.get("replay_path"):
+            if config.get("capture_path"):
+                raise ValueError("capture_path and replay_path cannot be used together")
+            if engine != "threads":
+                raise ValueError("replay_path requires the 'threads' engine")
+        replay_speed = config.get("replay_speed", 0)
+        if not isinstance(replay_speed, (int, float)) or replay_speed < 0:
+            raise ValueError(
+                f"replay_speed must be a non-negative number, got: {replay_speed}")
+
+        # Validate config reload
+        config_watch_interval = config.get("config_watch_interval")
+        if config_watch_interval is not None and (
+                not isinstance(config_watch_interval, int) or config_watch_interval < 1):
+            raise ValueError(
+                f"config_watch_interval must be a positive integer, got: {config_watch_interval}")
+
+        # Validate sharding
+        worker_processes = config.get("worker_processes", 1)
+        if not isinstance(worker_processes, int) or worker_processes < 1:
+            raise ValueError(
+                f"worker_processes must be a positive integer, got: {worker_processes}")
+        shard_strategy = config.get("shard_strategy")
+        if shard_strategy not in ("hash", "count"):
+            raise ValueError(
+                f"shard_strategy must be 'hash' or 'count', got: {shard_strategy}")
+
+        # Validate health server port
+        health_port = config.get("health_port", 0)
+        if not isinstance(health_port, int) or not (1 <= health_port <= 65535):
+            raise ValueError(
+                f"health_port must be between 1 and 65535, got: {health_port}")
+
         # Validate MQTT port
         mqtt_port = config.get("mqtt_port", 0)
         if not (1 <= mqtt_port <= 65535):
             raise ValueError(
                 f"mqtt_port must be between 1 and 65535, got: {mqtt_port}")
 
+        # Validate MQTT in-flight window
+        mqtt_max_inflight = config.get("mqtt_max_inflight", 0)
+        if not isinstance(mqtt_max_inflight, int) or mqtt_max_inflight < 1:
+            raise ValueError(
+                f"mqtt_max_inflight must be a positive integer, got: {mqtt_max_inflight}")
+
+        # Validate outbox
+        for outbox_key in ("outbox_max_messages", "outbox_max_age"):
+            outbox_value = config.get(outbox_key, 0)
+            if not isinstance(outbox_value, int) or outbox_value < 1:
+                raise ValueError(
+                    f"{outbox_key} must be a positive integer, got: {outbox_value}")
+        outbox_drain_rate = config.get("outbox_drain_rate", 0)
+        if not isinstance(outbox_drain_rate, (int, float)) or outbox_drain_rate <= 0:
+            raise ValueError(
+                f"outbox_drain_rate must be a positive number, got: {outbox_drain_rate}")
+
+        # Validate history: raw readings and 5 minute aggregates must outlive
+        # the buckets rolled up from them
+        for history_key, history_minimum in (
+                ("history_raw_retention", 300), ("history_rollup_retention", 3600),
+                ("history_hourly_retention", 3600)):
+            history_value = config.get(history_key, 0)
+            if not isinstance(history_value, int) or history_value < history_minimum:
+                raise ValueError(
+                    f"{history_key} must be an integer of at least {history_minimum} seconds, got: {history_value}")
+
+        # Validate health thresholds
+        health_max_staleness = config.get("health_max_staleness")
+        if health_max_staleness is not None and (
+                not isinstance(health_max_staleness, int) or health_max_staleness < 1):
+            raise ValueError(
+                f"health_max_staleness must be a positive integer, got: {health_max_staleness}")
+        health_heartbeat_timeout = config.get("health_heartbeat_timeout", 0)
+        if not isinstance(health_heartbeat_timeout, int) or health_heartbeat_timeout < 1:
+            raise ValueError(
+                f"health_heartbeat_timeout must be a positive integer, got: {health_heartbeat_timeout}")
+
+        # Validate field mapping
+        extra_fields = config.get("extra_fields") or []
+        if not isinstance(extra_fields, list) or not all(isinstance(f, dict) for f in extra_fields):
+            raise ValueError(
+                f"extra_fields must be a list of field declarations, got: {extra_fields}")
+        compile_fields(extra_fields)
+
         # Validate MQTT topic
         mqtt_topic = config.get("mqtt_topic", "")
         if not mqtt_topic:
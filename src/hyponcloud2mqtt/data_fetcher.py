@@ -1,129 +1,149 @@
+from __future__ import annotations
 import logging
-import sys
-import requests
-import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from concurrent.futures import as_completed
+from typing import Any, Callable
+from .auth import AuthSession
 from .http_client import HttpClient, AuthenticationError
-from .data_merger import merge_api_data
+from .data_merger import ExtractionPlan, compile_fields, merge_api_data
+from .worker_pool import WorkerPool
 
 logger = logging.getLogger(__name__)
 
+ENDPOINTS = ("monitor", "production", "status")
+
+
+class EndpointCache:
+    """Last known response of each endpoint, refreshed at its own interval.
+
+    Args:
+        intervals: Polling interval in seconds per endpoint; endpoints
+            without an interval are fetched on every call
+        tolerance: Seconds an endpoint may be fetched ahead of its interval,
+            so scheduling jitter does not push it to the following cycle
+    """
+
+    def __init__(
+            self,
+            intervals: dict[str, float] | None = None,
+            tolerance: float = 0.0,
+            clock: Callable[[], float] = time.monotonic):
+        self.intervals = intervals or {}
+        self.tolerance = tolerance
+        self._clock = clock
+        self._data: dict[str, Any] = {}
+        self._fetched_at: dict[str, float] = {}
+
+    def due(self) -> list[str]:
+        """Return the endpoints that must be fetched now."""
+        now = self._clock()
+        due = []
+        for name in ENDPOINTS:
+            fetched_at = self._fetched_at.get(name)
+            interval = self.intervals.get(name, 0)
+            if fetched_at is None or now - fetched_at + self.tolerance >= interval:
+                due.append(name)
+        return due
+
+    def resolve(self, results: dict[str, Any]) -> tuple[Any, Any, Any]:
+        """Store fresh results and return (monitor, production, status).
+
+        Endpoints that were not due are taken from their last successful
+        response; endpoints that were due but failed are None and retried on
+        the next call.
+        """
+        now = self._clock()
+        for name, data in results.items():
+            if data is not None:
+                self._data[name] = data
+                self._fetched_at[name] = now
+
+        monitor, production, status = (
+            results[name] if name in results else self._data.get(name)
+            for name in ENDPOINTS)
+        return monitor, production, status
+
 
 class DataFetcher:
-    def __init__(self, config, system_id: str):
+    def __init__(
+            self,
+            config,
+            system_id: str,
+            auth: AuthSession | None = None,
+            pool: WorkerPool | None = None,
+            endpoints: EndpointCache | None = None,
+            plan: ExtractionPlan | None = None):
         self.config = config
         self.system_id = system_id
         self.base_url = config.http_url.rstrip('/')
-        self.session = requests.Session()
-        self.session.verify = self.config.verify_ssl
+        # Share the account session when provided, otherwise use a private one
+        self.auth = auth if auth is not None else AuthSession(config)
+        self.session = self.auth.session
+        # Private session and pool are owned, and released by close()
+        self._owns_auth = auth is None
+        self._owns_pool = pool is None
+        # Without per-endpoint intervals every endpoint is fetched each call
+        self.endpoints = endpoints if endpoints is not None else EndpointCache()
+        # Field mapping compiled once by the daemon and shared by all systems
+        self.plan = plan if plan is not None else compile_fields(config.extra_fields)
         self.monitor_client = None
         self.production_client = None
         self.status_client = None
-        self._reauth_lock = threading.Lock()
 
         self.setup_clients()
+        # Endpoint requests run on the daemon's shared pool when provided
+        self.pool = pool if pool is not None else WorkerPool(3)
 
-    def _login(self) -> str | None:
-        """
-        Login to the API and retrieve Bearer token.
-        """
-        if not (self.config.api_username and self.config.api_password):
-            logger.warning("No API credentials provided, skipping login")
-            return None
-
-        login_url = f"{self.base_url}/login"
-        logger.info(f"Attempting login to {login_url}")
-        payload = {
-            "username": self.config.api_username,
-            "password": self.config.api_password,
-            "oem": None
-        }
-
-        try:
-            response = self.session.post(login_url, json=payload, timeout=10)
-            logger.debug(
-                f"Login request sent, status code: {response.status_code}")
-            response.raise_for_status()
-            data = response.json()
-
-            if not isinstance(data, dict):
-                logger.error(f"Login response is not a JSON object: {data}")
-                return None
-
-            code = data.get("code")
-            if code != 20000:
-                logger.error(f"Login failed with code {code}")
-                return None
-
-            token = data.get("data", {}).get("token")
-            if not token:
-                logger.error("No token in login response")
-                return None
-
-            logger.info("Successfully logged in and retrieved token")
-            return token
-
-        except requests.RequestException as e:
-            logger.error(f"Error during login: {e}")
-            return None
-        except ValueError as e:
-            logger.error(f"Error parsing login response: {e}")
-            return None
+    def close(self) -> None:
+        """Release the private worker pool and session, if any."""
+        if self._owns_pool:
+            self.pool.shutdown(wait=True)
+        if self._owns_auth:
+            self.auth.close()
 
     def setup_clients(self):
-        # Login to get Bearer token
-        token = self._login()
-        if token:
-            self.session.headers.update({"Authorization": f"Bearer {token}"})
-        elif self.config.api_username and self.config.api_password:
-            # If login was expected but failed
-            logger.critical("Failed to retrieve Bearer token")
-            sys.exit(1)
+        # Login to get Bearer token (once per account)
+        self.auth.ensure_logged_in()
 
         # Construct plant-specific base URL
         plant_base_url = f"{self.base_url}/plant/{self.system_id}"
 
         self.monitor_client = HttpClient(
-            f"{plant_base_url}/monitor?refresh=true", self.session)
+            f"{plant_base_url}/monitor?refresh=true", self.session,
+            self.auth.rate_limiter, self.auth.breakers, self.auth.timeout, self.auth.capture)
         self.production_client = HttpClient(
-            f"{plant_base_url}/production2", self.session)
+            f"{plant_base_url}/production2", self.session,
+            self.auth.rate_limiter, self.auth.breakers, self.auth.timeout, self.auth.capture)
         self.status_client = HttpClient(
-            f"{plant_base_url}/status", self.session)
+            f"{plant_base_url}/status", self.session,
+            self.auth.rate_limiter, self.auth.breakers, self.auth.timeout, self.auth.capture)
 
         logger.info("HTTP clients initialized for 3 endpoints")
 
     def fetch_all(self):
-        monitor_data = None
-        production_data = None
-        status_data = None
+        results: dict[str, Any] = {}
+        due = self.endpoints.due()
+        clients = {
+            "monitor": self.monitor_client,
+            "production": self.production_client,
+            "status": self.status_client,
+        }
 
         # Retry loop for authentication handling
         max_retries = 2
         for attempt in range(max_retries):
+            token = self.auth.token
             try:
-                # Fetch from all 3 endpoints in parallel
-                with ThreadPoolExecutor(max_workers=3) as executor:
-                    future_monitor = executor.submit(
-                        self.monitor_client.fetch_data)
-                    future_production = executor.submit(
-                        self.production_client.fetch_data)
-                    future_status = executor.submit(
-                        self.status_client.fetch_data)
-
-                    # Wait for all futures to complete
-                    futures = [
-                        future_monitor,
-                        future_production,
-                        future_status]
-
-                    # Check for exceptions in futures
-                    for future in as_completed(futures):
-                        future.result()  # This will raise AuthenticationError if present
-
-                    # If no exception, get results
-                    monitor_data = future_monitor.result()
-                    production_data = future_production.result()
-                    status_data = future_status.result()
+                # Fetch the due endpoints in parallel
+                futures = {name: self.pool.submit(clients[name].fetch_data)
+                           for name in due}
+
+                # Check for exceptions in futures
+                for future in as_completed(futures.values()):
+                    future.result()  # This will raise AuthenticationError if present
+
+                # If no exception, get results
+                results = {name: future.result() for name, future in futures.items()}
 
                 # If we got here, all requests succeeded
                 break
@@ -132,29 +152,25 @@ class DataFetcher:
                 logger.warning(
                     f"Authentication failed during fetch (attempt {attempt + 1}/{max_retries})")
                 if attempt < max_retries - 1:
-                    # Use a lock to prevent multiple threads from trying to re-login at once
-                    with self._reauth_lock:
-                        logger.info("Attempting to re-login...")
-                        new_token = self._login()
-                        if new_token:
-                            logger.info(
-                                "Successfully re-authenticated, updating session token")
-                            self.session.headers.update(
-                                {"Authorization": f"Bearer {new_token}"})
-                            continue  # Retry the loop
-                        else:
-                            logger.error("Re-authentication failed")
-                            break  # Stop retrying
+                    # Only one fetcher re-logs in, the others reuse its token
+                    if self.auth.refresh(token):
+                        continue  # Retry the loop
+                    break  # Stop retrying
                 else:
                     logger.error("Max retries reached for authentication")
             except Exception as e:
                 logger.error(f"Unexpected error during fetch: {e}")
                 break
 
+        # Endpoints that were not due use their last known response
+        for name in due:
+            results.setdefault(name, None)
+        monitor_data, production_data, status_data = self.endpoints.resolve(results)
+
         # Check if all requests failed
         if monitor_data is None and production_data is None and status_data is None:
             logger.warning("All API requests failed or returned None")
             return None
 
         # Merge data
-        return merge_api_data(monitor_data, production_data, status_data)
+        return merge_api_data(monitor_data, production_data, status_data, self.plan)
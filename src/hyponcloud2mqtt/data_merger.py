@@ -1,34 +1,154 @@
 from __future__ import annotations
 import logging
-from typing import Any
+import re
+from typing import Any, Callable, Iterable, Mapping
 
 logger = logging.getLogger(__name__)
 
+# Fields extracted from each endpoint: where the value is in the "data" object
+# of the response (dotted path), the key it is published under and its type.
+# An optional "scale" multiplies the value (e.g. 0.001 for W to kW).
+DEFAULT_FIELDS: tuple[dict[str, Any], ...] = (
+    {"endpoint": "monitor", "source": "percent", "key": "percent", "type": "float"},
+    {"endpoint": "monitor", "source": "w_cha", "key": "w_cha", "type": "int"},
+    {"endpoint": "monitor", "source": "power_pv", "key": "power_pv", "type": "int"},
+    {"endpoint": "production", "source": "today_generation", "key": "today_generation", "type": "float"},
+    {"endpoint": "production", "source": "month_generation", "key": "month_generation", "type": "float"},
+    {"endpoint": "production", "source": "year_generation", "key": "year_generation", "type": "float"},
+    {"endpoint": "production", "source": "total_generation", "key": "total_generation", "type": "float"},
+    {"endpoint": "production", "source": "co2", "key": "co2", "type": "float"},
+    {"endpoint": "production", "source": "tree", "key": "tree", "type": "float"},
+    {"endpoint": "production", "source": "diesel", "key": "diesel", "type": "float"},
+    {"endpoint": "production", "source": "today_revenue", "key": "today_revenue", "type": "float"},
+    {"endpoint": "production", "source": "month_revenue", "key": "month_revenue", "type": "float"},
+    {"endpoint": "production", "source": "total_revenue", "key": "total_revenue", "type": "float"},
+    {"endpoint": "status", "source": "gateway.online", "key": "gateway_online", "type": "int"},
+    {"endpoint": "status", "source": "gateway.offline", "key": "gateway_offline", "type": "int"},
+    {"endpoint": "status", "source": "inverter.online", "key": "inverter_online", "type": "int"},
+    {"endpoint": "status", "source": "inverter.normal", "key": "inverter_normal", "type": "int"},
+    {"endpoint": "status", "source": "inverter.offline", "key": "inverter_offline", "type": "int"},
+    {"endpoint": "status", "source": "inverter.fault", "key": "inverter_fault", "type": "int"},
+    {"endpoint": "status", "source": "inverter.wait", "key": "inverter_wait", "type": "int"},
+)
 
-def _to_int(val: Any) -> int | None:
-    """Safely cast value to int, return None on failure."""
-    try:
-        if val is None or val == "":
-            return None
-        return int(float(val))
-    except (ValueError, TypeError):
-        return None
+# Position of each endpoint response in merge_api_data arguments
+FIELD_ENDPOINTS = ("monitor", "production", "status")
+
+FIELD_TYPES = ("int", "float")
+
+# Numeric strings as returned by the API, e.g. "1", "-0.5", "1e3"
+_NUMBER = re.compile(r"\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*")
+
+Converter = Callable[[Any], "int | float | None"]
 
 
 def _to_float(val: Any) -> float | None:
-    """Safely cast value to float, return None on failure."""
-    try:
-        if val is None or val == "":
-            return None
+    """Cast a JSON value to float, return None if it is not a number."""
+    kind = type(val)
+    if kind is float or kind is int:
+        return float(val)
+    if kind is str and _NUMBER.fullmatch(val):
         return float(val)
-    except (ValueError, TypeError):
+    return None
+
+
+def _to_int(val: Any) -> int | None:
+    """Cast a JSON value to int (truncated), return None if it is not a number."""
+    if type(val) is int:
+        return val
+    number = _to_float(val)
+    if number is None or number != number or number in (float("inf"), float("-inf")):
         return None
+    return int(number)
+
+
+def _converter(field_type: str, scale: float) -> Converter:
+    if field_type == "int":
+        if scale == 1:
+            return _to_int
+        return lambda val: None if (number := _to_float(val)) is None else _to_int(number * scale)
+    if scale == 1:
+        return _to_float
+    return lambda val: None if (number := _to_float(val)) is None else number * scale
+
+
+class ExtractionPlan:
+    """Field mapping compiled into a flat list of extraction steps.
+
+    Fields are grouped by endpoint and parent object, so each nested object
+    of a response is looked up once, and every field only costs a key lookup
+    and a type-checked conversion.
+    """
+
+    def __init__(self, fields: Iterable[Mapping[str, Any]]):
+        groups: dict[tuple[int, tuple[str, ...]], list[tuple[str, str, Converter]]] = {}
+        for spec in fields:
+            endpoint, path, key, convert = _compile_field(spec)
+            groups.setdefault((endpoint, path[:-1]), []).append((path[-1], key, convert))
+
+        self._steps = tuple(
+            (endpoint, parent, tuple(leaves))
+            for (endpoint, parent), leaves in groups.items())
+
+    def extract(self, responses: tuple[dict | None, ...]) -> dict[str, Any]:
+        """Extract the fields from the endpoint responses, in FIELD_ENDPOINTS order."""
+        merged: dict[str, Any] = {}
+        for endpoint, parent, leaves in self._steps:
+            data = responses[endpoint]
+            if not data:
+                continue
+            data = data.get("data")
+            for name in parent:
+                if not isinstance(data, dict):
+                    break
+                data = data.get(name)
+            if not isinstance(data, dict):
+                continue
+            for leaf, key, convert in leaves:
+                value = convert(data.get(leaf))
+                if value is not None:
+                    merged[key] = value
+        return merged
+
+
+def _compile_field(spec: Mapping[str, Any]) -> tuple[int, tuple[str, ...], str, Converter]:
+    endpoint = spec.get("endpoint")
+    if endpoint not in FIELD_ENDPOINTS:
+        raise ValueError(
+            f"Field endpoint must be one of {', '.join(FIELD_ENDPOINTS)}, got: {endpoint}")
+    source = spec.get("source")
+    key = spec.get("key")
+    if not isinstance(source, str) or not source or not isinstance(key, str) or not key:
+        raise ValueError(f"Field needs a source path and a key, got: {dict(spec)}")
+    field_type = spec.get("type", "float")
+    if field_type not in FIELD_TYPES:
+        raise ValueError(f"Field type must be 'int' or 'float', got: {field_type}")
+    scale = spec.get("scale", 1)
+    if not isinstance(scale, (int, float)) or isinstance(scale, bool):
+        raise ValueError(f"Field scale must be a number, got: {scale}")
+    return FIELD_ENDPOINTS.index(endpoint), tuple(source.split(".")), key, _converter(field_type, scale)
+
+
+def compile_fields(extra_fields: Iterable[Mapping[str, Any]] = ()) -> ExtractionPlan:
+    """Compile the default fields, plus or overridden by extra_fields (by key).
+
+    Raises:
+        ValueError: If a field declaration is invalid
+    """
+    fields: dict[Any, Mapping[str, Any]] = {spec["key"]: spec for spec in DEFAULT_FIELDS}
+    for spec in extra_fields:
+        fields[spec.get("key")] = spec
+    return ExtractionPlan(fields.values())
+
+
+DEFAULT_PLAN = ExtractionPlan(DEFAULT_FIELDS)
 
 
 def merge_api_data(
         monitor: dict | None,
         production: dict | None,
-        status: dict | None) -> dict:
+        status: dict | None,
+        plan: ExtractionPlan = DEFAULT_PLAN) -> dict:
     """
     Merge data from the 3 API endpoints into a single dict.
 
@@ -36,51 +156,9 @@ def merge_api_data(
         monitor: Response from /monitor?refresh=true
         production: Response from /production2
         status: Response from /status
+        plan: Compiled field mapping, defaults to DEFAULT_FIELDS
 
     Returns:
         Merged dict with selected fields
     """
-    merged = {}
-
-    # Helper to only add if not None
-    def add_if_not_none(key: str, val: Any) -> None:
-        if val is not None:
-            merged[key] = val
-
-    # Extract from monitor
-    if monitor and "data" in monitor:
-        data = monitor["data"]
-        add_if_not_none("percent", _to_float(data.get("percent")))
-        add_if_not_none("w_cha", _to_int(data.get("w_cha")))
-        add_if_not_none("power_pv", _to_int(data.get("power_pv")))
-
-    # Extract from production
-    if production and "data" in production:
-        data = production["data"]
-        add_if_not_none("today_generation", _to_float(data.get("today_generation")))
-        add_if_not_none("month_generation", _to_float(data.get("month_generation")))
-        add_if_not_none("year_generation", _to_float(data.get("year_generation")))
-        add_if_not_none("total_generation", _to_float(data.get("total_generation")))
-        add_if_not_none("co2", _to_float(data.get("co2")))
-        add_if_not_none("tree", _to_float(data.get("tree")))
-        add_if_not_none("diesel", _to_float(data.get("diesel")))
-        add_if_not_none("today_revenue", _to_float(data.get("today_revenue")))
-        add_if_not_none("month_revenue", _to_float(data.get("month_revenue")))
-        add_if_not_none("total_revenue", _to_float(data.get("total_revenue")))
-
-    # Extract from status
-    if status and "data" in status:
-        data = status["data"]
-        if "gateway" in data:
-            gateway = data["gateway"]
-            add_if_not_none("gateway_online", _to_int(gateway.get("online")))
-            add_if_not_none("gateway_offline", _to_int(gateway.get("offline")))
-        if "inverter" in data:
-            inverter = data["inverter"]
-            add_if_not_none("inverter_online", _to_int(inverter.get("online")))
-            add_if_not_none("inverter_normal", _to_int(inverter.get("normal")))
-            add_if_not_none("inverter_offline", _to_int(inverter.get("offline")))
-            add_if_not_none("inverter_fault", _to_int(inverter.get("fault")))
-            add_if_not_none("inverter_wait", _to_int(inverter.get("wait")))
-
-    return merged
+    return plan.extract((monitor, production, status))
@@ -1,10 +1,18 @@
 """Home Assistant Discovery module."""
 from __future__ import annotations
+import hashlib
+import json
 import logging
-from typing import TYPE_CHECKING, Any, TypedDict
+import os
+import random
+import threading
+from typing import TYPE_CHECKING, Any, Callable, TypedDict
+from . import serialization
+from .resilience import RateLimiter
 
 if TYPE_CHECKING:
     from .config import Config
+    import paho.mqtt.client as mqtt
     from .mqtt_client import MqttClient
 
 logger = logging.getLogger(__name__)
@@ -157,15 +165,23 @@ SENSORS: dict[str, SensorAttribute] = {
 }
 
 
-def publish_discovery_message(
-    client: MqttClient,
-    config: Config,
-    system_id: str
-) -> None:
-    """Publishes Home Assistant discovery messages for a given system ID."""
-    if not config.ha_discovery_enabled:
-        return
+def sensors_for(config: Config) -> dict[str, SensorAttribute]:
+    """Built-in sensors plus those of the extra fields declared in config."""
+    sensors = dict(SENSORS)
+    for spec in config.extra_fields:
+        key = spec["key"]
+        # Overridden built-in fields keep their attributes unless redeclared
+        attributes = SensorAttribute(**sensors.get(key, {}))
+        attributes["name"] = spec.get("name") or attributes.get("name") or key.replace("_", " ").title()
+        for attribute in ("unit", "icon", "device_class", "state_class", "display_precision", "entity_category"):
+            if attribute in spec:
+                attributes[attribute] = spec[attribute]  # type: ignore[literal-required]
+        sensors[key] = attributes
+    return sensors
 
+
+def discovery_messages(config: Config, system_id: str) -> dict[str, dict[str, Any]]:
+    """Builds the Home Assistant discovery payloads of a system, by topic."""
     discovery_prefix = config.ha_discovery_prefix
     base_topic = config.mqtt_topic
     # Data topic where values will be published: <base_topic>/<system_id>
@@ -180,7 +196,8 @@ def publish_discovery_message(
         "model": "Hypon Inverter",
     }
 
-    for key, attributes in SENSORS.items():
+    messages = {}
+    for key, attributes in sensors_for(config).items():
         sensor_name = attributes["name"]
         # Unique ID for the sensor entity in HA
         unique_id = f"hypon_{system_id}_{key}"
@@ -191,14 +208,19 @@ def publish_discovery_message(
         payload: dict[str, Any] = {
             "name": f"{sensor_name}",
             "unique_id": unique_id,
-            "state_topic": state_topic,
-            "value_template": f"{{{{ value_json.{key} }}}}",
             "device": device_info,
             "availability_topic": availability_topic,
             "payload_available": "online",
             "payload_not_available": "offline",
         }
 
+        if config.mqtt_per_field_topics:
+            # Raw value on its own topic, no JSON parsing needed
+            payload["state_topic"] = f"{state_topic}/{key}"
+        else:
+            payload["state_topic"] = state_topic
+            payload["value_template"] = f"{{{{ value_json.{key} }}}}"
+
         if "unit" in attributes:
             payload["unit_of_measurement"] = attributes["unit"]
         if "device_class" in attributes:
@@ -212,6 +234,249 @@ def publish_discovery_message(
         if "display_precision" in attributes:
             payload["suggested_display_precision"] = attributes["display_precision"]
 
+        messages[discovery_topic] = payload
+    return messages
+
+
+def publish_discovery_message(
+    client: MqttClient,
+    config: Config,
+    system_id: str
+) -> None:
+    """Publishes Home Assistant discovery messages for a given system ID."""
+    if not config.ha_discovery_enabled:
+        return
+
+    for discovery_topic, payload in discovery_messages(config, system_id).items():
         # Publish with retain=True so HA finds it on restart
         client.publish(payload, topic=discovery_topic, retain=True)
-        logger.debug(f"Published discovery for {key} to {discovery_topic}")
+        logger.debug(f"Published discovery to {discovery_topic}")
+
+
+def payload_hash(payload: dict[str, Any]) -> str:
+    """Content hash of a discovery payload, independent of key order."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class DiscoveryState:
+    """Hashes of the discovery payloads retained on the broker, by topic.
+
+    Kept in a JSON file when a path is given, so a restart only publishes
+    the configs that are missing or changed.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._hashes: dict[str, str] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    hashes = json.load(f)
+                if not isinstance(hashes, dict):
+                    raise ValueError("not a JSON object")
+                self._hashes = {str(topic): str(digest) for topic, digest in hashes.items()}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read discovery state {path}, republishing everything: {e}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._hashes)
+
+    def is_current(self, topic: str, digest: str) -> bool:
+        with self._lock:
+            return self._hashes.get(topic) == digest
+
+    def record(self, topic: str, digest: str) -> None:
+        with self._lock:
+            self._hashes[topic] = digest
+
+    def forget(self, topic: str) -> None:
+        with self._lock:
+            self._hashes.pop(topic, None)
+
+    def topics(self) -> set[str]:
+        with self._lock:
+            return set(self._hashes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._hashes.clear()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            hashes = dict(self._hashes)
+        try:
+            serialization.write_json_file(self.path, hashes, sort_keys=True)
+        except OSError as e:
+            logger.warning(f"Could not write discovery state {self.path}: {e}")
+
+
+class DiscoveryPublisher:
+    """Publishes the discovery configs whose content changed since last time.
+
+    Payloads are built and hashed once per system. Configs already retained
+    with the same content are skipped, so Home Assistant does not reprocess
+    unchanged entities; the others are pipelined without waiting for each
+    publish, at most ha_discovery_rate per second. A hash is only recorded
+    once its message was written.
+
+    When Home Assistant announces it is online, after a restart or a broker
+    restart, every config is published again after a random delay of up to
+    ha_discovery_spread seconds, so many daemons do not publish at once.
+
+    On a configuration reload, ``update`` removes the entities that are gone
+    and publishes the configs that changed. Updates and publishes hold one
+    lock, so a republish never runs on a half-switched configuration.
+    """
+
+    def __init__(self, client: MqttClient, config: Config, state: DiscoveryState | None = None):
+        self.client = client
+        self.config = config
+        self.state = state if state is not None else DiscoveryState()
+        self.limiter = self._create_limiter(config)
+        self._messages: dict[str, dict[str, tuple[dict[str, Any], str]]] = {}
+        # Guards config, limiter and _messages; update publishes while holding it
+        self._lock = threading.RLock()
+        self._birth = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @staticmethod
+    def _create_limiter(config: Config) -> RateLimiter | None:
+        return RateLimiter(config.ha_discovery_rate, wait_counter=None) if config.ha_discovery_rate else None
+
+    @property
+    def birth_topic(self) -> str:
+        return f"{self.config.ha_discovery_prefix}/status"
+
+    def start(self) -> None:
+        """Republish discovery whenever Home Assistant comes online."""
+        self.client.subscribe(self.birth_topic, self.on_birth)
+        self._thread = threading.Thread(
+            target=self._republish_loop, name="discovery-birth", daemon=True)
+        self._thread.start()
+
+    def update(self, config: Config) -> int:
+        """Switch to a reloaded configuration.
+
+        Entities that are no longer configured are removed from Home
+        Assistant with an empty retained config, then the missing or changed
+        configs are published.
+
+        Returns:
+            Number of entities removed
+        """
+        with self._lock:
+            old_topics = self.state.topics()
+            for messages in self._messages.values():
+                old_topics.update(messages)
+            old_birth_topic = self.birth_topic
+
+            self.config = config
+            self.limiter = self._create_limiter(config)
+            self._messages = {}
+            new_topics: set[str] = set()
+            for system_id in config.system_ids:
+                new_topics.update(self._messages_of(system_id))
+
+            removed = sorted(old_topics - new_topics)
+            for topic in removed:
+                if self.limiter:
+                    self.limiter.acquire()
+                self.client.publish(b"", topic=topic, retain=True)
+                self.state.forget(topic)
+            if removed:
+                logger.info(f"Removed {len(removed)} Home Assistant discovery configs")
+
+            if self._thread and self.birth_topic != old_birth_topic:
+                self.client.unsubscribe(old_birth_topic)
+                self.client.subscribe(self.birth_topic, self.on_birth)
+            self.publish(config.system_ids)
+        return len(removed)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._birth.set()
+        if self._thread:
+            self.client.unsubscribe(self.birth_topic)
+            self._thread.join(timeout=5)
+
+    def on_birth(self, message: mqtt.MQTTMessage) -> None:
+        """Handle a message of the Home Assistant status topic."""
+        # A retained status is not news: Home Assistant did not just start
+        if message.retain or message.payload.strip() != b"online":
+            return
+        logger.info("Home Assistant came online, republishing discovery")
+        self._birth.set()
+
+    def _republish_loop(self) -> None:
+        while True:
+            self._birth.wait()
+            if self._stopped.is_set():
+                return
+            self._birth.clear()
+            if self._stopped.wait(random.uniform(0, self.config.ha_discovery_spread)):
+                return
+            with self._lock:
+                self.publish(list(self.config.system_ids), force=True)
+
+    def _messages_of(self, system_id: str) -> dict[str, tuple[dict[str, Any], str]]:
+        messages = self._messages.get(system_id)
+        if messages is None:
+            messages = {
+                topic: (payload, payload_hash(payload))
+                for topic, payload in discovery_messages(self.config, system_id).items()}
+            self._messages[system_id] = messages
+        return messages
+
+    def publish(self, system_ids: list[str], force: bool = False, timeout: float = 60.0) -> int:
+        """Publish the missing or changed configs of the systems.
+
+        Args:
+            force: Publish every config, e.g. after Home Assistant lost them
+            timeout: Seconds to wait for the messages to be written
+
+        Returns:
+            Number of configs published
+        """
+        with self._lock:
+            return self._publish(system_ids, force, timeout)
+
+    def _publish(self, system_ids: list[str], force: bool, timeout: float) -> int:
+        pending = []
+        total = 0
+        for system_id in system_ids:
+            for topic, (payload, digest) in self._messages_of(system_id).items():
+                total += 1
+                if force or not self.state.is_current(topic, digest):
+                    pending.append((topic, payload, digest))
+
+        remaining = len(pending)
+        done = threading.Condition()
+
+        def written(digest: str) -> Callable[[str, bool], None]:
+            def callback(topic: str, success: bool) -> None:
+                nonlocal remaining
+                if success:
+                    self.state.record(topic, digest)
+                with done:
+                    remaining -= 1
+                    done.notify_all()
+            return callback
+
+        for topic, payload, digest in pending:
+            if self.limiter:
+                self.limiter.acquire()
+            self.client.publish(payload, topic=topic, retain=True, callback=written(digest))
+        with done:
+            if not done.wait_for(lambda: remaining == 0, timeout):
+                logger.warning(f"{remaining} discovery messages not confirmed after {timeout} seconds")
+        self.state.save()
+        logger.info(
+            f"Published {len(pending)} Home Assistant discovery configs, "
+            f"{total - len(pending)} unchanged")
+        return len(pending)
@@ -1,35 +1,201 @@
+from __future__ import annotations
 import http.server
+import json
 import socketserver
 import logging
+import threading
+import time
+import urllib.parse
+from typing import Any, Callable, Iterable
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
 
 class HealthContext:
-    def __init__(self, mqtt_client):
+    """State of the daemon reported by the health server.
+
+    The daemon records the outcome of every system fetch and beats a heartbeat
+    from its fetch loop. The /livez and /readyz responses are rebuilt at most
+    every cache_ttl seconds, so frequent probes only return a cached snapshot.
+
+    Args:
+        mqtt_client: MQTT client whose connection is reported
+        system_ids: Systems expected to be fetched
+        max_staleness: Seconds after which a system without a successful
+            fetch is reported stale
+        heartbeat_timeout: Seconds without heartbeat after which the fetch
+            loop is considered stuck
+        cache_ttl: Lifetime of the cached snapshots, in seconds
+    """
+
+    def __init__(
+            self,
+            mqtt_client,
+            system_ids: Iterable[str] = (),
+            max_staleness: float = 180.0,
+            heartbeat_timeout: float = 300.0,
+            cache_ttl: float = 1.0,
+            clock: Callable[[], float] = time.monotonic):
         self.mqtt_client = mqtt_client
+        # AuthSession, set once the fetch engine is started
+        self.auth: Any = None
+        # History store, when enabled
+        self.history: Any = None
+        self.max_staleness = max_staleness
+        self.heartbeat_timeout = heartbeat_timeout
+        self.cache_ttl = cache_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._heartbeat = clock()
+        self._systems: dict[str, dict[str, Any]] = {
+            system_id: {"last_success": None, "last_fetch": None, "last_outcome": None}
+            for system_id in system_ids}
+        self._snapshots: dict[str, tuple[float, int, bytes]] = {}
+
+    def heartbeat(self) -> None:
+        """Signal that the fetch loop is alive."""
+        self._heartbeat = self._clock()
+
+    def set_systems(self, system_ids: Iterable[str]) -> None:
+        """Replace the systems expected to be fetched, keeping the state of the others."""
+        with self._lock:
+            self._systems = {
+                system_id: self._systems.get(
+                    system_id, {"last_success": None, "last_fetch": None, "last_outcome": None})
+                for system_id in system_ids}
+            self._snapshots.clear()
+
+    def record_fetch(self, system_id: str, success: bool) -> None:
+        """Record the outcome of a fetch of a system."""
+        now = self._clock()
+        with self._lock:
+            system = self._systems.setdefault(
+                system_id, {"last_success": None, "last_fetch": None, "last_outcome": None})
+            system["last_fetch"] = now
+            system["last_outcome"] = "success" if success else "failure"
+            if success:
+                system["last_success"] = now
+
+    def health(self) -> tuple[int, bytes]:
+        """Return the HTTP status and JSON body of /health."""
+        if self.mqtt_client.connected or self.mqtt_client.dry_run:
+            return 200, b'{"status": "healthy"}'
+        return 503, b'{"status": "unhealthy", "reason": "mqtt_disconnected"}'
+
+    def metrics(self) -> bytes:
+        """Return the Prometheus metrics of the daemon."""
+        return metrics.REGISTRY.render().encode()
+
+    def snapshot(self, name: str) -> tuple[int, bytes]:
+        """Return the HTTP status and JSON body of /livez or /readyz."""
+        now = self._clock()
+        cached = self._snapshots.get(name)
+        if cached is not None and now - cached[0] < self.cache_ttl:
+            return cached[1], cached[2]
+
+        status, body = self._livez(now) if name == "livez" else self._readyz(now)
+        encoded = json.dumps(body).encode()
+        self._snapshots[name] = (now, status, encoded)
+        return status, encoded
+
+    def history_range(self, query: str) -> tuple[int, bytes]:
+        """Return the HTTP status and JSON body of /history.
+
+        Query parameters: system_id, start and end as Unix timestamps (default
+        to the last 24 hours), resolution (auto, raw, 5m or 1h) and fields, a
+        comma separated list.
+        """
+        if self.history is None:
+            return 404, b'{"error": "history is disabled"}'
+        params = urllib.parse.parse_qs(query)
+        system_id = params.get("system_id", [None])[0]
+        if system_id not in self._systems:
+            return 404, json.dumps({"error": f"unknown system_id: {system_id}"}).encode()
+        try:
+            end = float(params.get("end", [time.time()])[0])
+            start = float(params.get("start", [end - 86400])[0])
+            fields = params.get("fields", [""])[0].split(",") if "fields" in params else None
+            resolution, points = self.history.query(
+                system_id, start, end, params.get("resolution", ["auto"])[0], fields)
+        except ValueError as e:
+            return 400, json.dumps({"error": str(e)}).encode()
+        return 200, json.dumps({
+            "system_id": system_id,
+            "start": start,
+            "end": end,
+            "resolution": resolution,
+            "points": points,
+        }).encode()
+
+    def _livez(self, now: float) -> tuple[int, dict[str, Any]]:
+        heartbeat_age = now - self._heartbeat
+        alive = heartbeat_age < self.heartbeat_timeout
+        return (200 if alive else 503), {
+            "status": "alive" if alive else "stuck",
+            "heartbeat_age": round(heartbeat_age, 3),
+        }
+
+    def _readyz(self, now: float) -> tuple[int, dict[str, Any]]:
+        mqtt_ok = bool(self.mqtt_client.connected or self.mqtt_client.dry_run)
+
+        systems = {}
+        with self._lock:
+            for system_id, system in self._systems.items():
+                last_success = system["last_success"]
+                age = None if last_success is None else now - last_success
+                systems[system_id] = {
+                    "fresh": age is not None and age < self.max_staleness,
+                    "last_success_age": None if age is None else round(age, 3),
+                    "last_outcome": system["last_outcome"],
+                }
+
+        issued_at = getattr(self.auth, "token_issued_at", None)
+        token_age = None if issued_at is None else round(now - issued_at, 3)
+
+        # Ready as long as MQTT works and some plant still gets fresh data
+        ready = mqtt_ok and any(system["fresh"] for system in systems.values())
+        reasons = []
+        if not mqtt_ok:
+            reasons.append("mqtt_disconnected")
+        if not any(system["fresh"] for system in systems.values()):
+            reasons.append("no_fresh_data")
+
+        body: dict[str, Any] = {
+            "status": "ready" if ready else "not_ready",
+            "mqtt_connected": mqtt_ok,
+            "token_age": token_age,
+            "heartbeat_age": round(now - self._heartbeat, 3),
+            "systems": systems,
+        }
+        if reasons:
+            body["reasons"] = reasons
+        return (200 if ready else 503), body
 
 
 class HealthHTTPHandler(http.server.BaseHTTPRequestHandler):
     def do_GET(self):
-        if self.path == '/health':
-            is_healthy = self.server.context.mqtt_client.connected or self.server.context.mqtt_client.dry_run
-
-            if is_healthy:
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(b'{"status": "healthy"}')
-            else:
-                self.send_response(503)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(
-                    b'{"status": "unhealthy", "reason": "mqtt_disconnected"}')
+        context = self.server.context
+        path, _, query = self.path.partition('?')
+        if path == '/health':
+            self._send(*context.health(), 'application/json')
+        elif path in ('/livez', '/readyz'):
+            self._send(*context.snapshot(path[1:]), 'application/json')
+        elif path == '/metrics':
+            self._send(200, context.metrics(), 'text/plain; version=0.0.4; charset=utf-8')
+        elif path == '/history':
+            self._send(*context.history_range(query), 'application/json')
         else:
             self.send_response(404)
             self.end_headers()
 
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
     def log_message(self, format, *args):
         # Silence default logging
         pass
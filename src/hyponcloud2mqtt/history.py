@@ -0,0 +1,233 @@
+"""Local history of the merged readings of every system.
+
+Each merged reading is appended to a SQLite database. Completed 5 minute and
+hourly buckets are rolled up into aggregates of every numeric field (count,
+average, minimum, maximum and last value), so raw readings can be dropped
+after a day while the trend stays available for months. Range queries are
+served by the health server on /history, for dashboards and re-syncs that
+should not hit the Hypon cloud again.
+"""
+from __future__ import annotations
+import logging
+import math
+import sqlite3
+import threading
+import time
+from typing import Any, Callable
+from . import serialization
+
+logger = logging.getLogger(__name__)
+
+RAW = "raw"
+# Rollup resolutions by name, in seconds, finest first
+RESOLUTIONS = {"5m": 300, "1h": 3600}
+
+
+def _numeric(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _merge(aggregates: dict[tuple, list], key: tuple, count: int, total: float,
+           minimum: float, maximum: float, last: float) -> None:
+    """Fold an aggregate into aggregates[key], rows being given in time order."""
+    aggregate = aggregates.get(key)
+    if aggregate is None:
+        aggregates[key] = [count, total, minimum, maximum, last]
+        return
+    aggregate[0] += count
+    aggregate[1] += total
+    aggregate[2] = min(aggregate[2], minimum)
+    aggregate[3] = max(aggregate[3], maximum)
+    aggregate[4] = last
+
+
+class History:
+    """Time series store of the merged readings, with downsampling.
+
+    Args:
+        path: SQLite database file
+        raw_retention: Seconds raw readings are kept
+        rollup_retention: Seconds 5 minute aggregates are kept
+        hourly_retention: Seconds hourly aggregates are kept
+        maintenance_interval: Minimum seconds between two rollups
+        clock: Wall clock, used to timestamp readings
+    """
+
+    def __init__(
+            self,
+            path: str,
+            raw_retention: float = 86400,
+            rollup_retention: float = 7 * 86400,
+            hourly_retention: float = 365 * 86400,
+            maintenance_interval: float = 60.0,
+            clock: Callable[[], float] = time.time):
+        self.path = path
+        self.retention = {RAW: raw_retention, "5m": rollup_retention, "1h": hourly_retention}
+        self.maintenance_interval = maintenance_interval
+        self._clock = clock
+        self._maintained_at = 0.0
+        self._lock = threading.Lock()
+        # Shared by the fetch threads and the health server, serialized by _lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS readings ("
+                "system_id TEXT NOT NULL, ts REAL NOT NULL, data BLOB NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS readings_system_ts ON readings (system_id, ts);"
+                "CREATE INDEX IF NOT EXISTS readings_ts ON readings (ts);"
+                "CREATE TABLE IF NOT EXISTS rollups ("
+                "resolution INTEGER NOT NULL, system_id TEXT NOT NULL, bucket INTEGER NOT NULL, "
+                "field TEXT NOT NULL, count INTEGER NOT NULL, sum REAL NOT NULL, "
+                "min REAL NOT NULL, max REAL NOT NULL, last REAL NOT NULL, "
+                "PRIMARY KEY (resolution, system_id, bucket, field)) WITHOUT ROWID;"
+                # End of the last bucket rolled up, per resolution
+                "CREATE TABLE IF NOT EXISTS watermarks ("
+                "resolution INTEGER PRIMARY KEY, rolled_until INTEGER NOT NULL);")
+
+    def record(self, system_id: str, data: dict[str, Any]) -> None:
+        """Append a merged reading, rolling up completed buckets from time to time."""
+        now = self._clock()
+        try:
+            with self._lock, self._db:
+                self._db.execute(
+                    "INSERT INTO readings (system_id, ts, data) VALUES (?, ?, ?)",
+                    (system_id, now, serialization.dumps(data)))
+            if now - self._maintained_at >= self.maintenance_interval:
+                self.maintain(now)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"Could not record history of {system_id}: {e}")
+
+    def maintain(self, now: float | None = None) -> None:
+        """Roll up completed buckets and drop data past its retention."""
+        now = self._clock() if now is None else now
+        self._maintained_at = now
+        with self._lock, self._db:
+            for name in RESOLUTIONS:
+                self._rollup(name, now)
+            self._db.execute("DELETE FROM readings WHERE ts < ?", (now - self.retention[RAW],))
+            for name, resolution in RESOLUTIONS.items():
+                self._db.execute(
+                    "DELETE FROM rollups WHERE resolution = ? AND bucket < ?",
+                    (resolution, now - self.retention[name]))
+
+    def _rollup(self, name: str, now: float) -> None:
+        resolution = RESOLUTIONS[name]
+        until = int(now // resolution * resolution)
+        row = self._db.execute(
+            "SELECT rolled_until FROM watermarks WHERE resolution = ?", (resolution,)).fetchone()
+        start = row[0] if row else 0
+        if start >= until:
+            return
+
+        aggregates: dict[tuple, list] = {}
+        if name == "5m":
+            for system_id, ts, data in self._db.execute(
+                    "SELECT system_id, ts, data FROM readings WHERE ts >= ? AND ts < ? ORDER BY ts",
+                    (start, until)):
+                bucket = int(ts // resolution * resolution)
+                for field, value in serialization.loads(data).items():
+                    if _numeric(value):
+                        _merge(aggregates, (system_id, bucket, field), 1, value, value, value, value)
+        else:
+            # Hourly aggregates are built from the 5 minute ones
+            finer = RESOLUTIONS["5m"]
+            for system_id, bucket, field, count, total, minimum, maximum, last in self._db.execute(
+                    "SELECT system_id, bucket, field, count, sum, min, max, last FROM rollups "
+                    "WHERE resolution = ? AND bucket >= ? AND bucket < ? ORDER BY bucket",
+                    (finer, start, until)):
+                key = (system_id, bucket // resolution * resolution, field)
+                _merge(aggregates, key, count, total, minimum, maximum, last)
+
+        self._db.executemany(
+            "INSERT INTO rollups (resolution, system_id, bucket, field, count, sum, min, max, last) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (resolution, system_id, bucket, field) DO UPDATE SET "
+            "count = count + excluded.count, sum = sum + excluded.sum, "
+            "min = min(min, excluded.min), max = max(max, excluded.max), last = excluded.last",
+            [(resolution, *key, *aggregate) for key, aggregate in aggregates.items()])
+        self._db.execute(
+            "INSERT OR REPLACE INTO watermarks (resolution, rolled_until) VALUES (?, ?)",
+            (resolution, until))
+        if aggregates:
+            logger.debug(f"Rolled up {len(aggregates)} {name} aggregates")
+
+    def resolution_for(self, start: float, now: float | None = None) -> str:
+        """Finest resolution still retained at start."""
+        now = self._clock() if now is None else now
+        for name in (RAW, *RESOLUTIONS):
+            if start >= now - self.retention[name]:
+                return name
+        return list(RESOLUTIONS)[-1]
+
+    def query(
+            self,
+            system_id: str,
+            start: float,
+            end: float,
+            resolution: str = "auto",
+            fields: list[str] | None = None,
+            limit: int = 10000) -> tuple[str, list[dict[str, Any]]]:
+        """Readings of a system between start (included) and end (excluded).
+
+        Raw points are the merged readings, with their timestamp in "ts".
+        Aggregated points map each field to its count, avg, min, max and last
+        value over the bucket starting at "ts"; only completed buckets are
+        returned.
+
+        Returns:
+            The resolution used and the points, oldest first
+
+        Raises:
+            ValueError: If the resolution is unknown
+        """
+        if resolution == "auto":
+            resolution = self.resolution_for(start)
+        if resolution != RAW and resolution not in RESOLUTIONS:
+            raise ValueError(
+                f"resolution must be one of auto, {RAW}, {', '.join(RESOLUTIONS)}, got: {resolution}")
+        wanted = set(fields) if fields else None
+
+        with self._lock:
+            if resolution == RAW:
+                rows = self._db.execute(
+                    "SELECT ts, data FROM readings WHERE system_id = ? AND ts >= ? AND ts < ? "
+                    "ORDER BY ts LIMIT ?", (system_id, start, end, limit)).fetchall()
+            else:
+                rows = self._db.execute(
+                    "SELECT bucket, field, count, sum, min, max, last FROM rollups "
+                    "WHERE resolution = ? AND system_id = ? AND bucket >= ? AND bucket < ? "
+                    "ORDER BY bucket, field",
+                    (RESOLUTIONS[resolution], system_id, start, end)).fetchall()
+
+        if resolution == RAW:
+            return resolution, self._raw_points(rows, wanted)
+        return resolution, self._rollup_points(rows, wanted, limit)
+
+    @staticmethod
+    def _raw_points(rows: list[tuple], wanted: set[str] | None) -> list[dict[str, Any]]:
+        points = []
+        for ts, data in rows:
+            reading = serialization.loads(data)
+            if wanted is not None:
+                reading = {field: value for field, value in reading.items() if field in wanted}
+            points.append({"ts": ts, **reading})
+        return points
+
+    @staticmethod
+    def _rollup_points(rows: list[tuple], wanted: set[str] | None, limit: int) -> list[dict[str, Any]]:
+        points: list[dict[str, Any]] = []
+        point: dict[str, Any] = {}
+        for bucket, field, count, total, minimum, maximum, last in rows:
+            if wanted is not None and field not in wanted:
+                continue
+            if point.get("ts") != bucket:
+                if len(points) == limit:
+                    break
+                point = {"ts": bucket}
+                points.append(point)
+            point[field] = {"count": count, "avg": total / count, "min": minimum, "max": maximum, "last": last}
+        return points
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -1,7 +1,14 @@
 from __future__ import annotations
 import requests
 import logging
-from typing import Any
+import time
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlparse
+from . import metrics, serialization
+
+if TYPE_CHECKING:
+    from .capture import CaptureWriter
+    from .resilience import CircuitBreaker, CircuitBreakers, RateLimiter
 
 logger = logging.getLogger(__name__)
 
@@ -10,54 +17,143 @@ class AuthenticationError(Exception):
     """Raised when API authentication fails (code 50008)."""
 
 
+def parse_api_response(data: Any, url: str) -> Any | None:
+    """Validate the custom code field of a decoded API response.
+
+    Raises:
+        AuthenticationError: If the API reports an expired token (code 50008)
+    """
+    if not isinstance(data, dict):
+        logger.error(f"Response is not a JSON object: {data}")
+        return None
+
+    code = data.get("code")
+
+    # Check for authentication failure
+    if code == 50008:
+        logger.warning(
+            f"Authentication failed (code 50008) for {url} - token may be expired")
+        raise AuthenticationError(
+            "Token expired or invalid (code 50008)")
+
+    if code != 20000:
+        logger.error(f"API returned error code {code} from {url}")
+        return None
+
+    logger.debug(f"Successfully fetched data from {url}")
+    return data
+
+
+def endpoint_name(url: str) -> str:
+    """Name of an API endpoint, used as metrics label (e.g. "production2")."""
+    return urlparse(url).path.rstrip("/").rsplit("/", 1)[-1]
+
+
+def record_request(endpoint: str, start: float, result: str) -> None:
+    """Record the duration and result of a request to the cloud API."""
+    metrics.HTTP_REQUEST_DURATION.observe(time.monotonic() - start, endpoint=endpoint)
+    metrics.HTTP_REQUESTS.inc(endpoint=endpoint, result=result)
+
+
+def record_outcome(breaker: CircuitBreaker | None, result: str) -> None:
+    """Report the result of a request to the circuit breaker of its endpoint.
+
+    Only transport failures and server errors count against the endpoint. An
+    error of a single plant or an expired token says nothing about it, as the
+    breaker is shared by every system.
+    """
+    if breaker is None:
+        return
+    if result == "error":
+        breaker.record_failure()
+    elif result == "success":
+        breaker.record_success()
+    else:
+        breaker.record_neutral()
+
+
 class HttpClient:
+    """Client of a single API endpoint.
+
+    Args:
+        limiter: Rate limiter shared by every request to the API
+        breakers: Circuit breakers, the one of this endpoint is used
+        timeout: Seconds, or (connect, read) seconds
+        capture: Writer recording every response received
+    """
+
     def __init__(
             self,
             url: str,
-            session: requests.Session):
+            session: requests.Session,
+            limiter: RateLimiter | None = None,
+            breakers: CircuitBreakers | None = None,
+            timeout: float | tuple[float, float] = 10,
+            capture: CaptureWriter | None = None):
         self.url = url
+        self.capture = capture
         self.session = session
+        self.timeout = timeout
+        self.endpoint = endpoint_name(url)
+        self.limiter = limiter
+        self.breaker = breakers.get(self.endpoint) if breakers is not None else None
         logger.debug(f"Initialized HttpClient for {url}")
 
     def fetch_data(self) -> Any | None:
+        if self.breaker is not None and not self.breaker.allow():
+            logger.debug(f"Circuit breaker for {self.endpoint} is open, skipping {self.url}")
+            return None
+        if self.limiter is not None:
+            self.limiter.acquire()
+
+        start = time.monotonic()
+        result = "error"
+        try:
+            data, result = self._fetch_data()
+            return data
+        except AuthenticationError:
+            result = "auth_expired"
+            raise
+        finally:
+            record_request(self.endpoint, start, result)
+            record_outcome(self.breaker, result)
+
+    def _fetch_data(self) -> tuple[Any | None, str]:
+        """Fetch the endpoint.
+
+        Returns:
+            The data, None on failure, and the result of the request: success,
+            error for a failure of the endpoint, api_error for a rejection of
+            the plant or an invalid response
+        """
         logger.debug(f"Fetching data from {self.url}")
         try:
-            response = self.session.get(self.url, timeout=10)
+            response = self.session.get(self.url, timeout=self.timeout)
             logger.debug(
                 f"Response received from {self.url}, status code: {response.status_code}")
+            if self.capture is not None:
+                self.capture.record(
+                    self.url, response.status_code, response.elapsed.total_seconds(), response.content)
             response.raise_for_status()
-            data = response.json()
-
-            # Validate custom code field
-            if not isinstance(data, dict):
-                logger.error(f"Response is not a JSON object: {data}")
-                return None
+            data = serialization.loads(response.content)
 
-            code = data.get("code")
-
-            # Check for authentication failure
-            if code == 50008:
-                logger.warning(
-                    f"Authentication failed (code 50008) for {self.url} - token may be expired")
-                raise AuthenticationError(
-                    "Token expired or invalid (code 50008)")
-
-            if code != 20000:
-                logger.error(f"API returned error code {code} from {self.url}")
-                return None
-
-            logger.debug(f"Successfully fetched data from {self.url}")
-            return data
+            data = parse_api_response(data, self.url)
+            return data, "success" if data is not None else "api_error"
         except requests.exceptions.SSLError as e:
             # SSL verification is now handled by the session, but it's good to keep this logging
             logger.error(
                 f"SSL certificate verification failed for {self.url}: {e}")
             logger.error(
                 "Consider setting VERIFY_SSL=false if using self-signed certificates")
-            return None
+            return None, "error"
+        except requests.HTTPError as e:
+            logger.error(f"Error fetching data from {self.url}: {e}")
+            status = e.response.status_code if e.response is not None else None
+            # A client error rejects this plant, not the endpoint
+            return None, "api_error" if status is not None and status < 500 else "error"
         except requests.RequestException as e:
             logger.error(f"Error fetching data from {self.url}: {e}")
-            return None
+            return None, "error"
         except ValueError as e:
             logger.error(f"Error parsing JSON response: {e}")
-            return None
+            return None, "api_error"
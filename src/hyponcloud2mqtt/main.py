@@ -6,11 +6,24 @@ import logging
 import signal
 import sys
 import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from . import metrics, serialization
 from .config import Config
 from .mqtt_client import MqttClient
 from .health_server import HealthServer, HealthContext, HealthHTTPHandler
-from .data_fetcher import DataFetcher
-from .discovery import publish_discovery_message
+from .auth import AuthSession
+from .change_detector import ChangeDetector, FieldTracker
+from .data_fetcher import DataFetcher, EndpointCache
+from .data_merger import compile_fields
+from .discovery import DiscoveryPublisher, DiscoveryState
+from .history import History
+from .outbox import Outbox, OutboxMessage
+from .reload import (
+    FETCHER_FIELDS, MQTT_FIELDS, DISCOVERY_FIELDS, PUBLISH_FIELDS, SCHEDULE_FIELDS, SESSION_FIELDS,
+    ConfigWatcher, reloadable)
+from .scheduler import AdaptivePolling, Scheduler
+from .worker_pool import WorkerPool
 
 # Configure logging
 log_level = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -22,27 +35,60 @@ logger = logging.getLogger(__name__)
 
 
 class Daemon:
-    def __init__(self, config: Config | None = None):
+    def __init__(self, config: Config | None = None, config_path: str | None = None):
         self.running = True
         self.config = config
+        # File the configuration is reloaded from on SIGHUP or change
+        self.config_path = config_path
+        self.watcher: ConfigWatcher | None = None
+        self.auth: AuthSession | None = None
+        self.pool: WorkerPool | None = None
+        self.fetchers: dict[str, DataFetcher] = {}
+        self.change_detector: ChangeDetector | None = None
+        self.field_tracker: FieldTracker | None = None
+        self.outbox: Outbox | None = None
+        self.discovery: DiscoveryPublisher | None = None
+        self.history: History | None = None
+        self.health_context: HealthContext | None = None
+        self.scheduler: Scheduler | None = None
+        self.adaptive_polling: AdaptivePolling | None = None
+        self._discovery_thread: threading.Thread | None = None
+        self._reconnect_delay = 5
+        self._next_reconnect = 0.0
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._reload_handler)
 
     def _signal_handler(self, signum, frame):
         logger.info(f"Received signal {signum}, stopping...")
         self.running = False
 
+    def _reload_handler(self, signum, frame):
+        if self.watcher is None:
+            logger.warning(
+                f"Received signal {signum}, but reloading requires a config file and the threads engine")
+            return
+        logger.info(f"Received signal {signum}, reloading the configuration...")
+        self.watcher.request()
+
     def run(self):  # noqa: C901
         if self.config:
             config = self.config
         else:
-            config_path = os.getenv("CONFIG_FILE", "config.yaml")
+            self.config_path = os.getenv("CONFIG_FILE", "config.yaml")
             try:
-                config = Config.load(config_path)
+                config = Config.load(self.config_path)
             except Exception as e:
                 logger.critical(f"Configuration error: {e}")
                 sys.exit(1)
 
+        try:
+            logger.info(f"Using the {serialization.use(config.json_backend).name} JSON backend")
+        except RuntimeError as e:
+            logger.critical(f"Configuration error: {e}")
+            sys.exit(1)
+
         mqtt_client = MqttClient(
             config.mqtt_broker,
             config.mqtt_port,
@@ -54,18 +100,24 @@ class Daemon:
             config.mqtt_tls_enabled,
             config.mqtt_tls_insecure,
             config.mqtt_ca_path,
-            config.mqtt_client_id
+            config.mqtt_client_id,
+            config.mqtt_max_inflight
         )
+        metrics.MQTT_INFLIGHT.set_function(lambda: mqtt_client.inflight)
 
         # Start Health Server
         if config.health_server_enabled:
-            health_context = HealthContext(mqtt_client)
+            self.health_context = HealthContext(
+                mqtt_client,
+                config.system_ids,
+                max_staleness=config.health_max_staleness or 3 * config.max_fetch_interval,
+                heartbeat_timeout=config.health_heartbeat_timeout)
             health_server = HealthServer(
-                ('0.0.0.0', 8080), HealthHTTPHandler, health_context)
+                (config.health_host, config.health_port), HealthHTTPHandler, self.health_context)
             health_thread = threading.Thread(
                 target=health_server.serve_forever, daemon=True)
             health_thread.start()
-            logger.info("Health check server started on port 8080")
+            logger.info(f"Health check server started on port {config.health_port}")
 
         # Connect to MQTT (with retry logic if not in dry run mode)
         if not config.dry_run:
@@ -86,6 +138,7 @@ class Daemon:
                             logger.info(
                                 "Stopping before MQTT connection established")
                             sys.exit(0)
+                        self._heartbeat()
                         time.sleep(1)
 
                     # Exponential backoff
@@ -96,87 +149,564 @@ class Daemon:
         else:
             logger.info("[DRY RUN] Skipping MQTT connection")
 
-        # Publish HA Discovery (only if MQTT is connected)
+        # Publish HA Discovery (only if MQTT is connected), alongside the
+        # first fetch cycle
         if config.ha_discovery_enabled:
             if mqtt_client.connected:
                 logger.info("Publishing Home Assistant discovery messages...")
-                for system_id in config.system_ids:
-                    publish_discovery_message(mqtt_client, config, system_id)
+                self._start_discovery(mqtt_client, config)
             else:
                 logger.warning(
                     "Skipping Home Assistant discovery: MQTT not connected")
 
-        # Initialize Data Fetchers for each system ID
-        data_fetchers = [DataFetcher(config, system_id)
-                         for system_id in config.system_ids]
+        self._create_publish_state(config)
+
+        drain_thread = None
+        if config.outbox_path and not config.dry_run:
+            outbox = self.outbox = Outbox(
+                config.outbox_path, config.outbox_max_messages, config.outbox_max_age)
+            metrics.OUTBOX_MESSAGES.set_function(lambda: len(outbox))
+            drain_thread = threading.Thread(
+                target=self._drain_outbox, args=(mqtt_client, config),
+                name="outbox", daemon=True)
+            drain_thread.start()
+            logger.info(f"Outbox enabled: payloads are buffered in {config.outbox_path} while MQTT is down")
+
+        if config.history_path:
+            self.history = History(
+                config.history_path,
+                raw_retention=config.history_raw_retention,
+                rollup_retention=config.history_rollup_retention,
+                hourly_retention=config.history_hourly_retention)
+            if self.health_context:
+                self.health_context.history = self.history
+            logger.info(f"History enabled: readings are kept in {config.history_path}")
+
+        if self.config_path and config.engine == "threads":
+            self.watcher = ConfigWatcher(self.config_path, config.config_watch_interval)
+
+        if config.engine == "asyncio":
+            self._run_asyncio(config, mqtt_client)
+        else:
+            self._run_threaded(config, mqtt_client)
+
+        if self.discovery:
+            self.discovery.stop()
+        if self._discovery_thread:
+            self._discovery_thread.join(timeout=mqtt_client.publish_timeout)
+        if drain_thread:
+            drain_thread.join(timeout=mqtt_client.publish_timeout)
+            metrics.OUTBOX_MESSAGES.set_function(None)
+        if self.history:
+            self.history.close()
+        mqtt_client.disconnect()
+        # After the last publish outcomes, which update the outbox
+        if drain_thread:
+            self.outbox.close()
+        logger.info("Daemon stopped")
+
+    def _run_threaded(self, config, mqtt_client):
+        # Initialize Data Fetchers for each system ID, sharing one long-lived
+        # worker pool and one authenticated session (single login, single
+        # connection pool sized for the workers)
+        pool = self.pool = WorkerPool(
+            config.worker_pool_size or config.fetch_concurrency * 3)
+        metrics.WORKER_QUEUE_DEPTH.set_function(lambda: pool.queue_depth)
+        try:
+            self._set_auth(AuthSession(config, pool_maxsize=max(10, pool.max_workers)))
+        except RuntimeError as e:
+            logger.critical(f"Configuration error: {e}")
+            sys.exit(1)
+        self.fetchers = self._create_fetchers(config)
         logger.info(
-            f"Initialized {len(data_fetchers)} data fetchers for system IDs: {config.system_ids}")
+            f"Initialized {len(self.fetchers)} data fetchers for system IDs: {config.system_ids}")
+
+        # Fetch several systems at once when a concurrency limit is configured
+        executor = None
+        workers = min(config.fetch_concurrency, len(self.fetchers))
+        if workers > 1:
+            executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="fetch")
+            logger.info(f"Fetching up to {workers} systems concurrently")
+
+        self.scheduler = self._create_scheduler(config)
 
         logger.info(
-            f"Starting daemon, fetching every {config.http_interval} seconds")
+            f"Starting daemon, fetching every {config.cycle_interval} seconds "
+            f"(endpoint intervals: {config.endpoint_intervals()})")
 
         while self.running:
+            if self.watcher and self.watcher.pending():
+                config = self._reload_config(config, mqtt_client)
+
             # Check MQTT connection before fetching (unless in dry run mode)
-            if not config.dry_run and not mqtt_client.connected:
-                logger.warning(
-                    "MQTT disconnected, attempting to reconnect...")
-                retry_delay = 5
-                max_retry_delay = 60
+            if not self._ensure_connected(mqtt_client, config):
+                break
+
+            due = self.scheduler.due()
+            if due:
+                logger.debug(
+                    f"Starting fetch cycle for {len(due)} systems (interval: {config.cycle_interval}s)")
+                start = time.monotonic()
+                self._run_cycle(
+                    [self.fetchers[system_id] for system_id in due],
+                    mqtt_client, config, executor)
+                metrics.CYCLE_DURATION.observe(time.monotonic() - start)
+                logger.debug(f"Worker pool stats: {pool.stats()}")
+
+            self._sleep_until(self.scheduler.next_deadline())
+
+        self.auth.stop_refresher()
+        if executor:
+            executor.shutdown(wait=True)
+        pool.shutdown(wait=True)
+        self.auth.close()
+
+    def _set_auth(self, auth: AuthSession) -> None:
+        """Switch to a new API session, closing the previous one."""
+        previous = self.auth
+        self.auth = auth
+        if self.health_context:
+            self.health_context.auth = auth
+        auth.start_refresher()
+        if previous:
+            previous.stop_refresher()
+            previous.close()
+
+    def _create_fetchers(self, config, reuse: dict[str, DataFetcher] | None = None) -> dict[str, DataFetcher]:
+        """Data fetchers of the configured systems, by system ID.
+
+        Fetchers found in reuse are kept, with their endpoint cache.
+        """
+        plan = compile_fields(config.extra_fields)
+        fetchers = {}
+        for system_id in config.system_ids:
+            fetcher = (reuse or {}).get(system_id)
+            if fetcher is None:
+                fetcher = DataFetcher(
+                    config, system_id, self.auth, self.pool, self._create_endpoint_cache(config), plan)
+            fetchers[system_id] = fetcher
+        return fetchers
+
+    def _run_asyncio(self, config, mqtt_client):
+        # Imported lazily: the asyncio engine needs the optional aiohttp extra
+        from .async_engine import AsyncEngine
+
+        try:
+            auth = AuthSession(config)
+        except RuntimeError as e:
+            logger.critical(f"Configuration error: {e}")
+            sys.exit(1)
+        if self.health_context:
+            self.health_context.auth = auth
+        auth.ensure_logged_in()
+        scheduler = self._create_scheduler(config)
+        self.scheduler = scheduler
+        try:
+            engine = AsyncEngine(
+                config,
+                auth,
+                lambda system_id, merged_data: self._handle_result(
+                    system_id, merged_data, mqtt_client, config),
+                lambda: self.running,
+                lambda: self._ensure_connected(mqtt_client, config),
+                scheduler,
+                lambda: self._create_endpoint_cache(config),
+                self._heartbeat)
+        except RuntimeError as e:
+            logger.critical(f"Configuration error: {e}")
+            sys.exit(1)
+        auth.start_refresher()
+        try:
+            engine.run()
+        finally:
+            auth.stop_refresher()
+            auth.close()
+
+    @staticmethod
+    def _create_endpoint_cache(config) -> EndpointCache:
+        # Jitter must not push an endpoint to the following cycle
+        return EndpointCache(
+            config.endpoint_intervals(), tolerance=config.cycle_interval / 2)
+
+    def _create_scheduler(self, config) -> Scheduler:
+        interval = config.cycle_interval
+        if config.adaptive_polling:
+            interval = config.adaptive_min_interval or interval
+            self.adaptive_polling = AdaptivePolling(interval, config.adaptive_max_interval)
+            logger.info(
+                f"Adaptive polling enabled: idle systems back off from {interval} "
+                f"to {config.adaptive_max_interval} seconds")
+        return Scheduler(
+            interval,
+            config.system_ids,
+            jitter=config.schedule_jitter,
+            phase_spread=config.schedule_phase_spread,
+            overrun=config.schedule_overrun)
+
+    def _create_publish_state(self, config) -> None:
+        """Change detection of the published payloads, when enabled."""
+        self.change_detector = None
+        if config.delta_publishing:
+            self.change_detector = ChangeDetector(
+                config.delta_deadbands, config.delta_full_refresh_cycles)
+            logger.info("Delta publishing enabled: unchanged payloads are skipped")
+
+        self.field_tracker = None
+        if config.mqtt_per_field_topics:
+            self.field_tracker = FieldTracker()
+            logger.info("Per-field topics enabled: changed fields are published to their own topic")
+
+    def _start_discovery(self, mqtt_client, config) -> None:
+        self.discovery = DiscoveryPublisher(
+            mqtt_client, config, DiscoveryState(config.ha_discovery_state_path))
+        self._run_discovery(self.discovery.publish, config.system_ids)
+        self.discovery.start()
+
+    def _run_discovery(self, target, *args) -> None:
+        """Run a discovery publish in the background, after the previous one."""
+        previous = self._discovery_thread
+
+        def run():
+            if previous:
+                previous.join()
+            target(*args)
+        self._discovery_thread = threading.Thread(target=run, name="discovery", daemon=True)
+        self._discovery_thread.start()
+
+    def _reload_config(self, config, mqtt_client):
+        """Load the config file again and apply what changed.
+
+        Returns:
+            The configuration now running, unchanged if the file is invalid
+        """
+        self.watcher.acknowledge()
+        try:
+            loaded = Config.load(self.config_path)
+        except Exception as e:
+            logger.error(f"Configuration reload failed, keeping the running configuration: {e}")
+            return config
+        new, changed = reloadable(config, loaded)
+        if not changed:
+            logger.info("Configuration reloaded, nothing changed")
+            return config
+        logger.info(f"Configuration reloaded, applying changes of {', '.join(sorted(changed))}")
+
+        if not self._reload_fetchers(new, changed):
+            return config
+        if changed & MQTT_FIELDS:
+            self._reconfigure_mqtt(mqtt_client, new)
+        mqtt_client.topic = new.mqtt_topic
+        self._reschedule(config, new, changed)
+        if changed & PUBLISH_FIELDS:
+            self._create_publish_state(new)
+        if self.health_context:
+            self.health_context.set_systems(new.system_ids)
+            self.health_context.max_staleness = new.health_max_staleness or 3 * new.max_fetch_interval
+            self.health_context.heartbeat_timeout = new.health_heartbeat_timeout
+        if changed & (DISCOVERY_FIELDS | MQTT_FIELDS):
+            self._reload_discovery(mqtt_client, new, changed)
+
+        self.config = new
+        return new
+
+    def _reload_fetchers(self, config, changed) -> bool:
+        """Log in again or rebuild the fetchers if needed, else add and remove systems.
+
+        Returns:
+            False if the new API session could not be created
+        """
+        if changed & SESSION_FIELDS:
+            try:
+                auth = AuthSession(config, pool_maxsize=max(10, self.pool.max_workers if self.pool else 0))
+            except (RuntimeError, OSError) as e:
+                logger.error(f"Configuration reload failed, keeping the running configuration: {e}")
+                return False
+            logger.info("API settings changed, logging in again")
+            # The fetchers would exit on rejected credentials: check them first
+            if auth.has_credentials and not auth.try_login():
+                auth.close()
+                logger.error("Configuration reload failed, login rejected, keeping the running configuration")
+                return False
+            self._set_auth(auth)
+            self.fetchers = self._create_fetchers(config)
+        elif changed & FETCHER_FIELDS:
+            self.fetchers = self._create_fetchers(config)
+        else:
+            self.fetchers = self._create_fetchers(config, reuse=self.fetchers)
+        return True
 
-                while self.running and not mqtt_client.connected:
-                    if mqtt_client.connect(timeout=10):
-                        logger.info("Reconnected to MQTT broker")
+    def _reconfigure_mqtt(self, mqtt_client, config) -> None:
+        logger.info("MQTT settings changed, reconnecting to the broker")
+        mqtt_client.reconfigure(
+            config.mqtt_broker,
+            config.mqtt_port,
+            config.mqtt_availability_topic,
+            config.mqtt_username,
+            config.mqtt_password,
+            config.mqtt_tls_enabled,
+            config.mqtt_tls_insecure,
+            config.mqtt_ca_path,
+            config.mqtt_client_id)
+        self._next_reconnect = 0.0
+        self._reconnect_delay = 5
+        self._ensure_connected(mqtt_client, config)
+
+    def _reschedule(self, old, new, changed) -> None:
+        """Rebuild the fetch timeline, or only add and remove systems."""
+        removed = [system_id for system_id in old.system_ids if system_id not in new.system_ids]
+        added = [system_id for system_id in new.system_ids if system_id not in old.system_ids]
+        for system_id in removed:
+            if self.change_detector:
+                self.change_detector.forget(system_id)
+            if self.field_tracker:
+                self.field_tracker.forget(system_id)
+        if removed or added:
+            logger.info(f"Systems added: {added or 'none'}, removed: {removed or 'none'}")
+
+        if self.scheduler is None or changed & SCHEDULE_FIELDS:
+            self.adaptive_polling = None
+            self.scheduler = self._create_scheduler(new)
+            return
+        for system_id in removed:
+            self.scheduler.remove(system_id)
+        for system_id in added:
+            self.scheduler.add(system_id)
+
+    def _reload_discovery(self, mqtt_client, config, changed) -> None:
+        if not config.ha_discovery_enabled:
+            if self.discovery:
+                logger.info("Home Assistant discovery disabled")
+                self.discovery.stop()
+                self.discovery = None
+            return
+        if self.discovery is None:
+            self._start_discovery(mqtt_client, config)
+            return
+        if changed & MQTT_FIELDS:
+            # The broker may not retain the configs published so far
+            self.discovery.state.clear()
+        self._run_discovery(self.discovery.update, config)
+
+    def _heartbeat(self) -> None:
+        if self.health_context:
+            self.health_context.heartbeat()
+
+    def _sleep_until(self, deadline: float) -> None:
+        # Sleep in short intervals to respond to signals faster
+        while self.running:
+            self._heartbeat()
+            if self.watcher and self.watcher.pending():
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(1.0, remaining))
+
+    def _ensure_connected(self, mqtt_client, config) -> bool:
+        """Make sure MQTT is connected before a fetch cycle.
+
+        Without an outbox this blocks until reconnected. With an outbox,
+        fetching goes on while the broker is retried with backoff and the
+        payloads are buffered meanwhile.
+
+        Returns:
+            False if the daemon was stopped meanwhile
+        """
+        if config.dry_run or mqtt_client.connected:
+            return True
+        if self.outbox is None:
+            return self._reconnect_mqtt(mqtt_client)
+
+        if time.monotonic() >= self._next_reconnect:
+            self._forget_published()
+            if mqtt_client.connect(timeout=10):
+                logger.info("Reconnected to MQTT broker")
+                self._reconnect_delay = 5
+            else:
+                logger.warning(
+                    f"MQTT reconnection failed, buffering payloads and retrying in {self._reconnect_delay} seconds...")
+                self._next_reconnect = time.monotonic() + self._reconnect_delay
+                # Exponential backoff
+                self._reconnect_delay = min(self._reconnect_delay * 2, 60)
+        return self.running
+
+    def _forget_published(self) -> None:
+        # Subscribers may have missed updates, publish full state again
+        if self.change_detector:
+            self.change_detector.forget()
+        if self.field_tracker:
+            self.field_tracker.forget()
+
+    def _reconnect_mqtt(self, mqtt_client) -> bool:
+        """Reconnect to the broker with exponential backoff.
+
+        Returns:
+            True once reconnected, False if the daemon was stopped meanwhile
+        """
+        logger.warning(
+            "MQTT disconnected, attempting to reconnect...")
+        self._forget_published()
+        retry_delay = 5
+        max_retry_delay = 60
+
+        while self.running and not mqtt_client.connected:
+            if mqtt_client.connect(timeout=10):
+                logger.info("Reconnected to MQTT broker")
+                break
+            else:
+                logger.warning(
+                    f"MQTT reconnection failed, retrying in {retry_delay} seconds...")
+                # Sleep in short intervals to respond to signals
+                for _ in range(retry_delay):
+                    if not self.running:
                         break
-                    else:
-                        logger.warning(
-                            f"MQTT reconnection failed, retrying in {retry_delay} seconds...")
-                        # Sleep in short intervals to respond to signals
-                        for _ in range(retry_delay):
-                            if not self.running:
-                                break
-                            time.sleep(1)
-
-                        # Exponential backoff
-                        retry_delay = min(retry_delay * 2, max_retry_delay)
+                    self._heartbeat()
+                    time.sleep(1)
 
-                if not self.running:
-                    break
+                # Exponential backoff
+                retry_delay = min(retry_delay * 2, max_retry_delay)
 
-            logger.debug(
-                f"Starting fetch cycle (interval: {config.http_interval}s)")
+        return self.running
 
+    def _run_cycle(self, data_fetchers, mqtt_client, config, executor=None):
+        """Run one fetch cycle, sequentially or on the given executor."""
+        if executor is None:
             for fetcher in data_fetchers:
                 if not self.running:
                     break
-
-                system_id = fetcher.system_id
-                logger.debug(f"Fetching data for system_id: {system_id}")
-
-                # Fetch and Merge Data
-                merged_data = fetcher.fetch_all()
-
-                # Construct topic for this system_id
-                # Append system_id to base topic
-                system_topic = f"{config.mqtt_topic}/{system_id}"
-
-                if merged_data:
-                    logger.debug(
-                        f"Publishing merged data for {system_id} to {system_topic}")
-                    mqtt_client.publish(merged_data, topic=system_topic)
-                    logger.info(
-                        f"Data for {system_id} published successfully")
-                else:
-                    logger.warning(
-                        f"No data to publish for system_id: {system_id} (endpoints failed or returned empty)")
-
-            # Sleep in short intervals to respond to signals faster
-            for _ in range(config.http_interval):
-                if not self.running:
-                    break
+                self._process_fetcher(fetcher, mqtt_client, config)
+            return
+
+        futures = [
+            executor.submit(self._process_fetcher, fetcher, mqtt_client, config)
+            for fetcher in data_fetchers]
+        for future in futures:
+            future.result()
+
+    def _process_fetcher(self, fetcher, mqtt_client, config):
+        """Fetch, merge and publish data for a single system."""
+        if not self.running:
+            return
+
+        logger.debug(f"Fetching data for system_id: {fetcher.system_id}")
+
+        # Fetch and Merge Data
+        start = time.monotonic()
+        merged_data = fetcher.fetch_all()
+        metrics.SYSTEM_FETCH_DURATION.set(time.monotonic() - start, system_id=fetcher.system_id)
+        self._handle_result(fetcher.system_id, merged_data, mqtt_client, config)
+        # Long cycles of many systems must not look stuck
+        self._heartbeat()
+
+    def _handle_result(self, system_id, merged_data, mqtt_client, config):
+        """Publish the merged data of a system, shared by both engines."""
+        # Construct topic for this system_id
+        # Append system_id to base topic
+        system_topic = f"{config.mqtt_topic}/{system_id}"
+
+        if self.health_context:
+            self.health_context.record_fetch(system_id, bool(merged_data))
+
+        if not merged_data:
+            logger.warning(
+                f"No data to publish for system_id: {system_id} (endpoints failed or returned empty)")
+            return
+        metrics.SYSTEM_LAST_SUCCESS.set(time.time(), system_id=system_id)
+        self._adapt_interval(system_id, merged_data)
+        if self.history:
+            self.history.record(system_id, merged_data)
+
+        if self.field_tracker:
+            self._publish_fields(system_id, merged_data, mqtt_client, system_topic)
+
+        if self.change_detector and not self.change_detector.should_publish(system_id, merged_data):
+            logger.debug(f"Data for {system_id} unchanged, skipping publish")
+            return
+
+        # Buffer while disconnected, and behind older buffered payloads
+        if self.outbox is not None and (not mqtt_client.connected or len(self.outbox)):
+            self.outbox.put(system_topic, merged_data)
+            logger.debug(f"Data for {system_id} buffered in the outbox")
+            return
+
+        logger.debug(
+            f"Publishing merged data for {system_id} to {system_topic}")
+        if mqtt_client.publish(merged_data, topic=system_topic):
+            logger.info(
+                f"Data for {system_id} published successfully")
+        elif self.change_detector:
+            # Make sure the next cycle publishes again
+            self.change_detector.forget(system_id)
+
+    def _adapt_interval(self, system_id, merged_data) -> None:
+        if self.adaptive_polling is None or self.scheduler is None:
+            return
+        interval = self.adaptive_polling.update(system_id, merged_data)
+        if interval is not None:
+            self.scheduler.set_interval(system_id, interval)
+            logger.info(f"Polling {system_id} every {interval} seconds")
+
+    def _publish_fields(self, system_id, merged_data, mqtt_client, system_topic):
+        """Publish each changed field to its own retained subtopic."""
+        changed = self.field_tracker.changed_fields(system_id, merged_data)
+        for key, value in changed.items():
+            if not mqtt_client.publish(value, topic=f"{system_topic}/{key}", retain=True):
+                self.field_tracker.forget(system_id, key)
+        if changed:
+            logger.debug(f"Published {len(changed)} changed fields for {system_id}")
+
+    def _drain_outbox(self, mqtt_client, config):
+        """Publish buffered payloads in order once MQTT is connected again."""
+        outbox = self.outbox
+        # Throttle to outbox_drain_rate so the broker is not flooded
+        delay = 1.0 / config.outbox_drain_rate
+        while self.running:
+            if not mqtt_client.connected or not self._drain_batch(outbox, mqtt_client, delay):
                 time.sleep(1)
 
-        mqtt_client.disconnect()
-        logger.info("Daemon stopped")
+    def _drain_batch(self, outbox: Outbox, mqtt_client, delay: float, size: int = 100) -> int:
+        """Publish up to size buffered payloads, oldest first.
+
+        Returns:
+            Number of payloads published
+        """
+        published = 0
+        for message in outbox.peek(size):
+            if not self.running or not self._publish_buffered(outbox, mqtt_client, message):
+                break
+            published += 1
+            time.sleep(delay)
+        if published:
+            logger.info(f"Published {published} buffered payloads, {len(outbox)} left")
+        return published
+
+    @staticmethod
+    def _publish_buffered(outbox: Outbox, mqtt_client, message: OutboxMessage) -> bool:
+        """Publish a buffered payload, removed from the outbox once written.
+
+        Returns:
+            True if it was written before the publish timeout
+        """
+        data = message.data
+        if isinstance(data, dict):
+            # Tell consumers when the reading was actually taken
+            data = {**data, "buffered_at": datetime.fromtimestamp(message.created, timezone.utc).isoformat()}
+        written = []
+
+        def callback(topic, success):
+            # May fire after the wait timed out: the outcome is settled here,
+            # so a late acknowledgement does not lead to a second publish
+            if success:
+                outbox.remove(message.id)
+            else:
+                outbox.release(message.id)
+            written.append(success)
+
+        outbox.mark_inflight(message.id)
+        mqtt_client.publish(
+            data, topic=message.topic, retain=message.retain, wait=True, callback=callback)
+        return bool(written) and written[0]
 
 
 def main():
@@ -187,7 +717,13 @@ def main():
         logger.critical(f"Configuration error: {e}")
         sys.exit(1)
 
-    daemon = Daemon(config)
+    if config.worker_processes > 1:
+        # Imported lazily: only needed for sharded fleets
+        from .supervisor import Supervisor
+        Supervisor(config).run()
+        return
+
+    daemon = Daemon(config, config_path)
     daemon.run()
 
 
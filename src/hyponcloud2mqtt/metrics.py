@@ -0,0 +1,216 @@
+"""Minimal Prometheus metrics, rendered in the text exposition format.
+
+Only counters, gauges and histograms with a handful of labels are needed, so
+this avoids depending on prometheus_client. Every metric registers itself in
+the module-level REGISTRY served on ``/metrics``.
+"""
+from __future__ import annotations
+import abc
+import bisect
+import math
+import threading
+from typing import Callable, Iterable
+
+# Seconds, suited to HTTP requests to the cloud API and MQTT publishes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict[str, object]) -> LabelValues:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Iterable[tuple[str, str]]) -> str:
+    pairs = [f'{key}="{_escape(value)}"' for key, value in labels]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric(abc.ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, registry: Registry | None = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    @abc.abstractmethod
+    def samples(self) -> list[str]:
+        """Sample lines of the metric, in the Prometheus text format."""
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, registry: Registry | None = REGISTRY):
+        super().__init__(name, documentation, registry)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: object) -> float:
+        with self._lock:
+            return self._values.get(_labels(labels), 0.0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}"
+                for key, value in values.items()]
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, registry: Registry | None = REGISTRY):
+        super().__init__(name, documentation, registry)
+        self._values: dict[LabelValues, float] = {}
+        self._function: Callable[[], float] | None = None
+
+    def set(self, value: float, **labels: object) -> None:
+        with self._lock:
+            self._values[_labels(labels)] = value
+
+    def set_function(self, function: Callable[[], float] | None) -> None:
+        """Compute the (unlabelled) value at scrape time instead."""
+        self._function = function
+
+    def value(self, **labels: object) -> float:
+        with self._lock:
+            return self._values.get(_labels(labels), 0.0)
+
+    def samples(self) -> list[str]:
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}"
+                for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            buckets: Iterable[float] = DEFAULT_BUCKETS,
+            registry: Registry | None = REGISTRY):
+        super().__init__(name, documentation, registry)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: bucket counts (last one is +Inf), sum
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = _labels(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def count(self, **labels: object) -> int:
+        with self._lock:
+            entry = self._values.get(_labels(labels))
+            return sum(entry[0]) if entry else 0
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = {key: (list(counts), total[0]) for key, (counts, total) in self._values.items()}
+        lines = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(key + (("le", _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+# Cloud API
+HTTP_REQUEST_DURATION = Histogram(
+    "hypon_http_request_duration_seconds",
+    "Duration of requests to the Hypon Cloud API, by endpoint")
+HTTP_REQUESTS = Counter(
+    "hypon_http_requests_total",
+    "Requests to the Hypon Cloud API, by endpoint and result (success, error, api_error, auth_expired)")
+RATE_LIMIT_WAIT = Counter(
+    "hypon_rate_limit_wait_seconds_total",
+    "Time requests to the Hypon Cloud API were delayed by the rate limiter")
+CIRCUIT_STATE = Gauge(
+    "hypon_circuit_breaker_state",
+    "State of the circuit breaker of an endpoint (0 closed, 1 open, 2 half-open)")
+
+# MQTT
+MQTT_PUBLISH_DURATION = Histogram(
+    "hypon_mqtt_publish_duration_seconds",
+    "Time from publish to the message being written to the broker")
+MQTT_PUBLISHES = Counter(
+    "hypon_mqtt_publishes_total",
+    "MQTT messages, by result (success, error)")
+MQTT_INFLIGHT = Gauge(
+    "hypon_mqtt_inflight_messages",
+    "MQTT messages handed to the client and not yet written")
+OUTBOX_MESSAGES = Gauge(
+    "hypon_outbox_messages",
+    "State payloads buffered in the outbox")
+WORKER_QUEUE_DEPTH = Gauge(
+    "hypon_worker_queue_depth",
+    "HTTP requests waiting for a free worker")
+
+# Scheduling
+CYCLE_DURATION = Histogram(
+    "hypon_cycle_duration_seconds",
+    "Duration of a fetch cycle over all due systems",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+SCHEDULE_LAG = Gauge(
+    "hypon_schedule_lag_seconds",
+    "Delay of the last fetch of a system behind its scheduled time")
+SYSTEM_FETCH_DURATION = Gauge(
+    "hypon_system_fetch_duration_seconds",
+    "Duration of the last fetch of a system")
+SYSTEM_LAST_SUCCESS = Gauge(
+    "hypon_system_last_success_timestamp_seconds",
+    "Unix time of the last successful fetch of a system")
@@ -1,9 +1,13 @@
 from __future__ import annotations
-import json
 import logging
 import threading
+import time
 import paho.mqtt.client as mqtt
-from typing import Any
+from typing import Any, Callable
+from . import metrics, serialization
+
+PublishCallback = Callable[[str, bool], None]
+MessageHandler = Callable[[mqtt.MQTTMessage], None]
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +25,9 @@ class MqttClient:
             tls_enabled: bool = False,
             tls_insecure: bool = False,
             ca_path: str | None = None,
-            client_id: str | None = None):
+            client_id: str | None = None,
+            max_inflight: int = 100,
+            publish_timeout: float = 10.0):
         self.broker = broker
         self.port = port
         self.topic = topic
@@ -30,33 +36,89 @@ class MqttClient:
         self.connected = False
         self._connection_event = threading.Event()
         self._connection_result = None
-        self.client = mqtt.Client(
+
+        # Publish pipeline: at most max_inflight messages handed to paho and
+        # not yet written to the broker, tracked by message id
+        self.max_inflight = max_inflight
+        self.publish_timeout = publish_timeout
+        self._window = threading.BoundedSemaphore(max_inflight)
+        self._inflight_lock = threading.RLock()
+        self._inflight_idle = threading.Condition(self._inflight_lock)
+        self._inflight: dict[int, tuple[str, float, PublishCallback | None]] = {}
+        self._publishing = False
+        self._early_acks: set[int] = set()
+        self._latency: dict[str, dict[str, float]] = {}
+        self._subscriptions: dict[str, MessageHandler] = {}
+
+        self.client = self._create_client(
+            client_id, username, password, tls_enabled, tls_insecure, ca_path)
+
+    def _create_client(
+            self,
+            client_id: str | None,
+            username: str | None,
+            password: str | None,
+            tls_enabled: bool,
+            tls_insecure: bool,
+            ca_path: str | None) -> mqtt.Client:
+        client = mqtt.Client(
             callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
             client_id=client_id
         )
 
         if username and password:
-            self.client.username_pw_set(username, password)
+            client.username_pw_set(username, password)
             logger.debug(
                 f"MQTT authentication configured for user: {username}")
 
         if tls_enabled:
             # Enable TLS
             # If ca_path is None, it uses system default CAs
-            self.client.tls_set(ca_certs=ca_path)
+            client.tls_set(ca_certs=ca_path)
 
             if tls_insecure:
-                self.client.tls_insecure_set(True)
+                client.tls_insecure_set(True)
 
             logger.debug(f"MQTT TLS enabled (insecure: {tls_insecure})")
 
         # Set LWT
-        self.client.will_set(self.availability_topic, "offline", retain=True)
+        client.will_set(self.availability_topic, "offline", retain=True)
         logger.debug(
-            f"MQTT Last Will and Testament set to {availability_topic}")
+            f"MQTT Last Will and Testament set to {self.availability_topic}")
 
-        self.client.on_connect = self._on_connect
-        self.client.on_disconnect = self._on_disconnect
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_publish = self._on_publish
+        client.on_message = self._on_message
+        return client
+
+    def reconfigure(
+            self,
+            broker: str,
+            port: int,
+            availability_topic: str,
+            username: str | None = None,
+            password: str | None = None,
+            tls_enabled: bool = False,
+            tls_insecure: bool = False,
+            ca_path: str | None = None,
+            client_id: str | None = None) -> None:
+        """Disconnect, then apply new connection settings.
+
+        Subscriptions are kept; the caller connects again. Messages still in
+        flight on the old connection are reported as lost.
+        """
+        self.disconnect()
+        self.connected = False
+        # The old client will not acknowledge them anymore
+        self._fail_inflight("on reconnection")
+        with self._inflight_lock:
+            self._early_acks.clear()
+        self.broker = broker
+        self.port = port
+        self.availability_topic = availability_topic
+        self.client = self._create_client(
+            client_id, username, password, tls_enabled, tls_insecure, ca_path)
 
     def _on_connect(self, client, userdata, flags, rc, properties=None):
         if rc == 0:
@@ -66,6 +128,9 @@ class MqttClient:
             # Publish online status
             self.client.publish(self.availability_topic, "online", retain=True)
             logger.debug(f"Published 'online' to {self.availability_topic}")
+            # Subscriptions do not survive a new clean session
+            for topic in self._subscriptions:
+                self.client.subscribe(topic)
         else:
             self.connected = False
             error_msg = f"Failed to connect to MQTT broker, reason: {rc}"
@@ -94,6 +159,113 @@ class MqttClient:
         if rc != 0:
             logger.warning("Unexpected disconnection from MQTT broker")
 
+        # Messages not written before the connection dropped are lost (QoS 0)
+        self._fail_inflight("on disconnect")
+
+    def _fail_inflight(self, reason: str) -> None:
+        """Report every in-flight message as lost and release its slot."""
+        with self._inflight_lock:
+            lost = list(self._inflight.values())
+            self._inflight.clear()
+        if lost:
+            logger.warning(f"{len(lost)} in-flight MQTT messages lost {reason}")
+        for topic, _, callback in lost:
+            self._complete(topic, None, callback, False)
+
+    def _on_message(self, client, userdata, message):
+        handler = self._subscriptions.get(message.topic)
+        if handler is None:
+            return
+        try:
+            handler(message)
+        except Exception as e:
+            logger.error(f"Error handling MQTT message on {message.topic}: {e}")
+
+    def subscribe(self, topic: str, handler: MessageHandler) -> None:
+        """Call handler(message) for each message received on topic.
+
+        The subscription is renewed on every connection. Handlers run on the
+        paho network loop: they must not publish or block, but hand the work
+        over to another thread.
+        """
+        self._subscriptions[topic] = handler
+        if self.connected:
+            self.client.subscribe(topic)
+        logger.debug(f"Subscribed to {topic}")
+
+    def unsubscribe(self, topic: str) -> None:
+        if self._subscriptions.pop(topic, None) is not None and self.connected:
+            self.client.unsubscribe(topic)
+
+    def _on_publish(self, client, userdata, mid, reason_code=None, properties=None):
+        with self._inflight_lock:
+            entry = self._inflight.pop(mid, None)
+            if entry is None:
+                # Acknowledged before publish() could register it (same
+                # thread), or an untracked message such as availability
+                if self._publishing:
+                    self._early_acks.add(mid)
+                return
+        topic, start, callback = entry
+        self._complete(topic, time.monotonic() - start, callback, True)
+
+    def _complete(
+            self,
+            topic: str,
+            latency: float | None,
+            callback: PublishCallback | None,
+            success: bool) -> None:
+        """Release the in-flight slot of a message and report its outcome."""
+        self._window.release()
+        metrics.MQTT_PUBLISHES.inc(result="success" if success else "error")
+        if latency is not None:
+            metrics.MQTT_PUBLISH_DURATION.observe(latency)
+        with self._inflight_lock:
+            if latency is not None:
+                stats = self._latency.setdefault(
+                    topic, {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0})
+                stats["count"] += 1
+                stats["total"] += latency
+                stats["max"] = max(stats["max"], latency)
+                stats["last"] = latency
+            if not self._inflight:
+                self._inflight_idle.notify_all()
+
+        if callback:
+            try:
+                callback(topic, success)
+            except Exception as e:
+                logger.error(f"Error in publish callback for {topic}: {e}")
+
+    @property
+    def inflight(self) -> int:
+        """Number of messages handed to paho and not yet written."""
+        with self._inflight_lock:
+            return len(self._inflight)
+
+    def publish_stats(self) -> dict[str, dict[str, float]]:
+        """Per-topic publish latency statistics, in seconds."""
+        with self._inflight_lock:
+            return {
+                topic: {
+                    "count": stats["count"],
+                    "avg_latency": stats["total"] / stats["count"],
+                    "max_latency": stats["max"],
+                    "last_latency": stats["last"],
+                }
+                for topic, stats in self._latency.items()
+            }
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until every in-flight message has been written.
+
+        Returns:
+            True if the pipeline drained, False on timeout
+        """
+        with self._inflight_idle:
+            return self._inflight_idle.wait_for(
+                lambda: not self._inflight, timeout)
+
     def connect(self, timeout: int = 10) -> bool:
         """Connect to MQTT broker and wait for connection to succeed or fail.
 
@@ -133,6 +305,10 @@ class MqttClient:
 
     def disconnect(self):
         if not self.dry_run and self.connected:
+            # Let pipelined messages go out before announcing offline
+            if not self.flush(timeout=self.publish_timeout):
+                logger.warning(
+                    f"{self.inflight} MQTT messages still in flight at shutdown")
             try:
                 logger.debug(
                     f"Publishing 'offline' to {self.availability_topic}")
@@ -150,23 +326,100 @@ class MqttClient:
         self.client.disconnect()
         logger.debug("MQTT client disconnected")
 
-    def publish(self, data: Any, topic: str | None = None, retain: bool = False):
-        """Publish data to a specific topic, or the default if not provided."""
+    @staticmethod
+    def _report(topic: str, callback: PublishCallback | None, success: bool) -> bool:
+        """Report the outcome of a message that never entered the window."""
+        if callback:
+            callback(topic, success)
+        return success
+
+    def _send(
+            self,
+            topic: str,
+            payload: bytes,
+            retain: bool,
+            callback: PublishCallback | None) -> mqtt.MQTTMessageInfo | None:
+        """Hand a message to paho and track it until it is written.
+
+        Returns:
+            The message info, or None if it was already written
+        """
+        start = time.monotonic()
+        with self._inflight_lock:
+            self._publishing = True
+            try:
+                info = self.client.publish(topic, payload, retain=retain)
+            finally:
+                self._publishing = False
+
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                raise RuntimeError(mqtt.error_string(info.rc))
+
+            acked = info.mid in self._early_acks
+            if acked:
+                self._early_acks.discard(info.mid)
+            else:
+                self._inflight[info.mid] = (topic, start, callback)
+
+        if acked:
+            self._complete(topic, time.monotonic() - start, callback, True)
+            return None
+        return info
+
+    def publish(
+            self,
+            data: Any,
+            topic: str | None = None,
+            retain: bool = False,
+            wait: bool = False,
+            callback: PublishCallback | None = None) -> bool:
+        """Publish data to a specific topic, or the default if not provided.
+
+        Publishing is pipelined: the message is handed over to the paho network
+        loop and this call only blocks while max_inflight messages are already
+        waiting to be written. callback(topic, success) is invoked once the
+        message is written or lost; wait=True blocks until then.
+
+        Returns:
+            True if the message was handed over to paho, False otherwise
+        """
         publish_topic = topic if topic is not None else self.topic
 
+        try:
+            # Bytes are sent as is, e.g. an empty payload clearing a retained message
+            payload = data if isinstance(data, bytes) else serialization.dumps(data)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Error encoding payload for {publish_topic}: {e}")
+            return self._report(publish_topic, callback, False)
+
         if self.dry_run:
-            payload = json.dumps(data, indent=2)
-            logger.info(
-                f"[DRY RUN] Would publish to {publish_topic} (retain={retain}):\n{payload}")
-            return
+            # Indenting is only worth it when debugging
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    f"[DRY RUN] Would publish to {publish_topic} (retain={retain}):\n"
+                    f"{payload.decode() if isinstance(data, bytes) else serialization.dumps_pretty(data)}")
+            else:
+                logger.info(
+                    f"[DRY RUN] Would publish to {publish_topic} (retain={retain}): {payload.decode()}")
+            return self._report(publish_topic, callback, True)
+
+        if not self._window.acquire(timeout=self.publish_timeout):
+            logger.error(
+                f"MQTT in-flight window full ({self.max_inflight} messages) for "
+                f"{self.publish_timeout}s, dropping message to {publish_topic}")
+            return self._report(publish_topic, callback, False)
 
+        logger.debug(
+            f"Publishing {len(payload)} bytes to {publish_topic}, retain={retain}")
         try:
-            payload = json.dumps(data)
-            logger.debug(
-                f"Publishing {len(payload)} bytes to {publish_topic}, retain={retain}")
-            info = self.client.publish(publish_topic, payload, retain=retain)
-            info.wait_for_publish()
-            logger.debug(
-                f"Data published successfully to {publish_topic}")
+            info = self._send(publish_topic, payload, retain, callback)
         except Exception as e:
             logger.error(f"Error publishing to MQTT: {e}")
+            self._complete(publish_topic, None, callback, False)
+            return False
+
+        if wait and info is not None:
+            info.wait_for_publish(timeout=self.publish_timeout)
+
+        logger.debug(f"Data handed over for publishing to {publish_topic}")
+        return True
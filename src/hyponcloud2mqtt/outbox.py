@@ -0,0 +1,121 @@
+from __future__ import annotations
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, NamedTuple
+from . import serialization
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxMessage(NamedTuple):
+    id: int
+    topic: str
+    data: Any
+    retain: bool
+    created: float
+
+
+class Outbox:
+    """Bounded on-disk queue of MQTT messages, kept while the broker is down.
+
+    Messages are stored in a SQLite database in arrival order, together with
+    the time they were buffered. The oldest messages are dropped once
+    max_messages is reached, and messages older than max_age seconds are
+    discarded instead of being published.
+
+    A message handed to the broker is marked in flight: it is skipped by
+    ``peek`` until its publish is confirmed, then removed, or lost, then
+    released. A late acknowledgement thus never leads to a second publish.
+    Delivery is at least once across restarts, where in-flight marks are
+    forgotten.
+
+    Args:
+        path: SQLite database file
+        max_messages: Maximum number of buffered messages
+        max_age: Maximum age of a buffered message, in seconds
+        clock: Wall clock, used to timestamp messages
+    """
+
+    def __init__(
+            self,
+            path: str,
+            max_messages: int = 10000,
+            max_age: float = 86400,
+            clock: Callable[[], float] = time.time):
+        self.path = path
+        self.max_messages = max_messages
+        self.max_age = max_age
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Messages handed to the broker, waiting for their outcome
+        self._inflight: set[int] = set()
+        # Shared by the fetch threads and the drain thread, serialized by _lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "topic TEXT NOT NULL, "
+            "payload TEXT NOT NULL, "
+            "retain INTEGER NOT NULL, "
+            "created REAL NOT NULL)")
+        self._db.commit()
+
+        pending = len(self)
+        if pending:
+            logger.info(f"Outbox {path} holds {pending} messages from a previous run")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def put(self, topic: str, data: Any, retain: bool = False) -> None:
+        """Buffer a message, dropping the oldest ones beyond max_messages."""
+        payload = serialization.dumps(data)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO outbox (topic, payload, retain, created) VALUES (?, ?, ?, ?)",
+                (topic, payload, int(retain), self._clock()))
+            dropped = self._db.execute(
+                "DELETE FROM outbox WHERE id NOT IN "
+                "(SELECT id FROM outbox ORDER BY id DESC LIMIT ?)",
+                (self.max_messages,)).rowcount
+        if dropped:
+            logger.warning(f"Outbox full ({self.max_messages} messages), dropped {dropped} oldest")
+
+    def peek(self, limit: int) -> list[OutboxMessage]:
+        """Return up to limit of the oldest messages not in flight, discarding expired ones."""
+        with self._lock, self._db:
+            expired = self._db.execute(
+                "DELETE FROM outbox WHERE created < ?",
+                (self._clock() - self.max_age,)).rowcount
+            rows = self._db.execute(
+                "SELECT id, topic, payload, retain, created FROM outbox ORDER BY id LIMIT ?",
+                (limit + len(self._inflight),)).fetchall()
+            rows = [row for row in rows if row[0] not in self._inflight][:limit]
+        if expired:
+            logger.warning(f"Discarded {expired} outbox messages older than {self.max_age}s")
+        return [
+            OutboxMessage(row_id, topic, serialization.loads(payload), bool(retain), created)
+            for row_id, topic, payload, retain, created in rows]
+
+    def mark_inflight(self, message_id: int) -> None:
+        """Skip a message handed to the broker until its outcome is known."""
+        with self._lock:
+            self._inflight.add(message_id)
+
+    def release(self, message_id: int) -> None:
+        """Make a message whose publish was lost available again."""
+        with self._lock:
+            self._inflight.discard(message_id)
+
+    def remove(self, message_id: int) -> None:
+        """Remove a message once it has been published."""
+        with self._lock, self._db:
+            self._inflight.discard(message_id)
+            self._db.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,127 @@
+"""Reload of the configuration without restarting the daemon.
+
+The config file is read again on SIGHUP, or when its modification time or size
+changes with ``config_watch_interval`` set. The new configuration is compared
+to the running one field by field, and each group of changed fields only
+redoes its own part: MQTT settings reconnect to the broker, API settings log
+in again, added or removed systems get their fetcher and Home Assistant
+entities created or removed.
+
+Resources opened once at startup cannot be switched while running; changes of
+their fields are logged and ignored until the next restart.
+"""
+from __future__ import annotations
+import dataclasses
+import logging
+import os
+import threading
+import time
+from typing import Callable
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Connection to the broker: reconnect
+MQTT_FIELDS = frozenset({
+    "mqtt_broker", "mqtt_port", "mqtt_username", "mqtt_password", "mqtt_tls_enabled",
+    "mqtt_tls_insecure", "mqtt_ca_path", "mqtt_client_id", "mqtt_availability_topic"})
+# API session: log in again on a new session, with new fetchers
+SESSION_FIELDS = frozenset({
+    "http_url", "api_username", "api_password", "verify_ssl", "api_rate_limit", "api_rate_burst",
+    "circuit_breaker_threshold", "circuit_breaker_reset_timeout", "token_lifetime",
+    "token_refresh_margin", "token_cache_path", "http_connect_timeout", "http_read_timeout",
+    "http_pool_connections", "http_pool_maxsize", "http_retries", "http_retry_backoff", "http2",
+    "capture_path", "replay_path", "replay_speed"})
+# Fetchers of every system: rebuilt on the running session
+FETCHER_FIELDS = frozenset({
+    "http_interval", "monitor_interval", "production_interval", "status_interval", "extra_fields"})
+# Fetch timeline: rebuilt, every system being due at once
+SCHEDULE_FIELDS = frozenset({
+    "http_interval", "monitor_interval", "production_interval", "status_interval",
+    "schedule_jitter", "schedule_phase_spread", "schedule_overrun", "adaptive_polling",
+    "adaptive_min_interval", "adaptive_max_interval"})
+# Home Assistant discovery configs: changed ones published, removed ones cleared
+DISCOVERY_FIELDS = frozenset({
+    "system_ids", "ha_discovery_enabled", "ha_discovery_prefix", "ha_discovery_rate",
+    "ha_discovery_spread", "device_name", "mqtt_topic", "mqtt_availability_topic",
+    "mqtt_per_field_topics", "extra_fields"})
+# State publishing: change detection starts over
+PUBLISH_FIELDS = frozenset({
+    "mqtt_topic", "delta_publishing", "delta_deadbands", "delta_full_refresh_cycles",
+    "mqtt_per_field_topics"})
+# Read on use, nothing to redo
+LIVE_FIELDS = frozenset({"system_ids", "mqtt_topic", "health_max_staleness", "health_heartbeat_timeout"})
+# Opened once at startup: kept until the next restart
+RESTART_FIELDS = frozenset({
+    "health_server_enabled", "health_host", "health_port", "engine", "worker_processes",
+    "shard_strategy", "fetch_concurrency", "worker_pool_size", "mqtt_max_inflight", "dry_run",
+    "outbox_path", "outbox_max_messages", "outbox_max_age", "outbox_drain_rate", "history_path",
+    "history_raw_retention", "history_rollup_retention", "history_hourly_retention",
+    "json_backend", "ha_discovery_state_path", "config_watch_interval"})
+
+
+def changed_fields(old: Config, new: Config) -> set[str]:
+    """Names of the fields whose value differs between two configurations."""
+    return {
+        field.name for field in dataclasses.fields(Config)
+        if getattr(old, field.name) != getattr(new, field.name)}
+
+
+def reloadable(old: Config, new: Config) -> tuple[Config, set[str]]:
+    """Keep the restart-only fields of the running configuration.
+
+    Returns:
+        The configuration to apply and the names of its changed fields
+    """
+    ignored = sorted(changed_fields(old, new) & RESTART_FIELDS)
+    if ignored:
+        logger.warning(f"Changes of {', '.join(ignored)} require a restart, ignored")
+        new = dataclasses.replace(new, **{name: getattr(old, name) for name in ignored})
+    return new, changed_fields(old, new)
+
+
+class ConfigWatcher:
+    """Tells when the config file should be reloaded.
+
+    A reload is requested explicitly, on SIGHUP, or found by comparing the
+    modification time and size of the file every interval seconds.
+    """
+
+    def __init__(self, path: str, interval: float | None = None, clock: Callable[[], float] = time.monotonic):
+        self.path = path
+        self.interval = interval
+        self._clock = clock
+        self._requested = threading.Event()
+        self._signature = self._stat()
+        self._checked_at = clock()
+
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def request(self) -> None:
+        """Ask for a reload, e.g. from a signal handler."""
+        self._requested.set()
+
+    def pending(self) -> bool:
+        """Tell whether the file should be reloaded."""
+        if self._requested.is_set():
+            return True
+        if self.interval is None:
+            return False
+        now = self._clock()
+        if now - self._checked_at < self.interval:
+            return False
+        self._checked_at = now
+        if self._stat() != self._signature:
+            logger.info(f"{self.path} changed, reloading the configuration")
+            self._requested.set()
+        return self._requested.is_set()
+
+    def acknowledge(self) -> None:
+        """Mark the current content of the file as loaded."""
+        self._requested.clear()
+        self._signature = self._stat()
@@ -0,0 +1,165 @@
+"""Protection of the Hypon Cloud API and of the daemon against its outages.
+
+The rate limiter caps the requests sent to the API by all fetchers together,
+so a large fleet does not get the account throttled. The circuit breakers
+stop sending requests to an endpoint that keeps failing, instead of spending
+a full timeout on every system each cycle, and let a single probe request
+through once in a while to detect its recovery.
+"""
+from __future__ import annotations
+import logging
+import math
+import threading
+import time
+from typing import Callable
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket shared by every request to the API.
+
+    Args:
+        rate: Requests per second
+        burst: Requests that may be sent at once after an idle period,
+            defaults to one second worth of requests
+        wait_counter: Counter of the delays, None to not count them
+    """
+
+    def __init__(
+            self,
+            rate: float,
+            burst: int | None = None,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep,
+            wait_counter: metrics.Counter | None = metrics.RATE_LIMIT_WAIT):
+        self.rate = rate
+        self.wait_counter = wait_counter
+        self.burst = burst or max(1, math.ceil(rate))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token, return how many seconds to wait before using it.
+
+        Tokens may be reserved ahead of time, so concurrent callers are
+        queued one rate interval apart.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait and self.wait_counter:
+            self.wait_counter.inc(wait)
+        return wait
+
+    def acquire(self) -> None:
+        """Block until a request may be sent."""
+        wait = self.reserve()
+        if wait:
+            self._sleep(wait)
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Values of the circuit breaker state gauge
+_STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class CircuitBreaker:
+    """Stops requests to an endpoint after consecutive failures.
+
+    The circuit opens after failure_threshold consecutive failures. Once
+    reset_timeout seconds have passed, it turns half-open and lets a single
+    probe request through: a success closes it, a failure opens it again, and
+    an answer telling nothing about the endpoint lets another probe through.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int = 5,
+            reset_timeout: float = 60.0,
+            clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.state = CLOSED
+        metrics.CIRCUIT_STATE.set(_STATE_VALUES[CLOSED], endpoint=name)
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logger.log(
+                logging.INFO if state == CLOSED else logging.WARNING,
+                f"Circuit breaker for {self.name} is now {state}")
+        self.state = state
+        metrics.CIRCUIT_STATE.set(_STATE_VALUES[state], endpoint=self.name)
+
+    def allow(self) -> bool:
+        """Tell whether a request may be sent now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._set_state(HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._set_state(CLOSED)
+
+    def record_neutral(self) -> None:
+        """Release the probe of a request that neither failed nor succeeded."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                self._set_state(OPEN)
+
+
+class CircuitBreakers:
+    """One circuit breaker per endpoint, shared by every system.
+
+    A failure_threshold of 0 disables them.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> CircuitBreaker | None:
+        if not self.failure_threshold:
+            return None
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(endpoint, self.failure_threshold, self.reset_timeout)
+                self._breakers[endpoint] = breaker
+            return breaker
@@ -0,0 +1,164 @@
+from __future__ import annotations
+import logging
+import math
+import random
+import threading
+import time
+from typing import Any, Callable, Hashable, Iterable, Mapping
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+OVERRUN_POLICIES = ("skip", "catch_up")
+
+
+class Scheduler:
+    """Fixed-rate fetch timeline, with one deadline per system.
+
+    Deadlines are computed from the start time as ``start + phase + k * interval``
+    rather than from the end of the previous cycle, so the period does not
+    drift with fetch duration. Each deadline may be delayed by a random jitter
+    (never accumulated), and systems may be spread evenly over the interval.
+
+    When a system overruns one or more of its deadlines, the ``skip`` policy
+    jumps to the next deadline in the future while ``catch_up`` runs the missed
+    cycles back to back.
+
+    The interval of a system can be changed with ``set_interval``, e.g. by
+    adaptive polling, and systems can be added or removed while running.
+    """
+
+    def __init__(
+            self,
+            interval: float,
+            keys: Iterable[Hashable],
+            jitter: float = 0.0,
+            phase_spread: bool = False,
+            overrun: str = "skip",
+            clock: Callable[[], float] = time.monotonic):
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(f"Unknown overrun policy: {overrun}")
+        self.interval = interval
+        self.jitter = jitter
+        self.overrun = overrun
+        self._clock = clock
+        self._base: dict[Hashable, float] = {}
+        self._deadline: dict[Hashable, float] = {}
+        self._intervals: dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+        # Lag of the last run of each system behind its deadline, in seconds
+        self.lag: dict[Hashable, float] = {}
+
+        keys = list(keys)
+        start = clock()
+        for index, key in enumerate(keys):
+            phase = index * interval / len(keys) if phase_spread else 0.0
+            self._base[key] = start + phase
+            self._deadline[key] = self._base[key] + self._jitter()
+
+    def _jitter(self) -> float:
+        return random.uniform(0, self.jitter) if self.jitter > 0 else 0.0
+
+    def due(self, now: float | None = None) -> list[Hashable]:
+        """Return the systems whose deadline has passed and schedule their next run."""
+        if now is None:
+            now = self._clock()
+
+        due = []
+        with self._lock:
+            for key, deadline in self._deadline.items():
+                if deadline > now:
+                    continue
+                due.append(key)
+                self.lag[key] = now - deadline
+                metrics.SCHEDULE_LAG.set(self.lag[key], system_id=key)
+                self._advance(key, now)
+        return due
+
+    def _advance(self, key: Hashable, now: float) -> None:
+        interval = self.interval_of(key)
+        base = self._base[key] + interval
+        if self.overrun == "skip" and base <= now:
+            missed = math.floor((now - base) / interval) + 1
+            logger.warning(
+                f"Fetch for {key} overran its schedule, skipping {missed} cycle(s)")
+            base += missed * interval
+        self._base[key] = base
+        self._deadline[key] = base + self._jitter()
+
+    def interval_of(self, key: Hashable) -> float:
+        """Return the current interval of a system."""
+        return self._intervals.get(key, self.interval)
+
+    def set_interval(self, key: Hashable, interval: float, now: float | None = None) -> None:
+        """Change the interval of a system, counted from its last scheduled run.
+
+        A shorter interval that already elapsed makes the system due at once.
+        """
+        if now is None:
+            now = self._clock()
+        with self._lock:
+            previous = self._base[key] - self.interval_of(key)
+            self._intervals[key] = interval
+            self._base[key] = max(previous + interval, now)
+            self._deadline[key] = self._base[key] + self._jitter()
+
+    def add(self, key: Hashable, now: float | None = None) -> None:
+        """Schedule a new system, due at once."""
+        if now is None:
+            now = self._clock()
+        with self._lock:
+            self._base[key] = now
+            self._deadline[key] = now
+
+    def remove(self, key: Hashable) -> None:
+        """Stop scheduling a system."""
+        with self._lock:
+            for state in (self._base, self._deadline, self._intervals, self.lag):
+                state.pop(key, None)
+
+    def next_deadline(self) -> float:
+        """Return the earliest upcoming deadline, one interval ahead without systems."""
+        with self._lock:
+            return min(self._deadline.values(), default=self._clock() + self.interval)
+
+
+class AdaptivePolling:
+    """Polling interval of each system following its production state.
+
+    A system is idle when it produces no power, or when all its inverters or
+    its gateway are offline, typically at night. Each idle fetch doubles its
+    interval, up to max_interval; it is polled at min_interval again as soon
+    as it produces.
+    """
+
+    def __init__(self, min_interval: float, max_interval: float):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._intervals: dict[Hashable, float] = {}
+
+    @staticmethod
+    def is_idle(data: Mapping[str, Any]) -> bool:
+        """Tell whether merged data shows no production."""
+        if data.get("power_pv") == 0:
+            return True
+        for device in ("inverter", "gateway"):
+            if data.get(f"{device}_online") == 0 and data.get(f"{device}_offline", 0) > 0:
+                return True
+        return False
+
+    def update(self, key: Hashable, data: Mapping[str, Any]) -> float | None:
+        """Record the latest data of a system.
+
+        Returns:
+            The new interval of the system, or None if it is unchanged
+        """
+        current = self._intervals.get(key, self.min_interval)
+        if self.is_idle(data):
+            interval = min(current * 2, self.max_interval)
+        else:
+            interval = self.min_interval
+        if interval == current:
+            return None
+        self._intervals[key] = interval
+        return interval
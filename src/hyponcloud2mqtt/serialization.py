@@ -0,0 +1,122 @@
+"""JSON encoding and decoding of API responses and MQTT payloads.
+
+orjson, then ujson, are used when installed, the standard library otherwise.
+Payloads are encoded straight to UTF-8 bytes, as sent by paho, and responses
+are decoded from the raw response bytes.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Callable, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# In order of preference
+BACKEND_NAMES = ("orjson", "ujson", "json")
+
+
+class Backend(NamedTuple):
+    name: str
+    # Raise TypeError or ValueError on data that cannot be encoded
+    dumps: Callable[[Any], bytes]
+    # Raise ValueError on invalid documents
+    loads: Callable[[bytes | str], Any]
+
+
+def _stdlib() -> Backend:
+    def dumps(data: Any) -> bytes:
+        return json.dumps(data).encode()
+    return Backend("json", dumps, json.loads)
+
+
+def _orjson() -> Backend | None:
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return Backend("orjson", orjson.dumps, orjson.loads)
+
+
+def _ujson() -> Backend | None:
+    try:
+        import ujson  # type: ignore[import-untyped]
+    except ImportError:
+        return None
+
+    def dumps(data: Any) -> bytes:
+        return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False).encode()
+    return Backend("ujson", dumps, ujson.loads)
+
+
+def available_backends() -> dict[str, Backend]:
+    """Installed backends, in order of preference."""
+    backends = {}
+    for factory in (_orjson, _ujson, _stdlib):
+        backend = factory()
+        if backend is not None:
+            backends[backend.name] = backend
+    return backends
+
+
+_backend: Backend = next(iter(available_backends().values()))
+
+
+def use(name: str = "auto") -> Backend:
+    """Select the backend by name, or the fastest installed one with "auto".
+
+    Raises:
+        RuntimeError: If the backend is not installed
+    """
+    global _backend
+    backends = available_backends()
+    if name == "auto":
+        _backend = next(iter(backends.values()))
+    elif name in backends:
+        _backend = backends[name]
+    else:
+        raise RuntimeError(f"json_backend '{name}' is not installed")
+    logger.debug(f"Using the {_backend.name} JSON backend")
+    return _backend
+
+
+def backend() -> Backend:
+    return _backend
+
+
+def dumps(data: Any) -> bytes:
+    """Encode data to compact JSON bytes."""
+    return _backend.dumps(data)
+
+
+def loads(document: bytes | str) -> Any:
+    """Decode a JSON document."""
+    return _backend.loads(document)
+
+
+def dumps_pretty(data: Any) -> str:
+    """Encode data to indented JSON, for logs."""
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+
+def write_json_file(path: str, data: Any, sort_keys: bool = False) -> None:
+    """Replace a JSON file atomically.
+
+    The document is written to a unique temporary file, readable by its owner
+    only, then moved in place, so concurrent writers and crashes never leave
+    a truncated file. The temporary file is removed on failure.
+
+    Raises:
+        OSError: If the file cannot be written
+    """
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, sort_keys=sort_keys)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
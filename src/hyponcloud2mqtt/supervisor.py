@@ -0,0 +1,326 @@
+"""Multi-process mode for large fleets.
+
+The supervisor splits ``system_ids`` into shards and runs a regular Daemon
+for each shard in its own process, so fetching and publishing use every core
+instead of a single GIL. Each worker has its own fetch engine and its own
+MQTT connection, with a client ID derived from ``mqtt_client_id``. Workers
+serve their health endpoints on localhost, and the supervisor aggregates them
+on the configured health port. They share the token cache, so the account is
+logged in once for all of them; without ``token_cache_path``, the supervisor
+keeps one in a private temporary directory.
+"""
+from __future__ import annotations
+import dataclasses
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Callable
+
+from .config import Config
+from .health_server import HealthHTTPHandler, HealthServer
+
+logger = logging.getLogger(__name__)
+
+
+def _rendezvous_owner(system_id: str, workers: int) -> int:
+    # Highest random weight hashing: changing the number of workers only
+    # moves the systems of the added or removed workers
+    def weight(worker: int) -> int:
+        digest = hashlib.blake2b(f"{worker}:{system_id}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+    return max(range(workers), key=weight)
+
+
+def partition(system_ids: list[str], workers: int, strategy: str = "hash") -> list[list[str]]:
+    """Split system IDs into one shard per worker.
+
+    Args:
+        strategy: "hash" assigns each system by consistent hashing, stable
+            across restarts and resizes; "count" makes contiguous shards of
+            equal size
+    """
+    shards: list[list[str]] = [[] for _ in range(workers)]
+    if strategy == "count":
+        size, extra = divmod(len(system_ids), workers)
+        start = 0
+        for index in range(workers):
+            end = start + size + (1 if index < extra else 0)
+            shards[index] = list(system_ids[start:end])
+            start = end
+    else:
+        for system_id in system_ids:
+            shards[_rendezvous_owner(system_id, workers)].append(system_id)
+    return shards
+
+
+def _run_worker(config: Config, index: int) -> None:
+    """Entry point of a worker process."""
+    # Imported here: the worker configures logging in its own process
+    from .main import Daemon
+
+    logging.getLogger(__name__).info(
+        f"Worker {index} started for {len(config.system_ids)} systems")
+    Daemon(config).run()
+
+
+def _add_label(sample: str, key: str, value: str) -> str:
+    name, space, rest = sample.partition(" ")
+    if "{" not in name:
+        return f'{name}{{{key}="{value}"}}{space}{rest}'
+    # Label values may contain spaces: split on the opening brace instead
+    name, _, labels = sample.partition("{")
+    separator = "" if labels.startswith("}") else ","
+    return f'{name}{{{key}="{value}"{separator}{labels}'
+
+
+def merge_metrics(expositions: dict[str, str]) -> str:
+    """Merge Prometheus expositions of several workers, adding a worker label."""
+    families: dict[str, dict[str, Any]] = {}
+    for worker, text in expositions.items():
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# "):
+                name = line.split()[2]
+                family = families.setdefault(name, {"headers": [], "samples": []})
+                if len(family["headers"]) < 2:
+                    family["headers"].append(line)
+            elif line and family is not None:
+                family["samples"].append(_add_label(line, "worker", worker))
+
+    lines = []
+    for family in families.values():
+        lines.extend(family["headers"])
+        lines.extend(family["samples"])
+    return "\n".join(lines) + "\n"
+
+
+class SupervisorHealthContext:
+    """Aggregates the health endpoints of the worker processes.
+
+    Answers are rebuilt from the workers at most every cache_ttl seconds.
+    """
+
+    def __init__(
+            self,
+            workers: Callable[[], dict[str, tuple[int, bool]]],
+            cache_ttl: float = 1.0,
+            timeout: float = 2.0):
+        # Returns {worker name: (health port, process alive)}
+        self.workers = workers
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self._cache: dict[str, tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, port: int, path: str) -> tuple[int, bytes]:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except (urllib.error.URLError, OSError) as e:
+            logger.debug(f"Worker health endpoint on port {port} unreachable: {e}")
+            return 503, b""
+
+    def _cached(self, path: str, build: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and now - cached[0] < self.cache_ttl:
+                return cached[1]
+        value = build()
+        with self._lock:
+            self._cache[path] = (now, value)
+        return value
+
+    def _collect(self, path: str) -> dict[str, tuple[int, Any]]:
+        """Query a JSON endpoint of every worker."""
+        results = {}
+        for name, (port, alive) in self.workers().items():
+            if not alive:
+                results[name] = (503, {"status": "dead"})
+                continue
+            status, body = self._get(port, path)
+            try:
+                results[name] = (status, json.loads(body) if body else {"status": "unreachable"})
+            except ValueError:
+                results[name] = (503, {"status": "unreachable"})
+        return results
+
+    def _aggregate(self, path: str, all_required: bool) -> tuple[int, bytes]:
+        results = self._collect(path)
+        ok = [status == 200 for status, _ in results.values()]
+        healthy = bool(ok) and (all(ok) if all_required else any(ok))
+        body: dict[str, Any] = {
+            "status": "ok" if healthy else "failing",
+            "workers": {name: body for name, (_, body) in results.items()},
+        }
+        return (200 if healthy else 503), json.dumps(body).encode()
+
+    def health(self) -> tuple[int, bytes]:
+        return self._cached("/health", lambda: self._aggregate("/health", all_required=True))
+
+    def snapshot(self, name: str) -> tuple[int, bytes]:
+        # Every worker must be alive; ready as soon as one serves fresh data
+        return self._cached(
+            f"/{name}", lambda: self._aggregate(f"/{name}", all_required=name == "livez"))
+
+    def history_range(self, query: str) -> tuple[int, bytes]:
+        """Forward a /history query to the worker owning the system."""
+        answer = (404, b'{"error": "unknown system_id"}')
+        for port, alive in self.workers().values():
+            if not alive:
+                continue
+            status, body = self._get(port, f"/history?{query}")
+            if status == 200:
+                return status, body
+            if status != 404:
+                answer = (status, body)
+        return answer
+
+    def metrics(self) -> bytes:
+        def build() -> bytes:
+            expositions = {}
+            for name, (port, alive) in self.workers().items():
+                status, body = self._get(port, "/metrics") if alive else (503, b"")
+                if status == 200:
+                    expositions[name] = body.decode()
+            return merge_metrics(expositions).encode()
+        return self._cached("/metrics", build)
+
+
+class Supervisor:
+    """Runs one Daemon process per shard of system IDs and restarts them."""
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.running = True
+        self.shards = [
+            shard for shard in partition(
+                config.system_ids, config.worker_processes, config.shard_strategy)
+            if shard]
+        # spawn: workers must not inherit the supervisor's threads and locks
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: dict[int, multiprocessing.process.BaseProcess] = {}
+        self._restart_at: dict[int, float] = {}
+        self._restart_delay: dict[int, float] = {}
+        # Shared by the workers, which log in one at a time and reuse the token
+        self.token_cache_path = config.token_cache_path
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._reload_handler)
+
+    def _signal_handler(self, signum, frame):
+        logger.info(f"Received signal {signum}, stopping workers...")
+        self.running = False
+
+    def _reload_handler(self, signum, frame):
+        # Shards are computed once: a new config needs new workers
+        logger.warning(
+            f"Received signal {signum}, but reloading is not supported with worker processes, restart to apply changes")
+
+    def worker_config(self, index: int) -> Config:
+        """Configuration of a worker: its shard, client ID, health port and state files."""
+        config = self.config
+        return dataclasses.replace(
+            config,
+            system_ids=self.shards[index],
+            mqtt_client_id=f"{config.mqtt_client_id}-{index}",
+            health_host="127.0.0.1",
+            health_port=config.health_port + 1 + index,
+            # Workers must not overwrite each other's discovery state
+            ha_discovery_state_path=(
+                f"{config.ha_discovery_state_path}.{index}" if config.ha_discovery_state_path else None),
+            history_path=f"{config.history_path}.{index}" if config.history_path else None,
+            # Each worker drains its own buffered readings, once
+            outbox_path=f"{config.outbox_path}.{index}" if config.outbox_path else None,
+            # Concurrent gzip appends would interleave and corrupt a shared capture
+            capture_path=f"{config.capture_path}.{index}" if config.capture_path else None,
+            token_cache_path=self.token_cache_path,
+            worker_processes=1)
+
+    def _start(self, index: int) -> None:
+        process = self._context.Process(
+            target=_run_worker, args=(self.worker_config(index), index),
+            name=f"worker-{index}")
+        process.start()
+        self._processes[index] = process
+        logger.info(
+            f"Started worker {index} (pid {process.pid}) for {len(self.shards[index])} systems")
+
+    def _workers(self) -> dict[str, tuple[int, bool]]:
+        return {
+            str(index): (self.config.health_port + 1 + index, process.is_alive())
+            for index, process in list(self._processes.items())}
+
+    def run(self) -> None:
+        logger.info(
+            f"Starting supervisor: {len(self.config.system_ids)} systems over "
+            f"{len(self.shards)} worker processes ({self.config.shard_strategy} sharding)")
+        token_dir = None
+        if not self.token_cache_path:
+            token_dir = tempfile.mkdtemp(prefix="hyponcloud2mqtt-")
+            self.token_cache_path = os.path.join(token_dir, "token.json")
+        try:
+            self._supervise()
+        finally:
+            if token_dir is not None:
+                shutil.rmtree(token_dir, ignore_errors=True)
+                self.token_cache_path = None
+
+    def _supervise(self) -> None:
+        for index in range(len(self.shards)):
+            self._start(index)
+
+        if self.config.health_server_enabled:
+            health_server = HealthServer(
+                (self.config.health_host, self.config.health_port), HealthHTTPHandler,
+                SupervisorHealthContext(self._workers))
+            threading.Thread(target=health_server.serve_forever, daemon=True).start()
+            logger.info(f"Aggregated health server started on port {self.config.health_port}")
+
+        while self.running:
+            self._check_workers()
+            time.sleep(1)
+
+        self._stop_workers()
+        logger.info("Supervisor stopped")
+
+    def _check_workers(self) -> None:
+        """Restart dead workers, with exponential backoff."""
+        now = time.monotonic()
+        for index, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            if index not in self._restart_at:
+                delay = self._restart_delay.get(index, 5)
+                logger.error(
+                    f"Worker {index} exited with code {process.exitcode}, restarting in {delay} seconds")
+                self._restart_at[index] = now + delay
+                self._restart_delay[index] = min(delay * 2, 60)
+            elif now >= self._restart_at[index]:
+                del self._restart_at[index]
+                self._start(index)
+
+    def _stop_workers(self, timeout: float = 30.0) -> None:
+        # Workers stop like a standalone daemon on SIGTERM
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for index, process in self._processes.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {index} did not stop, killing it")
+                process.kill()
+                process.join()
@@ -0,0 +1,121 @@
+"""HTTP transport of the requests session shared by all fetchers.
+
+By default the session uses urllib3 connection pools, sized for the worker
+pool, with retries of connection errors. With ``http2`` enabled, requests go
+through an httpx client instead, multiplexing every plant request over a
+single HTTP/2 connection to the cloud (requires the ``http2`` extra). With
+``replay_path``, responses come from a capture file instead of the cloud.
+"""
+from __future__ import annotations
+import logging
+from typing import Any
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+from .capture import ReplayAdapter
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - depends on the installed extras
+    httpx = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+
+def connection_retry(retries: int, backoff: float) -> Retry:
+    """Retry policy for errors raised before the request reached the API.
+
+    Read errors and HTTP statuses are not retried: the fetch cycle already
+    handles them, and retrying would delay every system behind a slow API.
+    """
+    return Retry(
+        total=retries, connect=retries, read=0, status=0, other=0,
+        backoff_factor=backoff, raise_on_status=False)
+
+
+def build_adapter(config, pool_maxsize: int) -> BaseAdapter:
+    """Create the transport adapter described by the configuration.
+
+    Raises:
+        RuntimeError: If HTTP/2 is enabled without httpx installed
+    """
+    if config.replay_path:
+        return ReplayAdapter(config.replay_path, config.replay_speed)
+    if config.http2:
+        if httpx is None:
+            raise RuntimeError(
+                "http2 requires httpx, install hyponcloud2mqtt[http2]")
+        try:
+            adapter = HttpxAdapter(
+                verify=config.verify_ssl,
+                max_connections=pool_maxsize,
+                retries=config.http_retries,
+                http2=True)
+        except ImportError as e:
+            # httpx needs the h2 package for HTTP/2
+            raise RuntimeError(f"http2 requires httpx[http2]: {e}")
+        logger.info("Using the HTTP/2 transport")
+        return adapter
+    return HTTPAdapter(
+        pool_connections=config.http_pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=connection_retry(config.http_retries, config.http_retry_backoff))
+
+
+def _httpx_timeout(timeout: Any) -> Any:
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+class HttpxAdapter(BaseAdapter):
+    """requests adapter sending requests with an httpx client.
+
+    Lets the requests based fetchers use HTTP/2: concurrent requests to the
+    API share one multiplexed connection.
+    """
+
+    def __init__(
+            self,
+            verify: bool = True,
+            max_connections: int = 10,
+            retries: int = 0,
+            http2: bool = True):
+        super().__init__()
+        self.client = httpx.Client(transport=httpx.HTTPTransport(
+            verify=verify,
+            http2=http2,
+            limits=httpx.Limits(max_connections=max_connections),
+            retries=retries))
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        try:
+            response = self.client.request(
+                request.method,
+                request.url,
+                headers=dict(request.headers),
+                content=request.body,
+                timeout=_httpx_timeout(timeout))
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(e, request=request)
+        return self._build_response(request, response)
+
+    @staticmethod
+    def _build_response(request, response) -> requests.Response:
+        built = requests.Response()
+        built.status_code = response.status_code
+        built.headers = CaseInsensitiveDict(response.headers)
+        built._content = response.content
+        built.encoding = response.encoding
+        built.reason = response.reason_phrase
+        built.url = str(response.url)
+        built.request = request
+        return built
+
+    def close(self) -> None:
+        self.client.close()
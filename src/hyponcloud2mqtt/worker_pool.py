@@ -0,0 +1,67 @@
+from __future__ import annotations
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """Long-lived, bounded thread pool shared by all DataFetchers.
+
+    Wraps a ThreadPoolExecutor so that endpoint requests reuse the same worker
+    threads across cycles, and keeps track of queued and running tasks.
+    """
+
+    def __init__(self, max_workers: int, name: str = "http"):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._busy = 0
+        logger.debug(f"Worker pool '{name}' created with {max_workers} workers")
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        with self._lock:
+            self._pending += 1
+        try:
+            return self._executor.submit(self._run, fn, args)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    def _run(self, fn: Callable[..., Any], args: tuple) -> Any:
+        with self._lock:
+            self._busy += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._busy -= 1
+                self._pending -= 1
+
+    @property
+    def busy_workers(self) -> int:
+        """Number of workers currently running a task."""
+        with self._lock:
+            return self._busy
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of submitted tasks waiting for a free worker."""
+        with self._lock:
+            return self._pending - self._busy
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "busy_workers": self._busy,
+                "queue_depth": self._pending - self._busy,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
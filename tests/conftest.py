@@ -0,0 +1,16 @@
+import pytest
+
+
+class FakeClock:
+    """Clock advanced by hand, for the components taking a clock callable."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import MagicMock
+from hyponcloud2mqtt.async_engine import AsyncEngine, AsyncFetcher
+from hyponcloud2mqtt.resilience import CircuitBreakers
+from hyponcloud2mqtt.scheduler import Scheduler
+
+aiohttp = pytest.importorskip("aiohttp")
+web = pytest.importorskip("aiohttp.web")
+
+MONITOR = {"code": 20000, "data": {"power_pv": 19, "percent": 2.5}}
+PRODUCTION = {"code": 20000, "data": {"today_generation": 1.5}}
+STATUS = {"code": 20000, "data": {"gateway": {"online": 1, "offline": 0}}}
+
+
+class FakeAuth:
+    def __init__(self, token="token-1"):
+        self.token = token
+        self.refresh_calls = 0
+        self.rate_limiter = None
+        self.breakers = CircuitBreakers()
+        self.capture = None
+
+    def refresh(self, stale_token):
+        self.refresh_calls += 1
+        self.token = "token-2"
+        return True
+
+
+def make_app(expired_tokens=()):
+    requests_seen = []
+
+    def handler(body):
+        async def handle(request):
+            requests_seen.append((request.path, request.headers.get("Authorization")))
+            token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+            if token in expired_tokens:
+                return web.json_response({"code": 50008})
+            return web.json_response(body)
+        return handle
+
+    app = web.Application()
+    app.router.add_get("/plant/{system_id}/monitor", handler(MONITOR))
+    app.router.add_get("/plant/{system_id}/production2", handler(PRODUCTION))
+    app.router.add_get("/plant/{system_id}/status", handler(STATUS))
+    return app, requests_seen
+
+
+async def run_with_server(app, coro_factory):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        return await coro_factory(f"http://127.0.0.1:{port}")
+    finally:
+        await runner.cleanup()
+
+
+def make_config(url, system_ids=("1",)):
+    config = MagicMock()
+    config.http_url = url
+    config.system_ids = list(system_ids)
+    config.http_interval = 60
+    config.fetch_concurrency = 2
+    config.verify_ssl = True
+    config.http_connect_timeout = 10.0
+    config.http_read_timeout = 10.0
+    config.http_pool_maxsize = None
+    config.http_retries = 0
+    config.http_retry_backoff = 0.5
+    config.http2 = False
+    config.capture_path = None
+    config.replay_path = None
+    return config
+
+
+def test_async_fetcher_merges_all_endpoints():
+    app, requests_seen = make_app()
+    auth = FakeAuth()
+
+    async def scenario(url):
+        async with aiohttp.ClientSession() as http:
+            return await AsyncFetcher(make_config(url), "1", auth, http).fetch_all()
+
+    result = asyncio.run(run_with_server(app, scenario))
+
+    assert result == {"power_pv": 19, "percent": 2.5, "today_generation": 1.5,
+                      "gateway_online": 1, "gateway_offline": 0}
+    assert ("/plant/1/monitor", "Bearer token-1") in requests_seen
+
+
+def test_async_fetcher_reauth_on_50008():
+    app, requests_seen = make_app(expired_tokens={"token-1"})
+    auth = FakeAuth()
+
+    async def scenario(url):
+        async with aiohttp.ClientSession() as http:
+            return await AsyncFetcher(make_config(url), "1", auth, http).fetch_all()
+
+    result = asyncio.run(run_with_server(app, scenario))
+
+    assert auth.refresh_calls == 1
+    assert result["power_pv"] == 19
+    assert ("/plant/1/status", "Bearer token-2") in requests_seen
+
+
+def test_async_fetcher_connection_error_returns_none():
+    auth = FakeAuth()
+
+    async def scenario():
+        async with aiohttp.ClientSession() as http:
+            # Nothing listens on port 9 (discard) on the loopback interface
+            return await AsyncFetcher(
+                make_config("http://127.0.0.1:9"), "1", auth, http).fetch_all()
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_async_engine_runs_cycle_for_all_systems():
+    app, _ = make_app()
+    results = {}
+    running = True
+    loop_threads = set()
+    heartbeats = []
+
+    def handle_result(system_id, data):
+        nonlocal running
+        results[system_id] = data
+        loop_threads.add(threading.current_thread())
+        if len(results) == 3:
+            running = False
+
+    async def scenario(url):
+        engine = AsyncEngine(
+            make_config(url, system_ids=("1", "2", "3")), FakeAuth(),
+            handle_result, lambda: running, lambda: True,
+            Scheduler(60, ["1", "2", "3"]), heartbeat=lambda: heartbeats.append(True))
+        await engine._main()
+
+    asyncio.run(run_with_server(app, scenario))
+
+    assert set(results) == {"1", "2", "3"}
+    assert results["2"]["power_pv"] == 19
+    # Publishing may block: it runs on one thread off the event loop
+    assert len(loop_threads) == 1
+    assert threading.main_thread() not in loop_threads
+    # One heartbeat per system, even without sleeping between cycles
+    assert len(heartbeats) == 3
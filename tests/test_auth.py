@@ -0,0 +1,251 @@
+import base64
+import json
+import os
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from hyponcloud2mqtt.auth import AuthSession
+from hyponcloud2mqtt.data_fetcher import DataFetcher
+
+
+@pytest.fixture
+def mock_config():
+    config = MagicMock()
+    config.http_url = "http://api.example.com"
+    config.api_username = "testuser"
+    config.api_password = "testpass"
+    config.verify_ssl = True
+    config.api_rate_limit = None
+    config.circuit_breaker_threshold = 5
+    config.circuit_breaker_reset_timeout = 60
+    config.token_lifetime = None
+    config.token_refresh_margin = 300
+    config.token_cache_path = None
+    config.http_timeout = (10.0, 10.0)
+    config.http_pool_connections = 10
+    config.http_pool_maxsize = None
+    config.http_retries = 2
+    config.http_retry_backoff = 0.5
+    config.http2 = False
+    config.capture_path = None
+    config.replay_path = None
+    return config
+
+
+def login_response(token):
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {"code": 20000, "data": {"token": token}}
+    return response
+
+
+@pytest.fixture
+def auth(mock_config):
+    with patch('requests.Session') as mock_session_cls:
+        mock_session_cls.return_value.post.return_value = login_response("token-1")
+        yield AuthSession(mock_config)
+
+
+def test_fetchers_share_single_login(auth, mock_config):
+    """Verify that N fetchers sharing an AuthSession only log in once."""
+    fetchers = [DataFetcher(mock_config, system_id, auth)
+                for system_id in ("1", "2", "3")]
+
+    assert auth.session.post.call_count == 1
+    assert auth.token == "token-1"
+    for fetcher in fetchers:
+        assert fetcher.session is auth.session
+        assert fetcher.monitor_client.session is auth.session
+        fetcher.close()
+
+
+def test_refresh_once_for_concurrent_callers(auth):
+    """Verify that concurrent refreshes with the same stale token log in once."""
+    auth.ensure_logged_in()
+    auth.session.post.reset_mock()
+    auth.session.post.return_value = login_response("token-2")
+
+    barrier = threading.Barrier(5)
+    results = []
+
+    def refresh():
+        barrier.wait()
+        results.append(auth.refresh("token-1"))
+
+    threads = [threading.Thread(target=refresh) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [True] * 5
+    assert auth.session.post.call_count == 1
+    assert auth.token == "token-2"
+    auth.session.headers.update.assert_called_with(
+        {"Authorization": "Bearer token-2"})
+
+
+def test_refresh_failure(auth):
+    """Verify that refresh reports a failed re-login."""
+    auth.ensure_logged_in()
+    auth.session.post.return_value.json.return_value = {"code": 50001}
+
+    assert auth.refresh("token-1") is False
+    assert auth.token == "token-1"
+
+
+def test_try_login_reports_rejected_credentials(auth):
+    """Verify that a rejected login is reported instead of exiting."""
+    auth.session.post.return_value.json.return_value = {"code": 50001}
+    assert auth.try_login() is False
+    assert auth.token is None
+
+    auth.session.post.return_value = login_response("token-2")
+    assert auth.try_login() is True
+    assert auth.token == "token-2"
+
+
+def test_session_pool_size(mock_config):
+    """Verify that the shared session mounts a pool sized for concurrent fetches."""
+    with patch('requests.Session') as mock_session_cls:
+        auth = AuthSession(mock_config, pool_maxsize=30)
+
+    mounted = mock_session_cls.return_value.mount.call_args_list
+    assert [call.args[0] for call in mounted] == ["http://", "https://"]
+    assert auth.session.mount.call_args.args[1]._pool_maxsize == 30
+
+
+def jwt(expiry):
+    claims = base64.urlsafe_b64encode(json.dumps({"exp": expiry}).encode()).rstrip(b"=").decode()
+    return f"header.{claims}.signature"
+
+
+def test_proactive_refresh_with_configured_lifetime(auth, mock_config):
+    """Verify that the token is refreshed shortly before its configured lifetime."""
+    mock_config.token_lifetime = 3600
+    auth.ensure_logged_in()
+    auth.session.post.return_value = login_response("token-2")
+    issued_at = auth.token_issued_wall
+
+    assert auth.refresh_if_expiring(issued_at + 3000) is False
+    assert auth.refresh_if_expiring(issued_at + 3301) is True
+    assert auth.token == "token-2"
+    assert auth.token_expires_at == pytest.approx(time.time() + 3600, abs=5)
+
+
+def test_token_lifetime_from_jwt_expiry(auth):
+    """Verify that the expiry of JWT tokens is read from their claims."""
+    expiry = time.time() + 7200
+    auth.session.post.return_value = login_response(jwt(expiry))
+    auth.ensure_logged_in()
+
+    assert auth.token_expires_at == expiry
+
+
+def test_token_lifetime_learned_from_rejection(auth):
+    """Verify that the lifetime of opaque tokens is learned on code 50008."""
+    auth.ensure_logged_in()
+    assert auth.token_expires_at is None
+    auth.token_issued_wall -= 1800
+    auth.session.post.return_value = login_response("token-2")
+
+    assert auth.refresh("token-1") is True
+
+    assert auth.learned_lifetime == pytest.approx(1800, abs=5)
+    assert auth.token_expires_at == pytest.approx(time.time() + 1800, abs=5)
+
+
+def test_early_rejection_not_learned(auth, mock_config):
+    """Verify that revoked tokens do not shrink the lifetime."""
+    auth.ensure_logged_in()
+    auth.token_issued_wall -= 5
+    auth.session.post.return_value = login_response("token-2")
+    assert auth.refresh("token-1") is True
+    assert auth.learned_lifetime is None
+    assert auth.token_expires_at is None
+
+    # Nor an early rejection of a token with a known lifetime
+    mock_config.token_lifetime = 3600
+    auth.token_issued_wall -= 1800
+    auth.session.post.return_value = login_response("token-3")
+    assert auth.refresh("token-2") is True
+    assert auth.learned_lifetime is None
+    assert auth.token_expires_at == pytest.approx(time.time() + 3600, abs=5)
+
+
+def test_token_cache_skips_login_on_restart(mock_config, tmp_path):
+    """Verify that a cached token is reused by the next session."""
+    mock_config.token_lifetime = 3600
+    mock_config.token_cache_path = str(tmp_path / "token.json")
+    with patch('requests.Session') as mock_session_cls:
+        mock_session_cls.return_value.post.return_value = login_response("token-1")
+        AuthSession(mock_config).ensure_logged_in()
+        assert os.stat(mock_config.token_cache_path).st_mode & 0o777 == 0o600
+        assert sorted(os.listdir(tmp_path)) == ["token.json", "token.json.lock"]
+
+        mock_session_cls.return_value.post.reset_mock()
+        restarted = AuthSession(mock_config)
+        restarted.ensure_logged_in()
+
+    assert restarted.token == "token-1"
+    restarted.session.post.assert_not_called()
+
+
+def test_token_cache_ignored_for_other_account(mock_config, tmp_path):
+    """Verify that the cached token of another account is not used."""
+    cache = tmp_path / "token.json"
+    cache.write_text(json.dumps({
+        "url": "http://api.example.com", "username": "other",
+        "token": "token-0", "issued_at": time.time()}))
+    mock_config.token_cache_path = str(cache)
+    with patch('requests.Session') as mock_session_cls:
+        mock_session_cls.return_value.post.return_value = login_response("token-1")
+        auth = AuthSession(mock_config)
+        auth.ensure_logged_in()
+
+    assert auth.token == "token-1"
+
+
+def test_processes_sharing_token_cache_log_in_once(mock_config, tmp_path):
+    """Verify that sessions sharing the token cache, like worker processes, log in once."""
+    mock_config.token_cache_path = str(tmp_path / "token.json")
+    barrier = threading.Barrier(4)
+
+    def login(*args, **kwargs):
+        time.sleep(0.05)
+        return login_response("token-1")
+
+    with patch('requests.Session') as mock_session_cls:
+        mock_session_cls.return_value.post.side_effect = login
+        sessions = [AuthSession(mock_config) for _ in range(4)]
+
+        def start(session):
+            barrier.wait()
+            session.ensure_logged_in()
+
+        threads = [threading.Thread(target=start, args=(session,)) for session in sessions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert mock_session_cls.return_value.post.call_count == 1
+    assert all(session.token == "token-1" for session in sessions)
+
+
+def test_refresh_reuses_token_of_other_process(mock_config, tmp_path):
+    """Verify that a token rejected after another process re-logged in is replaced from the cache."""
+    mock_config.token_cache_path = str(tmp_path / "token.json")
+    with patch('requests.Session') as mock_session_cls:
+        mock_session_cls.return_value.post.return_value = login_response("token-1")
+        first, second = AuthSession(mock_config), AuthSession(mock_config)
+        first.ensure_logged_in()
+        second.ensure_logged_in()
+
+        mock_session_cls.return_value.post.return_value = login_response("token-2")
+        assert first.refresh("token-1") is True
+        assert second.refresh("token-1") is True
+
+    assert mock_session_cls.return_value.post.call_count == 2
+    assert second.token == "token-2"
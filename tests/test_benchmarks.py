@@ -0,0 +1,47 @@
+import json
+from benchmarks.fake_api import FakeHyponApi
+from benchmarks.mqtt_sink import MqttSink
+from benchmarks import replay_benchmark, serialization_benchmark
+from benchmarks.fake_api import load_responses
+from benchmarks.run_benchmarks import run_scenario
+from hyponcloud2mqtt.capture import CaptureWriter
+from hyponcloud2mqtt.serialization import available_backends
+
+
+def test_fake_api_serves_wiremock_responses():
+    api = FakeHyponApi()
+    assert api.responses["login"]["data"]["token"]
+    assert set(api.responses) >= {"monitor", "production2", "status"}
+    api.server_close()
+
+
+def test_benchmark_scenario_publishes_every_system():
+    with FakeHyponApi() as api, MqttSink() as sink:
+        result = run_scenario(3, 2, 2, api.url, sink)
+
+    assert result.publishes == 6
+    assert api.stats.requests == 18
+    assert sink.stats.topics["bench/bench_0002"] == 2
+
+
+def test_serialization_benchmark_covers_installed_backends():
+    results = serialization_benchmark.run(iterations=5)
+
+    assert [result.backend for result in results] == ["json (legacy)", *available_backends()]
+    assert results[0].speedup == 1.0
+
+
+def test_replay_benchmark_publishes_captured_systems(tmp_path):
+    path = str(tmp_path / "capture.jsonl.gz")
+    responses = load_responses()
+    writer = CaptureWriter(path)
+    for system_id in ("a", "b"):
+        for url, name in (("monitor?refresh=true", "monitor"), ("production2", "production2"), ("status", "status")):
+            writer.record(f"https://cloud/plant/{system_id}/{url}", 200, 0.01, json.dumps(responses[name]).encode())
+    writer.close()
+
+    with MqttSink() as sink:
+        result = replay_benchmark.run(path, cycles=2, speed=0, concurrency=2, sink=sink)
+
+    assert (result.systems, result.publishes) == (2, 4)
+    assert sink.stats.topics["replay/b"] == 2
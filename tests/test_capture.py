@@ -0,0 +1,78 @@
+import json
+from datetime import timedelta
+from unittest.mock import MagicMock
+import requests
+from hyponcloud2mqtt.capture import CaptureEntry, CaptureWriter, ReplayAdapter, read_capture, replay
+from hyponcloud2mqtt.http_client import HttpClient
+
+
+def write_capture(path, entries):
+    writer = CaptureWriter(str(path), clock=iter(entry[0] for entry in entries).__next__)
+    for _, url, status, elapsed, body in entries:
+        writer.record(url, status, elapsed, body)
+    writer.close()
+
+
+def test_capture_round_trip_appends_runs(tmp_path):
+    path = tmp_path / "capture.jsonl.gz"
+    write_capture(path, [(100.0, "http://api/plant/1/status", 200, 0.25, b'{"code": 20000}')])
+    write_capture(path, [(200.0, "http://api/plant/1/status", 500, 0.5, b"oops")])
+
+    assert list(read_capture(str(path))) == [
+        CaptureEntry(100.0, "http://api/plant/1/status", 200, 0.25, b'{"code": 20000}'),
+        CaptureEntry(200.0, "http://api/plant/1/status", 500, 0.5, b"oops")]
+
+
+def test_read_capture_merges_worker_files(tmp_path):
+    path = tmp_path / "capture.jsonl.gz"
+    write_capture(f"{path}.0", [(100.0, "http://api/plant/1/status", 200, 0.1, b"1"),
+                                (300.0, "http://api/plant/1/status", 200, 0.1, b"3")])
+    write_capture(f"{path}.1", [(200.0, "http://api/plant/2/status", 200, 0.1, b"2")])
+
+    assert [entry.body for entry in read_capture(str(path))] == [b"1", b"2", b"3"]
+    assert ReplayAdapter(str(path), speed=0)._next("/plant/2/status").body == b"2"
+
+
+def test_replay_follows_capture_timeline():
+    entries = [CaptureEntry(t, "u", 200, 0.0, b"") for t in (10.0, 12.0, 20.0)]
+    slept = []
+
+    assert len(list(replay(entries, speed=2, clock=lambda: 0.0, sleep=slept.append))) == 3
+    assert slept == [1.0, 5.0]
+
+    slept.clear()
+    list(replay(entries, speed=0, sleep=slept.append))
+    assert slept == []
+
+
+def test_replay_adapter_serves_captured_responses(tmp_path):
+    path = tmp_path / "capture.jsonl.gz"
+    write_capture(path, [
+        (1.0, "https://cloud/plant/1/monitor?refresh=true", 200, 0.2, b'{"n": 1}'),
+        (2.0, "https://cloud/plant/1/monitor?refresh=true", 200, 0.4, b'{"n": 2}'),
+    ])
+    slept = []
+    session = requests.Session()
+    session.mount("http://", ReplayAdapter(str(path), speed=2, sleep=slept.append))
+
+    # Captures are replayed against any host, in order, starting over
+    values = [session.get("http://local/plant/1/monitor?refresh=true").json()["n"] for _ in range(3)]
+    assert values == [1, 2, 1]
+    assert slept == [0.1, 0.2, 0.1]
+
+    login = session.post("http://local/login", json={"username": "u"})
+    assert login.json()["data"]["token"] == "replay"
+    assert session.get("http://local/plant/2/status").status_code == 404
+
+
+def test_http_client_records_responses():
+    session = MagicMock()
+    response = session.get.return_value
+    response.status_code = 200
+    response.elapsed = timedelta(milliseconds=150)
+    response.content = json.dumps({"code": 20000, "data": {}}).encode()
+    capture = MagicMock()
+
+    HttpClient("http://api/plant/1/status", session, capture=capture).fetch_data()
+
+    capture.record.assert_called_once_with("http://api/plant/1/status", 200, 0.15, response.content)
@@ -0,0 +1,79 @@
+from hyponcloud2mqtt.change_detector import ChangeDetector, FieldTracker
+
+
+def test_first_payload_is_published():
+    detector = ChangeDetector()
+    assert detector.should_publish("1", {"power_pv": 0}) is True
+
+
+def test_identical_payload_is_skipped():
+    detector = ChangeDetector()
+    detector.should_publish("1", {"power_pv": 0, "today_generation": 1.5})
+    assert detector.should_publish("1", {"power_pv": 0, "today_generation": 1.5}) is False
+
+
+def test_systems_are_tracked_separately():
+    detector = ChangeDetector()
+    detector.should_publish("1", {"power_pv": 0})
+    assert detector.should_publish("2", {"power_pv": 0}) is True
+
+
+def test_changed_or_missing_field_is_published():
+    detector = ChangeDetector()
+    detector.should_publish("1", {"power_pv": 0, "co2": 1.0})
+    assert detector.should_publish("1", {"power_pv": 0, "co2": 1.1}) is True
+    assert detector.should_publish("1", {"power_pv": 0}) is True
+
+
+def test_deadband_is_compared_with_last_published_value():
+    detector = ChangeDetector(deadbands={"power_pv": 5})
+    detector.should_publish("1", {"power_pv": 100})
+
+    assert detector.should_publish("1", {"power_pv": 104}) is False
+    assert detector.should_publish("1", {"power_pv": 96}) is False
+    # Slow drift eventually exceeds the deadband of the published value
+    assert detector.should_publish("1", {"power_pv": 106}) is True
+    assert detector.should_publish("1", {"power_pv": 110}) is False
+
+
+def test_full_refresh_after_skipped_cycles():
+    detector = ChangeDetector(full_refresh_cycles=3)
+    payload = {"power_pv": 0}
+    results = [detector.should_publish("1", payload) for _ in range(9)]
+    assert results == [True, False, False, False, True, False, False, False, True]
+
+
+def test_full_refresh_disabled():
+    detector = ChangeDetector(full_refresh_cycles=0)
+    detector.should_publish("1", {"power_pv": 0})
+    assert not any(detector.should_publish("1", {"power_pv": 0}) for _ in range(50))
+
+
+def test_forget_forces_next_publish():
+    detector = ChangeDetector()
+    detector.should_publish("1", {"power_pv": 0})
+    detector.should_publish("2", {"power_pv": 0})
+
+    detector.forget("1")
+    assert detector.should_publish("1", {"power_pv": 0}) is True
+    assert detector.should_publish("2", {"power_pv": 0}) is False
+
+    detector.forget()
+    assert detector.should_publish("2", {"power_pv": 0}) is True
+
+
+def test_field_tracker_reports_changed_fields_only():
+    tracker = FieldTracker()
+
+    assert tracker.changed_fields("1", {"power_pv": 0, "percent": 2.5}) == {"power_pv": 0, "percent": 2.5}
+    assert tracker.changed_fields("1", {"power_pv": 5, "percent": 2.5}) == {"power_pv": 5}
+    assert tracker.changed_fields("1", {"power_pv": 5, "percent": 2.5}) == {}
+
+
+def test_field_tracker_forget_field():
+    tracker = FieldTracker()
+    tracker.changed_fields("1", {"power_pv": 0, "percent": 2.5})
+
+    tracker.forget("1", "percent")
+
+    assert tracker.changed_fields("1", {"power_pv": 0, "percent": 2.5}) == {"percent": 2.5}
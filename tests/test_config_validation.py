@@ -77,3 +77,280 @@ def test_custom_mqtt_client_id(monkeypatch):
     monkeypatch.setenv("MQTT_CLIENT_ID", "custom_id")
     config = Config.load()
     assert config.mqtt_client_id == "custom_id"
+
+
+def test_fetch_concurrency_from_env_var(monkeypatch):
+    """Test that FETCH_CONCURRENCY env var is parsed correctly"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("FETCH_CONCURRENCY", "8")
+    config = Config.load()
+    assert config.fetch_concurrency == 8
+
+
+def test_validation_invalid_fetch_concurrency(monkeypatch):
+    """Test that a non-positive fetch concurrency is rejected"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("FETCH_CONCURRENCY", "0")
+    with pytest.raises(ValueError, match="fetch_concurrency must be a positive integer"):
+        Config.load()
+
+
+def test_engine_from_env_var(monkeypatch):
+    """Test that ENGINE env var selects the fetch engine"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("ENGINE", "asyncio")
+    config = Config.load()
+    assert config.engine == "asyncio"
+    # Many systems in flight by default, unlike the threads engine
+    assert config.fetch_concurrency == 50
+
+
+def test_validation_invalid_engine(monkeypatch):
+    """Test that unknown engines are rejected"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("ENGINE", "gevent")
+    with pytest.raises(ValueError, match="engine must be"):
+        Config.load()
+
+
+def test_schedule_from_env_vars(monkeypatch):
+    """Test that scheduling options are read from env vars"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("SCHEDULE_JITTER", "2.5")
+    monkeypatch.setenv("SCHEDULE_PHASE_SPREAD", "true")
+    monkeypatch.setenv("SCHEDULE_OVERRUN", "catch_up")
+    config = Config.load()
+    assert config.schedule_jitter == 2.5
+    assert config.schedule_phase_spread is True
+    assert config.schedule_overrun == "catch_up"
+
+
+def test_validation_jitter_larger_than_interval(monkeypatch):
+    """Test that a jitter of a whole interval or more is rejected"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("HTTP_INTERVAL", "30")
+    monkeypatch.setenv("SCHEDULE_JITTER", "30")
+    with pytest.raises(ValueError, match="schedule_jitter must be lower than the fetch interval"):
+        Config.load()
+
+
+def test_validation_invalid_overrun_policy(monkeypatch):
+    """Test that unknown overrun policies are rejected"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("SCHEDULE_OVERRUN", "later")
+    with pytest.raises(ValueError, match="schedule_overrun must be"):
+        Config.load()
+
+
+def test_endpoint_intervals_default_to_http_interval(monkeypatch):
+    """Test that endpoints are polled at http_interval unless overridden"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("HTTP_INTERVAL", "60")
+    monkeypatch.setenv("MONITOR_INTERVAL", "30")
+    monkeypatch.setenv("PRODUCTION_INTERVAL", "300")
+    config = Config.load()
+    assert config.endpoint_intervals() == {"monitor": 30, "production": 300, "status": 60}
+    assert config.cycle_interval == 30
+
+
+def test_validation_invalid_endpoint_interval(monkeypatch):
+    """Test that non-positive endpoint intervals are rejected"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("STATUS_INTERVAL", "0")
+    with pytest.raises(ValueError, match="status_interval must be a positive integer"):
+        Config.load()
+
+
+def test_delta_publishing_from_env_vars(monkeypatch):
+    """Test that delta publishing options are read from env vars"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("DELTA_PUBLISHING", "true")
+    monkeypatch.setenv("DELTA_DEADBANDS", "power_pv=5, w_cha=2.5")
+    monkeypatch.setenv("DELTA_FULL_REFRESH_CYCLES", "20")
+    config = Config.load()
+    assert config.delta_publishing is True
+    assert config.delta_deadbands == {"power_pv": 5.0, "w_cha": 2.5}
+    assert config.delta_full_refresh_cycles == 20
+
+
+def test_validation_negative_deadband(tmp_path, monkeypatch):
+    """Test that negative deadbands are rejected"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("delta_deadbands:\n  power_pv: -5\n")
+    with pytest.raises(ValueError, match="delta_deadbands must map"):
+        Config.load(str(config_file))
+
+
+def test_outbox_from_env_vars(monkeypatch):
+    """Test that outbox options are read from env vars"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("OUTBOX_PATH", "/data/outbox.db")
+    monkeypatch.setenv("OUTBOX_MAX_MESSAGES", "500")
+    monkeypatch.setenv("OUTBOX_DRAIN_RATE", "2.5")
+    config = Config.load()
+    assert config.outbox_path == "/data/outbox.db"
+    assert config.outbox_max_messages == 500
+    assert config.outbox_max_age == 86400
+    assert config.outbox_drain_rate == 2.5
+
+
+def test_validation_invalid_outbox_drain_rate(monkeypatch):
+    """Test that a non-positive outbox drain rate is rejected"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("OUTBOX_DRAIN_RATE", "0")
+    with pytest.raises(ValueError, match="outbox_drain_rate must be a positive number"):
+        Config.load()
+
+
+def test_validation_invalid_extra_field(tmp_path, monkeypatch):
+    """Test that invalid field declarations are rejected"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text("extra_fields:\n  - endpoint: battery\n    source: soc\n    key: soc\n")
+    with pytest.raises(ValueError, match="Field endpoint must be one of"):
+        Config.load(str(config_file))
+
+
+def test_sharding_from_env_vars(monkeypatch):
+    """Test that sharding options are read from env vars"""
+    monkeypatch.setenv("SYSTEM_IDS", "1,2,3")
+    monkeypatch.setenv("WORKER_PROCESSES", "2")
+    monkeypatch.setenv("SHARD_STRATEGY", "Count")
+    config = Config.load()
+    assert config.worker_processes == 2
+    assert config.shard_strategy == "count"
+
+
+def test_validation_invalid_shard_strategy(monkeypatch):
+    """Test that unknown shard strategies are rejected"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("SHARD_STRATEGY", "random")
+    with pytest.raises(ValueError, match="shard_strategy must be 'hash' or 'count'"):
+        Config.load()
+
+
+def test_validation_invalid_worker_processes(monkeypatch):
+    """Test that a non-positive number of worker processes is rejected"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("WORKER_PROCESSES", "0")
+    with pytest.raises(ValueError, match="worker_processes must be a positive integer"):
+        Config.load()
+
+
+def test_adaptive_polling_from_env_vars(monkeypatch):
+    """Test that adaptive polling options are read from env vars"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("ADAPTIVE_POLLING", "true")
+    monkeypatch.setenv("ADAPTIVE_MAX_INTERVAL", "900")
+    config = Config.load()
+    assert config.adaptive_polling is True
+    assert config.adaptive_min_interval is None
+    assert config.adaptive_max_interval == 900
+    assert config.max_fetch_interval == 900
+
+
+def test_validation_adaptive_max_below_min(monkeypatch):
+    """Test that the adaptive maximum interval cannot be below the minimum"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("ADAPTIVE_MIN_INTERVAL", "600")
+    monkeypatch.setenv("ADAPTIVE_MAX_INTERVAL", "300")
+    with pytest.raises(ValueError, match="adaptive_max_interval must be an integer not lower"):
+        Config.load()
+
+
+def test_rate_limit_from_env_vars(monkeypatch):
+    """Test that rate limiter and circuit breaker options are read from env vars"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("API_RATE_LIMIT", "2.5")
+    monkeypatch.setenv("CIRCUIT_BREAKER_THRESHOLD", "0")
+    config = Config.load()
+    assert config.api_rate_limit == 2.5
+    assert config.api_rate_burst is None
+    assert config.circuit_breaker_threshold == 0
+    assert config.circuit_breaker_reset_timeout == 60
+
+
+def test_validation_invalid_rate_limit(monkeypatch):
+    """Test that a non-positive rate limit is rejected"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("API_RATE_LIMIT", "-1")
+    with pytest.raises(ValueError, match="api_rate_limit must be a positive number"):
+        Config.load()
+
+
+def test_http_transport_from_env_vars(monkeypatch):
+    """Test that HTTP transport options are read from env vars"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("HTTP_CONNECT_TIMEOUT", "3.5")
+    monkeypatch.setenv("HTTP_POOL_MAXSIZE", "50")
+    monkeypatch.setenv("HTTP_RETRIES", "0")
+    monkeypatch.setenv("HTTP2", "true")
+    config = Config.load()
+    assert config.http_timeout == (3.5, 10.0)
+    assert config.http_pool_maxsize == 50
+    assert config.http_retries == 0
+    assert config.http2 is True
+
+
+def test_validation_invalid_http_timeout(monkeypatch):
+    """Test that a non-positive HTTP timeout is rejected"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("HTTP_READ_TIMEOUT", "0")
+    with pytest.raises(ValueError, match="http_read_timeout must be a positive number"):
+        Config.load()
+
+
+def test_discovery_republishing_from_env_vars(monkeypatch):
+    """Test that discovery rate and spread are read from env vars"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("HA_DISCOVERY_RATE", "0")
+    monkeypatch.setenv("HA_DISCOVERY_SPREAD", "2.5")
+    config = Config.load()
+    assert config.ha_discovery_rate == 0
+    assert config.ha_discovery_spread == 2.5
+
+
+def test_validation_negative_discovery_spread(monkeypatch):
+    """Test that a negative discovery spread is rejected"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("HA_DISCOVERY_SPREAD", "-1")
+    with pytest.raises(ValueError, match="ha_discovery_spread must be a non-negative number"):
+        Config.load()
+
+
+def test_history_from_env_vars(monkeypatch):
+    """Test that history options are read from env vars"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("HISTORY_PATH", "/data/history.db")
+    monkeypatch.setenv("HISTORY_RAW_RETENTION", "3600")
+    config = Config.load()
+    assert config.history_path == "/data/history.db"
+    assert config.history_raw_retention == 3600
+    assert config.history_rollup_retention == 604800
+
+
+def test_validation_history_raw_retention_too_short(monkeypatch):
+    """Test that raw readings must be kept at least one 5 minute bucket"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("HISTORY_RAW_RETENTION", "60")
+    with pytest.raises(ValueError, match="history_raw_retention must be an integer of at least 300 seconds"):
+        Config.load()
+
+
+def test_validation_replay_with_capture(monkeypatch):
+    """Test that a replayed session cannot be captured"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("CAPTURE_PATH", "/data/capture.jsonl.gz")
+    monkeypatch.setenv("REPLAY_PATH", "/data/old.jsonl.gz")
+    with pytest.raises(ValueError, match="capture_path and replay_path cannot be used together"):
+        Config.load()
+
+
+def test_validation_replay_requires_threads_engine(monkeypatch):
+    """Test that replay is rejected with the asyncio engine"""
+    monkeypatch.setenv("SYSTEM_IDS", "12345")
+    monkeypatch.setenv("REPLAY_PATH", "/data/capture.jsonl.gz")
+    monkeypatch.setenv("ENGINE", "asyncio")
+    with pytest.raises(ValueError, match="replay_path requires the 'threads' engine"):
+        Config.load()
@@ -6,8 +6,7 @@ from hyponcloud2mqtt.mqtt_client import MqttClient
 def test_http_client_fetch_success():
     mock_session = MagicMock()
     mock_response = MagicMock()
-    mock_response.json.return_value = {
-        "code": 20000, "data": {"key": "value"}}
+    mock_response.content = b'{"code": 20000, "data": {"key": "value"}}'
     mock_response.status_code = 200
     mock_session.get.return_value = mock_response
 
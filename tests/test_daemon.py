@@ -0,0 +1,258 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+import pytest
+from hyponcloud2mqtt.change_detector import ChangeDetector, FieldTracker
+from hyponcloud2mqtt.config import Config
+from hyponcloud2mqtt.health_server import HealthContext
+from hyponcloud2mqtt.main import Daemon
+from hyponcloud2mqtt.outbox import Outbox
+
+
+@pytest.fixture
+def config():
+    return Config(
+        http_url="http://mock.url",
+        system_ids=["1", "2", "3", "4"],
+        http_interval=60,
+        mqtt_broker="localhost",
+        mqtt_port=1883,
+        mqtt_topic="hypon",
+        mqtt_availability_topic="hypon/status",
+    )
+
+
+@pytest.fixture
+def daemon(config):
+    with patch("signal.signal"):
+        return Daemon(config)
+
+
+def make_fetcher(system_id, delay=0.0, data=None):
+    fetcher = MagicMock()
+    fetcher.system_id = system_id
+
+    def fetch_all():
+        time.sleep(delay)
+        return data if data is not None else {"power_pv": int(system_id)}
+
+    fetcher.fetch_all.side_effect = fetch_all
+    return fetcher
+
+
+def test_run_cycle_sequential_publishes_each_system(daemon, config):
+    """Test that a sequential cycle publishes every system to its own topic."""
+    mqtt_client = MagicMock()
+    fetchers = [make_fetcher(system_id) for system_id in config.system_ids]
+
+    daemon._run_cycle(fetchers, mqtt_client, config)
+
+    assert mqtt_client.publish.call_count == 4
+    published = {call.kwargs["topic"]: call.args[0]
+                 for call in mqtt_client.publish.call_args_list}
+    assert published["hypon/3"] == {"power_pv": 3}
+
+
+def test_run_cycle_concurrent_overlaps_fetches(daemon, config):
+    """Test that a concurrent cycle lasts as long as the slowest system."""
+    mqtt_client = MagicMock()
+    fetchers = [make_fetcher(system_id, delay=0.2)
+                for system_id in config.system_ids]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        start = time.monotonic()
+        daemon._run_cycle(fetchers, mqtt_client, config, executor)
+        elapsed = time.monotonic() - start
+
+    assert mqtt_client.publish.call_count == 4
+    assert elapsed < 0.6
+
+
+def test_run_cycle_concurrency_limit(daemon, config):
+    """Test that no more systems than the executor size are fetched at once."""
+    mqtt_client = MagicMock()
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def fetch_all():
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+        return {"power_pv": 1}
+
+    fetchers = []
+    for system_id in config.system_ids:
+        fetcher = MagicMock()
+        fetcher.system_id = system_id
+        fetcher.fetch_all.side_effect = fetch_all
+        fetchers.append(fetcher)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        daemon._run_cycle(fetchers, mqtt_client, config, executor)
+
+    assert peak == 2
+    assert mqtt_client.publish.call_count == 4
+
+
+def test_run_cycle_skips_publish_without_data(daemon, config):
+    """Test that systems without data are not published."""
+    mqtt_client = MagicMock()
+    fetcher = make_fetcher("1")
+    fetcher.fetch_all.side_effect = None
+    fetcher.fetch_all.return_value = None
+
+    daemon._run_cycle([fetcher], mqtt_client, config)
+
+    mqtt_client.publish.assert_not_called()
+
+
+def test_handle_result_skips_unchanged_payload(daemon, config):
+    """Test that delta publishing drops identical payloads."""
+    mqtt_client = MagicMock()
+    daemon.change_detector = ChangeDetector()
+
+    daemon._handle_result("1", {"power_pv": 0}, mqtt_client, config)
+    daemon._handle_result("1", {"power_pv": 0}, mqtt_client, config)
+    daemon._handle_result("1", {"power_pv": 5}, mqtt_client, config)
+
+    assert mqtt_client.publish.call_count == 2
+
+
+def test_handle_result_republishes_after_failed_publish(daemon, config):
+    """Test that a payload not handed to MQTT is not considered published."""
+    mqtt_client = MagicMock()
+    mqtt_client.publish.return_value = False
+    daemon.change_detector = ChangeDetector()
+
+    daemon._handle_result("1", {"power_pv": 0}, mqtt_client, config)
+    daemon._handle_result("1", {"power_pv": 0}, mqtt_client, config)
+
+    assert mqtt_client.publish.call_count == 2
+
+
+def test_handle_result_publishes_changed_fields(daemon, config):
+    """Test that per-field topics only carry changed fields, retained."""
+    mqtt_client = MagicMock()
+    daemon.field_tracker = FieldTracker()
+
+    daemon._handle_result("1", {"power_pv": 0, "percent": 2.5}, mqtt_client, config)
+    mqtt_client.reset_mock()
+    daemon._handle_result("1", {"power_pv": 5, "percent": 2.5}, mqtt_client, config)
+
+    mqtt_client.publish.assert_any_call(5, topic="hypon/1/power_pv", retain=True)
+    mqtt_client.publish.assert_any_call({"power_pv": 5, "percent": 2.5}, topic="hypon/1")
+    assert mqtt_client.publish.call_count == 2
+
+
+def test_handle_result_buffers_while_disconnected(daemon, config, tmp_path):
+    """Test that payloads go to the outbox, in order, until it is drained."""
+    mqtt_client = MagicMock()
+    mqtt_client.connected = False
+    daemon.outbox = Outbox(str(tmp_path / "outbox.db"))
+
+    daemon._handle_result("1", {"power_pv": 0}, mqtt_client, config)
+    mqtt_client.connected = True
+    daemon._handle_result("1", {"power_pv": 5}, mqtt_client, config)
+
+    mqtt_client.publish.assert_not_called()
+    assert [m.data for m in daemon.outbox.peek(10)] == [{"power_pv": 0}, {"power_pv": 5}]
+
+
+def test_drain_batch_publishes_buffered_payloads(daemon, config, tmp_path):
+    """Test that buffered payloads are published oldest first and removed."""
+    mqtt_client = MagicMock()
+
+    def publish(data, topic, retain, wait, callback):
+        callback(topic, True)
+        return True
+
+    mqtt_client.publish.side_effect = publish
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    outbox.put("hypon/1", {"power_pv": 0})
+    outbox.put("hypon/1", {"power_pv": 5})
+
+    assert daemon._drain_batch(outbox, mqtt_client, delay=0) == 2
+
+    published = [call.args[0] for call in mqtt_client.publish.call_args_list]
+    assert [data["power_pv"] for data in published] == [0, 5]
+    assert "buffered_at" in published[0]
+    assert len(outbox) == 0
+
+
+def test_drain_batch_stops_on_failed_publish(daemon, config, tmp_path):
+    """Test that a payload that was not written stays in the outbox."""
+    mqtt_client = MagicMock()
+    mqtt_client.publish.side_effect = lambda data, topic, retain, wait, callback: callback(topic, False)
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    outbox.put("hypon/1", {"power_pv": 0})
+    outbox.put("hypon/1", {"power_pv": 5})
+
+    assert daemon._drain_batch(outbox, mqtt_client, delay=0) == 0
+    assert mqtt_client.publish.call_count == 1
+    assert len(outbox) == 2
+    # Lost, hence published again by the next drain
+    assert [m.data for m in outbox.peek(10)] == [{"power_pv": 0}, {"power_pv": 5}]
+
+
+def test_drain_batch_does_not_republish_late_acknowledgement(daemon, config, tmp_path):
+    """Test that a payload acknowledged after the publish timeout is published once."""
+    callbacks = []
+    mqtt_client = MagicMock()
+    mqtt_client.publish.side_effect = lambda data, topic, retain, wait, callback: callbacks.append(callback)
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    outbox.put("hypon/1", {"power_pv": 0})
+
+    assert daemon._drain_batch(outbox, mqtt_client, delay=0) == 0
+    assert daemon._drain_batch(outbox, mqtt_client, delay=0) == 0
+    assert mqtt_client.publish.call_count == 1
+
+    callbacks[0]("hypon/1", True)
+    assert len(outbox) == 0
+
+
+def test_handle_result_records_fetch_outcome(daemon, config):
+    """Test that fetch outcomes are reported to the health context."""
+    daemon.health_context = MagicMock()
+
+    daemon._handle_result("1", {"power_pv": 0}, MagicMock(), config)
+    daemon._handle_result("2", None, MagicMock(), config)
+
+    daemon.health_context.record_fetch.assert_any_call("1", True)
+    daemon.health_context.record_fetch.assert_any_call("2", False)
+
+
+def test_handle_result_adapts_polling_interval(daemon, config):
+    """Test that idle systems are polled less often."""
+    config.adaptive_polling = True
+    config.adaptive_max_interval = 600
+    scheduler = daemon._create_scheduler(config)
+    scheduler.due()
+    daemon.scheduler = scheduler
+
+    daemon._handle_result("1", {"power_pv": 0}, MagicMock(), config)
+    daemon._handle_result("2", {"power_pv": 800}, MagicMock(), config)
+
+    assert scheduler.interval_of("1") == 120
+    assert scheduler.interval_of("2") == 60
+
+
+def test_slow_cycle_keeps_heartbeat(daemon, config, clock):
+    """Test that a cycle longer than the heartbeat timeout does not look stuck."""
+    daemon.health_context = HealthContext(MagicMock(), config.system_ids, heartbeat_timeout=300, cache_ttl=0, clock=clock)
+    fetchers = [make_fetcher(system_id) for system_id in config.system_ids]
+    for fetcher in fetchers:
+        def fetch_all(system_id=fetcher.system_id):
+            clock.now += 200
+            return {"power_pv": int(system_id)}
+        fetcher.fetch_all.side_effect = fetch_all
+
+    daemon._run_cycle(fetchers, MagicMock(), config)
+
+    assert clock.now == 1800.0
+    assert daemon.health_context.snapshot("livez")[0] == 200
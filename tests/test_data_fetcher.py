@@ -1,7 +1,8 @@
 import pytest
 from unittest.mock import MagicMock, patch
-from hyponcloud2mqtt.data_fetcher import DataFetcher
+from hyponcloud2mqtt.data_fetcher import DataFetcher, EndpointCache
 from hyponcloud2mqtt.http_client import AuthenticationError
+from hyponcloud2mqtt.worker_pool import WorkerPool
 
 
 @pytest.fixture
@@ -11,6 +12,20 @@ def mock_config():
     config.api_username = "testuser"
     config.api_password = "testpass"
     config.verify_ssl = True
+    config.api_rate_limit = None
+    config.circuit_breaker_threshold = 5
+    config.circuit_breaker_reset_timeout = 60
+    config.token_lifetime = None
+    config.token_refresh_margin = 300
+    config.token_cache_path = None
+    config.http_timeout = (10.0, 10.0)
+    config.http_pool_connections = 10
+    config.http_pool_maxsize = None
+    config.http_retries = 2
+    config.http_retry_backoff = 0.5
+    config.http2 = False
+    config.capture_path = None
+    config.replay_path = None
     return config
 
 
@@ -30,7 +45,8 @@ def data_fetcher(mock_config):
         mock_session.post.return_value = mock_response
 
         fetcher = DataFetcher(mock_config, "system_id_123")
-        return fetcher
+    yield fetcher
+    fetcher.close()
 
 
 def test_login_success(mock_config):
@@ -48,16 +64,17 @@ def test_login_success(mock_config):
         fetcher = DataFetcher(mock_config, "system_id_123")
 
         # Reset mocks to test separate calls if needed,
-        # but _login is called in __init__, so we already verified it implicity via creation.
-        # Let's call _login explicitly to verification.
-        token = fetcher._login()
+        # but login is called in __init__, so we already verified it implicity via creation.
+        # Let's call login explicitly to verification.
+        token = fetcher.auth.login()
 
         assert token == "new-token"
         mock_session.post.assert_called_with(
             "http://api.example.com/login",
             json={"username": "testuser", "password": "testpass", "oem": None},
-            timeout=10
+            timeout=(10.0, 10.0)
         )
+        fetcher.close()
 
 
 def test_login_failure_wrong_code(mock_config):
@@ -189,6 +206,20 @@ def test_data_fetcher_no_creds():
     config.api_username = None
     config.api_password = None
     config.verify_ssl = True
+    config.api_rate_limit = None
+    config.circuit_breaker_threshold = 5
+    config.circuit_breaker_reset_timeout = 60
+    config.token_lifetime = None
+    config.token_refresh_margin = 300
+    config.token_cache_path = None
+    config.http_timeout = (10.0, 10.0)
+    config.http_pool_connections = 10
+    config.http_pool_maxsize = None
+    config.http_retries = 2
+    config.http_retry_backoff = 0.5
+    config.http2 = False
+    config.capture_path = None
+    config.replay_path = None
 
     with patch('requests.Session'):
         fetcher = DataFetcher(config, "sys_id")
@@ -203,6 +234,7 @@ def test_data_fetcher_no_creds():
 
         # Verify clients initialized
         assert fetcher.monitor_client is not None
+        fetcher.close()
 
 
 def test_session_config_verify():
@@ -212,6 +244,20 @@ def test_session_config_verify():
     config.api_username = "u"
     config.api_password = "p"
     config.verify_ssl = False  # Test False case
+    config.api_rate_limit = None
+    config.circuit_breaker_threshold = 5
+    config.circuit_breaker_reset_timeout = 60
+    config.token_lifetime = None
+    config.token_refresh_margin = 300
+    config.token_cache_path = None
+    config.http_timeout = (10.0, 10.0)
+    config.http_pool_connections = 10
+    config.http_pool_maxsize = None
+    config.http_retries = 2
+    config.http_retry_backoff = 0.5
+    config.http2 = False
+    config.capture_path = None
+    config.replay_path = None
 
     with patch('requests.Session') as mock_session_cls:
         mock_session = mock_session_cls.return_value
@@ -223,6 +269,7 @@ def test_session_config_verify():
         fetcher = DataFetcher(config, "sys_id")
 
         assert fetcher.session.verify is False
+        fetcher.close()
 
 
 def test_fetch_all_generic_failure(data_fetcher):
@@ -235,3 +282,90 @@ def test_fetch_all_generic_failure(data_fetcher):
     result = data_fetcher.fetch_all()
 
     assert result is None
+
+
+def test_fetch_all_uses_shared_pool(mock_config):
+    """Verify that endpoint requests run on the pool given by the daemon."""
+    pool = WorkerPool(3)
+    pool.submit = MagicMock(wraps=pool.submit)
+
+    with patch('requests.Session') as mock_session_cls:
+        mock_session_cls.return_value.post.return_value.json.return_value = {
+            "code": 20000, "data": {"token": "t"}}
+        fetcher = DataFetcher(mock_config, "sys_id", pool=pool)
+
+    fetcher.monitor_client.fetch_data = MagicMock(return_value={"data": {"power_pv": 1}})
+    fetcher.production_client.fetch_data = MagicMock(return_value=None)
+    fetcher.status_client.fetch_data = MagicMock(return_value=None)
+
+    try:
+        result = fetcher.fetch_all()
+    finally:
+        pool.shutdown()
+
+    assert fetcher.pool is pool
+    assert result == {"power_pv": 1}
+    assert pool.submit.call_count == 3
+
+
+def test_close_releases_only_private_pool(data_fetcher, mock_config):
+    """Verify that close shuts down the fetcher's own pool, never the daemon's."""
+    private_pool = data_fetcher.pool
+    data_fetcher.close()
+    with pytest.raises(RuntimeError):
+        private_pool.submit(lambda: None)
+
+    shared_pool, shared_auth = MagicMock(), MagicMock(token="t")
+    DataFetcher(mock_config, "sys_id", shared_auth, shared_pool).close()
+    shared_pool.shutdown.assert_not_called()
+    shared_auth.close.assert_not_called()
+
+
+@pytest.fixture
+def clock(clock):
+    clock.now = 0.0
+    return clock
+
+
+def test_endpoint_cache_polls_each_endpoint_at_its_interval(clock):
+    cache = EndpointCache(
+        {"monitor": 30, "production": 300, "status": 120}, tolerance=15, clock=clock)
+
+    assert cache.due() == ["monitor", "production", "status"]
+    cache.resolve({"monitor": {"m": 1}, "production": {"p": 1}, "status": {"s": 1}})
+
+    clock.now = 29  # Slightly early because of jitter, within tolerance
+    assert cache.due() == ["monitor"]
+    assert cache.resolve({"monitor": {"m": 2}}) == ({"m": 2}, {"p": 1}, {"s": 1})
+
+    clock.now = 120
+    assert cache.due() == ["monitor", "status"]
+
+
+def test_endpoint_cache_retries_failed_endpoint(clock):
+    cache = EndpointCache({"monitor": 30, "production": 300, "status": 300}, clock=clock)
+
+    cache.resolve({"monitor": {"m": 1}, "production": None, "status": {"s": 1}})
+
+    clock.now = 30
+    assert cache.due() == ["monitor", "production"]
+    assert cache.resolve({"monitor": None, "production": None}) == (None, None, {"s": 1})
+
+
+def test_fetch_all_skips_endpoints_not_due(data_fetcher, clock):
+    data_fetcher.endpoints = EndpointCache(
+        {"monitor": 30, "production": 300, "status": 120}, clock=clock)
+    data_fetcher.monitor_client.fetch_data = MagicMock(return_value={"data": {"power_pv": 10}})
+    data_fetcher.production_client.fetch_data = MagicMock(
+        return_value={"data": {"today_generation": 1.5}})
+    data_fetcher.status_client.fetch_data = MagicMock(return_value={"data": {}})
+
+    data_fetcher.fetch_all()
+    clock.now = 30
+    data_fetcher.monitor_client.fetch_data.return_value = {"data": {"power_pv": 20}}
+    result = data_fetcher.fetch_all()
+
+    assert data_fetcher.monitor_client.fetch_data.call_count == 2
+    assert data_fetcher.production_client.fetch_data.call_count == 1
+    assert data_fetcher.status_client.fetch_data.call_count == 1
+    assert result == {"power_pv": 20, "today_generation": 1.5}
@@ -1,5 +1,6 @@
 from __future__ import annotations
-from hyponcloud2mqtt.data_merger import merge_api_data
+import pytest
+from hyponcloud2mqtt.data_merger import compile_fields, merge_api_data
 
 
 def test_merge_api_data():
@@ -90,3 +91,42 @@ def test_repro_strings_in_output():
     # Assert invalid/None values are removed
     assert "inverter_fault" not in merged
     assert "inverter_wait" not in merged
+
+
+def test_compile_fields_adds_extra_fields():
+    plan = compile_fields([
+        {"endpoint": "monitor", "source": "soc", "key": "battery_soc", "type": "int"},
+        {"endpoint": "monitor", "source": "power_load", "key": "power_load_kw", "scale": 0.001},
+        {"endpoint": "status", "source": "battery.count", "key": "battery_count", "type": "int"},
+    ])
+    monitor = {"data": {"soc": "85", "power_load": 1200, "power_pv": 41}}
+    status = {"data": {"battery": {"count": 2}, "gateway": {"online": 1}}}
+
+    merged = merge_api_data(monitor, None, status, plan)
+
+    assert merged == {"power_pv": 41, "battery_soc": 85, "power_load_kw": 1.2,
+                      "battery_count": 2, "gateway_online": 1}
+
+
+def test_compile_fields_overrides_default_field():
+    plan = compile_fields([{"endpoint": "monitor", "source": "power_pv", "key": "power_pv", "type": "float"}])
+
+    assert merge_api_data({"data": {"power_pv": "41.5"}}, None, None, plan) == {"power_pv": 41.5}
+
+
+def test_merge_api_data_ignores_non_numeric_values():
+    monitor = {"data": {"percent": "n/a", "w_cha": [1], "power_pv": "1.9"}}
+    status = {"data": {"gateway": "offline"}}
+
+    assert merge_api_data(monitor, None, status) == {"power_pv": 1}
+
+
+@pytest.mark.parametrize("field, message", [
+    ({"endpoint": "battery", "source": "soc", "key": "soc"}, "endpoint must be one of"),
+    ({"endpoint": "monitor", "source": "soc"}, "needs a source path and a key"),
+    ({"endpoint": "monitor", "source": "soc", "key": "soc", "type": "str"}, "type must be"),
+    ({"endpoint": "monitor", "source": "soc", "key": "soc", "scale": "x"}, "scale must be a number"),
+])
+def test_compile_fields_rejects_invalid_declarations(field, message):
+    with pytest.raises(ValueError, match=message):
+        compile_fields([field])
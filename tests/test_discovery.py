@@ -1,15 +1,18 @@
+import threading
+import time
 import pytest
 from unittest.mock import patch, MagicMock
 from hyponcloud2mqtt.config import Config
 from hyponcloud2mqtt.main import Daemon
-from hyponcloud2mqtt.discovery import publish_discovery_message
+from hyponcloud2mqtt.discovery import (
+    DiscoveryPublisher, DiscoveryState, discovery_messages, payload_hash, publish_discovery_message)
 
 
 @patch('hyponcloud2mqtt.main.MqttClient')
 @patch('hyponcloud2mqtt.main.DataFetcher')
 @patch('hyponcloud2mqtt.main.HealthServer')
 @patch('hyponcloud2mqtt.main.Config.load')
-@patch('hyponcloud2mqtt.main.publish_discovery_message')
+@patch('hyponcloud2mqtt.main.DiscoveryPublisher')
 def test_discovery_disabled(
         mock_publish_discovery,
         mock_config_load, mock_health_server, mock_data_fetcher, mock_mqtt_client):
@@ -40,13 +43,14 @@ def test_discovery_disabled(
 
     # Assert
     mock_publish_discovery.assert_not_called()
+    assert daemon.discovery is None
 
 
 @patch('hyponcloud2mqtt.main.MqttClient')
 @patch('hyponcloud2mqtt.main.DataFetcher')
 @patch('hyponcloud2mqtt.main.HealthServer')
 @patch('hyponcloud2mqtt.main.Config.load')
-@patch('hyponcloud2mqtt.main.publish_discovery_message')
+@patch('hyponcloud2mqtt.main.DiscoveryPublisher')
 def test_discovery_enabled(
         mock_publish_discovery,
         mock_config_load, mock_health_server, mock_data_fetcher, mock_mqtt_client):
@@ -75,10 +79,14 @@ def test_discovery_enabled(
         daemon.run()
     assert e.value.code == 0
 
-    # Assert
-    assert mock_publish_discovery.call_count == 2
-    mock_publish_discovery.assert_any_call(mock_mqtt_instance, config, "12345")
-    mock_publish_discovery.assert_any_call(mock_mqtt_instance, config, "67890")
+    # Assert: published in the background, for every system at once
+    mock_publish_discovery.assert_called_once()
+    assert mock_publish_discovery.call_args.args[:2] == (mock_mqtt_instance, config)
+    publish = mock_publish_discovery.return_value.publish
+    deadline = time.monotonic() + 2
+    while not publish.called and time.monotonic() < deadline:
+        time.sleep(0.01)
+    publish.assert_called_once_with(["12345", "67890"])
 
 
 def test_publish_discovery_message_contains_precision():
@@ -147,3 +155,249 @@ def test_publish_discovery_message_no_precision_for_diagnostic():
             break
 
     assert found, "Discovery message for gateway_online not found"
+
+
+def test_publish_discovery_message_per_field_topics():
+    """Test that per-field topics mode points sensors at raw value topics."""
+    client = MagicMock()
+    config = Config(
+        http_url="http://mock.url",
+        system_ids=["12345"],
+        http_interval=60,
+        mqtt_broker="localhost",
+        mqtt_port=1883,
+        mqtt_topic="hypon",
+        mqtt_availability_topic="hypon/status",
+        ha_discovery_enabled=True,
+        mqtt_per_field_topics=True
+    )
+
+    publish_discovery_message(client, config, "12345")
+
+    payloads = {call.kwargs["topic"]: call.args[0] for call in client.publish.call_args_list}
+    payload = payloads["homeassistant/sensor/hypon_12345/hypon_12345_power_pv/config"]
+    assert payload["state_topic"] == "hypon/12345/power_pv"
+    assert "value_template" not in payload
+
+
+def test_publish_discovery_message_extra_fields():
+    """Test that fields declared in config get their own sensor."""
+    client = MagicMock()
+    config = Config(
+        http_url="http://mock.url",
+        system_ids=["12345"],
+        http_interval=60,
+        mqtt_broker="localhost",
+        mqtt_port=1883,
+        mqtt_topic="hypon",
+        mqtt_availability_topic="hypon/status",
+        extra_fields=[
+            {"endpoint": "monitor", "source": "soc", "key": "battery_soc", "type": "int",
+             "unit": "%", "device_class": "battery"},
+            {"endpoint": "monitor", "source": "power_pv", "key": "power_pv", "type": "float"},
+        ]
+    )
+
+    publish_discovery_message(client, config, "12345")
+
+    payloads = {call.kwargs["topic"]: call.args[0] for call in client.publish.call_args_list}
+    soc = payloads["homeassistant/sensor/hypon_12345/hypon_12345_battery_soc/config"]
+    assert soc["name"] == "Battery Soc"
+    assert soc["unit_of_measurement"] == "%"
+    assert soc["device_class"] == "battery"
+    assert soc["value_template"] == "{{ value_json.battery_soc }}"
+    # Overridden built-in fields keep their sensor attributes
+    power_pv = payloads["homeassistant/sensor/hypon_12345/hypon_12345_power_pv/config"]
+    assert power_pv["name"] == "Solar Power Generation"
+
+
+def _discovery_config(**overrides):
+    values = dict(
+        http_url="http://mock.url",
+        system_ids=["12345", "67890"],
+        http_interval=60,
+        mqtt_broker="localhost",
+        mqtt_port=1883,
+        mqtt_topic="hypon",
+        mqtt_availability_topic="hypon/status",
+    )
+    values.update(overrides)
+    return Config(**values)
+
+
+def _confirming_client(success=True):
+    """MQTT client mock invoking the publish callbacks like the network loop."""
+    client = MagicMock()
+
+    def publish(data, topic=None, retain=False, wait=False, callback=None):
+        if callback:
+            callback(topic, success)
+        return success
+    client.publish.side_effect = publish
+    return client
+
+
+def test_payload_hash_ignores_key_order():
+    assert payload_hash({"a": 1, "b": {"c": 2}}) == payload_hash({"b": {"c": 2}, "a": 1})
+    assert payload_hash({"a": 1}) != payload_hash({"a": 2})
+
+
+def test_discovery_publisher_skips_unchanged(tmp_path):
+    """Test that a restart only publishes missing or changed configs."""
+    path = str(tmp_path / "discovery.json")
+    config = _discovery_config()
+    topics_per_system = len(discovery_messages(config, "12345"))
+
+    client = _confirming_client()
+    assert DiscoveryPublisher(client, config, DiscoveryState(path)).publish(config.system_ids) == 2 * topics_per_system
+    assert all(call.kwargs["retain"] for call in client.publish.call_args_list)
+
+    # Restart with the same configuration: nothing to publish
+    client = _confirming_client()
+    assert DiscoveryPublisher(client, config, DiscoveryState(path)).publish(config.system_ids) == 0
+    client.publish.assert_not_called()
+
+    # A changed device name only republishes the configs of the new content
+    config = _discovery_config(device_name="Roof")
+    client = _confirming_client()
+    publisher = DiscoveryPublisher(client, config, DiscoveryState(path))
+    assert publisher.publish(["12345"]) == topics_per_system
+    # Forcing republishes everything
+    assert publisher.publish(["12345"], force=True) == topics_per_system
+
+
+def test_discovery_publisher_records_only_written_messages(tmp_path):
+    """Test that lost messages are published again on the next run."""
+    path = str(tmp_path / "discovery.json")
+    config = _discovery_config()
+
+    DiscoveryPublisher(_confirming_client(success=False), config, DiscoveryState(path)).publish(["12345"])
+    assert len(DiscoveryState(path)) == 0
+
+    client = _confirming_client()
+    assert DiscoveryPublisher(client, config, DiscoveryState(path)).publish(["12345"]) > 0
+
+
+def test_discovery_publisher_does_not_wait_for_each_message():
+    """Test that messages are pipelined and confirmations awaited at the end."""
+    config = _discovery_config()
+    callbacks = []
+    client = MagicMock()
+    client.publish.side_effect = lambda *args, callback=None, **kwargs: callbacks.append(callback) or True
+
+    def confirm():
+        time.sleep(0.05)
+        for callback in list(callbacks):
+            callback("topic", True)
+    threading.Thread(target=confirm).start()
+
+    published = DiscoveryPublisher(client, config).publish(["12345"], timeout=5)
+
+    assert published == len(callbacks) > 0
+    assert all(not call.kwargs.get("wait") for call in client.publish.call_args_list)
+
+
+def test_discovery_state_ignores_corrupt_file(tmp_path):
+    path = tmp_path / "discovery.json"
+    path.write_text("not json")
+    state = DiscoveryState(str(path))
+    assert len(state) == 0
+    state.record("topic", "digest")
+    state.save()
+    assert DiscoveryState(str(path)).is_current("topic", "digest")
+    assert [p.name for p in path.parent.iterdir()] == ["discovery.json"]
+
+
+def test_discovery_republished_when_home_assistant_comes_online():
+    """Test that a fresh HA birth message republishes every config."""
+    config = _discovery_config(ha_discovery_spread=0, ha_discovery_rate=0)
+    client = _confirming_client()
+    publisher = DiscoveryPublisher(client, config)
+    per_system = len(discovery_messages(config, "12345"))
+    publisher.publish(config.system_ids)
+    client.publish.reset_mock()
+
+    publisher.start()
+    try:
+        handler = client.subscribe.call_args.args[1]
+        assert client.subscribe.call_args.args[0] == "homeassistant/status"
+
+        # Retained or offline statuses do not trigger anything
+        handler(MagicMock(retain=True, payload=b"online"))
+        handler(MagicMock(retain=False, payload=b"offline"))
+        time.sleep(0.1)
+        client.publish.assert_not_called()
+
+        handler(MagicMock(retain=False, payload=b"online"))
+        deadline = time.monotonic() + 2
+        while client.publish.call_count < 2 * per_system and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert client.publish.call_count == 2 * per_system
+    finally:
+        publisher.stop()
+
+
+def test_discovery_publisher_rate_limited():
+    """Test that publishes go through the configured rate limiter."""
+    config = _discovery_config(ha_discovery_rate=10)
+    client = _confirming_client()
+    publisher = DiscoveryPublisher(client, config)
+    publisher.limiter = MagicMock()
+
+    published = publisher.publish(["12345"])
+
+    assert publisher.limiter.acquire.call_count == published
+
+
+def test_discovery_update_removes_entities_of_removed_systems(tmp_path):
+    """Test that a reload clears the configs of removed systems and publishes new ones."""
+    config = _discovery_config()
+    client = _confirming_client()
+    state = DiscoveryState(str(tmp_path / "discovery.json"))
+    publisher = DiscoveryPublisher(client, config, state)
+    publisher.publish(config.system_ids)
+    removed_topics = set(discovery_messages(config, "67890"))
+    client.publish.reset_mock()
+
+    assert publisher.update(_discovery_config(system_ids=["12345", "11111"])) == len(removed_topics)
+
+    cleared = {call.kwargs["topic"] for call in client.publish.call_args_list if call.args[0] == b""}
+    assert cleared == removed_topics
+    published = {call.kwargs["topic"] for call in client.publish.call_args_list if call.args[0] != b""}
+    assert published == set(discovery_messages(config, "11111"))
+    assert not removed_topics & state.topics()
+
+
+def test_discovery_republish_waits_for_update(tmp_path):
+    """Test that a Home Assistant birth during a reload republishes the new configuration only."""
+    config = _discovery_config(ha_discovery_spread=0, ha_discovery_rate=0)
+    client = _confirming_client()
+    publisher = DiscoveryPublisher(client, config, DiscoveryState(str(tmp_path / "discovery.json")))
+    publisher.publish(config.system_ids)
+    publisher.start()
+    handler = client.subscribe.call_args.args[1]
+    calls = []
+    confirm = client.publish.side_effect
+
+    def publish(data, topic=None, **kwargs):
+        calls.append((threading.current_thread().name, topic))
+        if data == b"" and len(calls) == 1:
+            # Home Assistant restarts while removed entities are being cleared
+            handler(MagicMock(retain=False, payload=b"online"))
+            time.sleep(0.1)
+        return confirm(data, topic=topic, **kwargs)
+    client.publish.side_effect = publish
+
+    try:
+        publisher.update(_discovery_config(system_ids=["12345"], ha_discovery_spread=0, ha_discovery_rate=0))
+        new_topics = set(discovery_messages(config, "12345"))
+        deadline = time.monotonic() + 2
+        while sum(name == "discovery-birth" for name, _ in calls) < len(new_topics) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        publisher.stop()
+
+    names = [name for name, _ in calls]
+    first_republish = names.index("discovery-birth")
+    assert "discovery-birth" not in names[:first_republish] and threading.current_thread().name not in names[first_republish:]
+    assert {topic for name, topic in calls if name == "discovery-birth"} == new_topics
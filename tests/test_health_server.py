@@ -0,0 +1,123 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from unittest.mock import MagicMock
+import pytest
+from hyponcloud2mqtt.health_server import HealthContext, HealthHTTPHandler, HealthServer
+
+
+def make_context(clock, connected=True, **kwargs):
+    mqtt_client = MagicMock()
+    mqtt_client.connected = connected
+    mqtt_client.dry_run = False
+    return HealthContext(mqtt_client, ["1", "2"], clock=clock, **kwargs)
+
+
+def test_readyz_not_ready_before_first_fetch(clock):
+    context = make_context(clock)
+
+    status, body = context.snapshot("readyz")
+
+    assert status == 503
+    assert json.loads(body)["reasons"] == ["no_fresh_data"]
+
+
+def test_readyz_reports_system_freshness(clock):
+    context = make_context(clock, max_staleness=60, cache_ttl=0)
+    context.auth = MagicMock(token_issued_at=900.0)
+    context.record_fetch("1", True)
+    context.record_fetch("2", False)
+    clock.now += 10
+
+    status, body = context.snapshot("readyz")
+    snapshot = json.loads(body)
+
+    assert status == 200
+    assert snapshot["token_age"] == 110.0
+    assert snapshot["systems"]["1"] == {"fresh": True, "last_success_age": 10.0, "last_outcome": "success"}
+    assert snapshot["systems"]["2"] == {"fresh": False, "last_success_age": None, "last_outcome": "failure"}
+
+    clock.now += 60
+    status, body = context.snapshot("readyz")
+    assert status == 503
+
+
+def test_readyz_not_ready_when_mqtt_disconnected(clock):
+    context = make_context(clock, connected=False)
+    context.record_fetch("1", True)
+
+    status, body = context.snapshot("readyz")
+
+    assert status == 503
+    assert json.loads(body)["reasons"] == ["mqtt_disconnected"]
+
+
+def test_livez_detects_stuck_loop(clock):
+    context = make_context(clock, heartbeat_timeout=300, cache_ttl=0)
+    assert context.snapshot("livez")[0] == 200
+
+    clock.now += 301
+    assert context.snapshot("livez")[0] == 503
+
+    context.heartbeat()
+    assert context.snapshot("livez")[0] == 200
+
+
+def test_snapshot_is_cached(clock):
+    context = make_context(clock, cache_ttl=1.0)
+    first = context.snapshot("readyz")
+    context.record_fetch("1", True)
+
+    assert context.snapshot("readyz") == first
+    clock.now += 1
+    assert context.snapshot("readyz")[0] == 200
+
+
+@pytest.fixture
+def server(clock):
+    context = make_context(clock)
+    context.record_fetch("1", True)
+    server = HealthServer(('127.0.0.1', 0), HealthHTTPHandler, context)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_history_endpoint(server):
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(f"{base}/history?system_id=1", timeout=2)
+    assert e.value.code == 404
+
+    history = server.context.history = MagicMock()
+    history.query.return_value = ("5m", [{"ts": 300, "power_pv": {"avg": 1.0}}])
+
+    with urllib.request.urlopen(
+            f"{base}/history?system_id=1&start=0&end=600&resolution=5m&fields=power_pv", timeout=2) as response:
+        body = json.loads(response.read())
+    assert body == {
+        "system_id": "1", "start": 0.0, "end": 600.0, "resolution": "5m",
+        "points": [{"ts": 300, "power_pv": {"avg": 1.0}}]}
+    history.query.assert_called_once_with("1", 0.0, 600.0, "5m", ["power_pv"])
+
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(f"{base}/history?system_id=unknown", timeout=2)
+    assert e.value.code == 404
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(f"{base}/history?system_id=1&start=yesterday", timeout=2)
+    assert e.value.code == 400
+
+
+def test_server_serves_probes(server):
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with urllib.request.urlopen(f"{base}/readyz", timeout=2) as response:
+        assert json.loads(response.read())["status"] == "ready"
+    with urllib.request.urlopen(f"{base}/livez", timeout=2) as response:
+        assert json.loads(response.read())["status"] == "alive"
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(f"{base}/unknown", timeout=2)
+    assert e.value.code == 404
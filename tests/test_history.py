@@ -0,0 +1,81 @@
+import pytest
+from hyponcloud2mqtt.history import History
+
+
+@pytest.fixture
+def clock(clock):
+    clock.now = 1_000_000.0
+    return clock
+
+
+def make_history(tmp_path, clock, **kwargs):
+    return History(str(tmp_path / "history.db"), maintenance_interval=0, clock=clock, **kwargs)
+
+
+def test_history_returns_raw_readings(tmp_path, clock):
+    history = make_history(tmp_path, clock)
+    history.record("1", {"power_pv": 100, "status": "ok"})
+    clock.now += 60
+    history.record("1", {"power_pv": 200, "status": "ok"})
+    history.record("2", {"power_pv": 300})
+
+    resolution, points = history.query("1", clock.now - 3600, clock.now + 1)
+
+    assert resolution == "raw"
+    assert points == [
+        {"ts": 1_000_000.0, "power_pv": 100, "status": "ok"},
+        {"ts": 1_000_060.0, "power_pv": 200, "status": "ok"}]
+    assert history.query("1", 0, clock.now + 1, "raw", ["status"])[1][0] == {"ts": 1_000_000.0, "status": "ok"}
+
+
+def test_history_rolls_up_completed_buckets(tmp_path, clock):
+    clock.now = 1_000_200.0  # Bucket 999_900 - 1_000_200 just completed
+    history = make_history(tmp_path, clock)
+    for power in (10, 30, 20):
+        history.record("1", {"power_pv": power, "online": True, "status": "ok"})
+        clock.now += 60
+    # The 5 minute bucket is complete once the clock reaches its end
+    assert history.query("1", 0, clock.now, "5m")[1] == []
+    clock.now = 1_000_500.0
+    history.maintain()
+
+    resolution, points = history.query("1", 0, clock.now, "5m")
+
+    assert resolution == "5m"
+    assert points == [{"ts": 1_000_200, "power_pv": {"count": 3, "avg": 20.0, "min": 10, "max": 30, "last": 20}}]
+
+
+def test_history_hourly_rollups_and_retention(tmp_path, clock):
+    clock.now = 3600 * 1000.0
+    history = make_history(tmp_path, clock, raw_retention=300, rollup_retention=4000, hourly_retention=7200)
+    # One reading every 5 minutes over an hour
+    for index in range(12):
+        history.record("1", {"power_pv": index})
+        clock.now += 300
+    history.maintain()
+
+    _, hourly = history.query("1", 0, clock.now, "1h")
+    assert hourly == [{"ts": 3_600_000, "power_pv": {"count": 12, "avg": 5.5, "min": 0, "max": 11, "last": 11}}]
+    assert len(history.query("1", 0, clock.now, "5m")[1]) == 12
+    assert len(history.query("1", 0, clock.now, "raw")[1]) == 1
+
+    # The finest resolution still kept at start is picked automatically
+    assert history.resolution_for(clock.now - 60) == "raw"
+    assert history.resolution_for(clock.now - 1800) == "5m"
+    assert history.resolution_for(clock.now - 5000) == "1h"
+
+    clock.now += 7200
+    history.maintain()
+    assert history.query("1", 0, clock.now, "1h")[1] == []
+
+
+def test_history_survives_restart(tmp_path, clock):
+    make_history(tmp_path, clock).record("1", {"power_pv": 1})
+    history = make_history(tmp_path, clock)
+    assert len(history.query("1", 0, clock.now + 1, "raw")[1]) == 1
+
+
+def test_history_rejects_unknown_resolution(tmp_path, clock):
+    history = make_history(tmp_path, clock)
+    with pytest.raises(ValueError, match="resolution must be one of"):
+        history.query("1", 0, 1, "1d")
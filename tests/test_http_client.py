@@ -9,7 +9,7 @@ def test_fetch_data_success():
     mock_session = MagicMock()
     mock_response = MagicMock()
     mock_response.status_code = 200
-    mock_response.json.return_value = {"code": 20000, "data": {"power_pv": 100}}
+    mock_response.content = b'{"code": 20000, "data": {"power_pv": 100}}'
     mock_session.get.return_value = mock_response
 
     client = HttpClient("http://api.example.com/monitor", mock_session)
@@ -25,8 +25,7 @@ def test_fetch_data_expired_token():
     mock_session = MagicMock()
     mock_response = MagicMock()
     mock_response.status_code = 200
-    mock_response.json.return_value = {
-        "code": 50008, "message": "User authentication failed"}
+    mock_response.content = b'{"code": 50008, "message": "User authentication failed"}'
     mock_session.get.return_value = mock_response
 
     client = HttpClient("http://api.example.com/monitor", mock_session)
@@ -40,7 +39,7 @@ def test_fetch_data_server_error_code():
     mock_session = MagicMock()
     mock_response = MagicMock()
     mock_response.status_code = 200
-    mock_response.json.return_value = {"code": 50001, "message": "Server error"}
+    mock_response.content = b'{"code": 50001, "message": "Server error"}'
     mock_session.get.return_value = mock_response
 
     client = HttpClient("http://api.example.com/monitor", mock_session)
@@ -70,8 +69,7 @@ def test_fetch_data_invalid_json():
     mock_session = MagicMock()
     mock_response = MagicMock()
     mock_response.status_code = 200
-    # Simulating json() raising ValueError which is common when parsing fails
-    mock_response.json.side_effect = ValueError("No JSON object could be decoded")
+    mock_response.content = b"<html>Bad gateway</html>"
     mock_session.get.return_value = mock_response
 
     client = HttpClient("http://api.example.com/monitor", mock_session)
@@ -85,7 +83,7 @@ def test_fetch_data_not_json_dict():
     mock_session = MagicMock()
     mock_response = MagicMock()
     mock_response.status_code = 200
-    mock_response.json.return_value = ["list", "instead", "of", "dict"]
+    mock_response.content = b'["list", "instead", "of", "dict"]'
     mock_session.get.return_value = mock_response
 
     client = HttpClient("http://api.example.com/monitor", mock_session)
@@ -0,0 +1,83 @@
+import threading
+import urllib.request
+from unittest.mock import MagicMock
+import pytest
+from hyponcloud2mqtt import metrics
+from hyponcloud2mqtt.health_server import HealthContext, HealthHTTPHandler, HealthServer
+from hyponcloud2mqtt.http_client import AuthenticationError, HttpClient
+from hyponcloud2mqtt.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_registry_renders_counters_and_gauges():
+    registry = Registry()
+    counter = Counter("requests_total", "Requests", registry=registry)
+    gauge = Gauge("lag_seconds", "Lag", registry=registry)
+    counter.inc(endpoint="monitor")
+    counter.inc(2, endpoint="monitor")
+    gauge.set(1.5, system_id='a"b')
+
+    text = registry.render()
+
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{endpoint="monitor"} 3.0' in text
+    assert 'lag_seconds{system_id="a\\"b"} 1.5' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = Histogram("duration_seconds", "Duration", buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, endpoint="status")
+
+    text = registry.render()
+
+    assert 'duration_seconds_bucket{endpoint="status",le="0.1"} 1' in text
+    assert 'duration_seconds_bucket{endpoint="status",le="1.0"} 2' in text
+    assert 'duration_seconds_bucket{endpoint="status",le="+Inf"} 3' in text
+    assert 'duration_seconds_count{endpoint="status"} 3' in text
+    assert 'duration_seconds_sum{endpoint="status"} 5.55' in text
+
+
+def test_gauge_function_is_evaluated_at_scrape():
+    registry = Registry()
+    gauge = Gauge("inflight", "In flight", registry=registry)
+    depth = [3]
+    gauge.set_function(lambda: depth[0])
+    depth[0] = 7
+
+    assert "inflight 7.0" in registry.render()
+
+
+def test_http_client_records_request_results():
+    session = MagicMock()
+    session.get.side_effect = [
+        MagicMock(content=b'{"code": 20000, "data": {}}'), MagicMock(content=b'{"code": 50008}')]
+    client = HttpClient("http://api.example.com/plant/1/production2", session)
+    success = metrics.HTTP_REQUESTS.value(endpoint="production2", result="success")
+    expired = metrics.HTTP_REQUESTS.value(endpoint="production2", result="auth_expired")
+    observed = metrics.HTTP_REQUEST_DURATION.count(endpoint="production2")
+
+    client.fetch_data()
+    with pytest.raises(AuthenticationError):
+        client.fetch_data()
+
+    assert metrics.HTTP_REQUESTS.value(endpoint="production2", result="success") == success + 1
+    assert metrics.HTTP_REQUESTS.value(endpoint="production2", result="auth_expired") == expired + 1
+    assert metrics.HTTP_REQUEST_DURATION.count(endpoint="production2") == observed + 2
+
+
+def test_health_server_serves_metrics():
+    server = HealthServer(('127.0.0.1', 0), HealthHTTPHandler, HealthContext(MagicMock()))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=2) as response:
+            body = response.read().decode()
+            content_type = response.headers["Content-Type"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert content_type.startswith("text/plain")
+    assert "# TYPE hypon_http_request_duration_seconds histogram" in body
@@ -50,3 +50,139 @@ def test_publish_default_retain():
     mock_paho_client.publish.assert_called_once()
     _, kwargs = mock_paho_client.publish.call_args
     assert kwargs['retain'] is False
+
+
+def make_pipelined_client(max_inflight=100):
+    client = MqttClient(
+        broker="localhost",
+        port=1883,
+        topic="test/topic",
+        availability_topic="test/status",
+        max_inflight=max_inflight,
+        publish_timeout=0.1
+    )
+    client.client = MagicMock()
+    mids = iter(range(1, 1000))
+
+    def paho_publish(topic, payload, retain=False):
+        return MagicMock(rc=0, mid=next(mids))
+
+    client.client.publish.side_effect = paho_publish
+    return client
+
+
+def test_publish_does_not_wait_for_ack():
+    """Test that publish returns before the message is written."""
+    client = make_pipelined_client()
+
+    assert client.publish({"key": "value"}) is True
+    assert client.inflight == 1
+
+    client._on_publish(None, None, 1)
+    assert client.inflight == 0
+    assert client.flush(timeout=0) is True
+
+
+def test_publish_window_bounds_inflight_messages():
+    """Test that publishing blocks, then fails, when the window is full."""
+    client = make_pipelined_client(max_inflight=2)
+    callback = MagicMock()
+
+    assert client.publish({"n": 1}) is True
+    assert client.publish({"n": 2}) is True
+    assert client.publish({"n": 3}, topic="full/topic", callback=callback) is False
+    callback.assert_called_once_with("full/topic", False)
+    assert client.client.publish.call_count == 2
+
+    # An acknowledgement frees a slot
+    client._on_publish(None, None, 1)
+    assert client.publish({"n": 3}) is True
+
+
+def test_publish_callback_and_latency_stats():
+    """Test completion callbacks and per-topic latency tracking."""
+    client = make_pipelined_client()
+    callback = MagicMock()
+
+    client.publish({"key": "value"}, topic="a/b", callback=callback)
+    client._on_publish(None, None, 1)
+
+    callback.assert_called_once_with("a/b", True)
+    stats = client.publish_stats()["a/b"]
+    assert stats["count"] == 1
+    assert stats["avg_latency"] >= 0
+    assert stats["max_latency"] == stats["last_latency"]
+
+
+def test_publish_acknowledged_during_publish_call():
+    """Test a message written synchronously, before publish() registers it."""
+    client = make_pipelined_client()
+    callback = MagicMock()
+
+    def paho_publish(topic, payload, retain=False):
+        client._on_publish(None, None, 7)
+        return MagicMock(rc=0, mid=7)
+
+    client.client.publish.side_effect = paho_publish
+
+    assert client.publish({"key": "value"}, topic="a/b", callback=callback) is True
+    callback.assert_called_once_with("a/b", True)
+    assert client.inflight == 0
+
+
+def test_publish_failure_releases_slot():
+    """Test that a message rejected by paho does not hold a slot."""
+    client = make_pipelined_client(max_inflight=1)
+    client.client.publish.side_effect = None
+    client.client.publish.return_value = MagicMock(rc=4, mid=1)  # MQTT_ERR_NO_CONN
+
+    assert client.publish({"key": "value"}) is False
+    assert client.publish({"key": "value"}) is False
+    assert client.inflight == 0
+    assert client.client.publish.call_count == 2
+
+
+def test_disconnect_fails_inflight_messages():
+    """Test that a lost connection fails pending messages and frees the window."""
+    client = make_pipelined_client(max_inflight=1)
+    callback = MagicMock()
+
+    client.publish({"key": "value"}, topic="a/b", callback=callback)
+    client._on_disconnect(None, None, None, 7)
+
+    callback.assert_called_once_with("a/b", False)
+    assert client.publish({"key": "value"}) is True
+
+
+def test_reconfigure_fails_inflight_messages():
+    """Test that a reload during a broker outage does not leak window slots."""
+    client = make_pipelined_client(max_inflight=1)
+    callback = MagicMock()
+    client.publish({"key": "value"}, topic="a/b", callback=callback)
+    client._early_acks.add(99)
+
+    client.reconfigure("broker.local", 1883, "test/status")
+
+    callback.assert_called_once_with("a/b", False)
+    assert client.inflight == 0
+    assert not client._early_acks
+    assert client._window.acquire(timeout=0)
+
+
+def test_subscriptions_are_renewed_on_connect():
+    """Test that handlers receive their messages and survive reconnections."""
+    client = make_pipelined_client()
+    handler = MagicMock()
+
+    client.subscribe("homeassistant/status", handler)
+    client.client.subscribe.assert_not_called()
+
+    client._on_connect(None, None, None, 0)
+    client._on_connect(None, None, None, 0)
+    assert client.client.subscribe.call_count == 2
+    client.client.subscribe.assert_called_with("homeassistant/status")
+
+    message = MagicMock(topic="homeassistant/status", payload=b"online")
+    client._on_message(None, None, message)
+    client._on_message(None, None, MagicMock(topic="other/topic"))
+    handler.assert_called_once_with(message)
@@ -0,0 +1,47 @@
+from hyponcloud2mqtt.outbox import Outbox
+
+
+def test_outbox_keeps_messages_in_order(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    outbox.put("hypon/1", {"power_pv": 1})
+    outbox.put("hypon/2", {"power_pv": 2})
+
+    messages = outbox.peek(10)
+
+    assert [(m.topic, m.data) for m in messages] == [
+        ("hypon/1", {"power_pv": 1}), ("hypon/2", {"power_pv": 2})]
+    outbox.remove(messages[0].id)
+    assert len(outbox) == 1
+
+
+def test_outbox_drops_oldest_beyond_max_messages(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"), max_messages=2)
+    for value in range(3):
+        outbox.put("hypon/1", {"power_pv": value})
+
+    assert [m.data["power_pv"] for m in outbox.peek(10)] == [1, 2]
+
+
+def test_outbox_discards_expired_messages(tmp_path, clock):
+    outbox = Outbox(str(tmp_path / "outbox.db"), max_age=60, clock=clock)
+    outbox.put("hypon/1", {"power_pv": 1})
+    clock.now += 30
+    outbox.put("hypon/1", {"power_pv": 2})
+    clock.now += 40
+
+    messages = outbox.peek(10)
+
+    assert [m.data["power_pv"] for m in messages] == [2]
+    assert messages[0].created == 1030.0
+
+
+def test_outbox_survives_restart(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    outbox = Outbox(path)
+    outbox.put("hypon/1", {"power_pv": 1}, retain=True)
+    outbox.close()
+
+    messages = Outbox(path).peek(10)
+
+    assert len(messages) == 1
+    assert messages[0].retain is True
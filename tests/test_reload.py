@@ -0,0 +1,167 @@
+import dataclasses
+import os
+from unittest.mock import MagicMock, patch
+import pytest
+from hyponcloud2mqtt.config import Config
+from hyponcloud2mqtt.main import Daemon
+from hyponcloud2mqtt.reload import (
+    DISCOVERY_FIELDS, FETCHER_FIELDS, LIVE_FIELDS, MQTT_FIELDS, PUBLISH_FIELDS, RESTART_FIELDS,
+    SCHEDULE_FIELDS, SESSION_FIELDS, ConfigWatcher, changed_fields, reloadable)
+
+CONFIG_YAML = """
+http_url: "http://mock.url"
+system_ids: [{system_ids}]
+http_interval: {interval}
+mqtt_broker: "{broker}"
+mqtt_port: 1883
+mqtt_topic: "hypon"
+ha_discovery_enabled: false
+health_port: {health_port}
+"""
+
+
+def write_config(path, system_ids=("1", "2"), interval=60, broker="localhost", health_port=8080):
+    with open(path, "w") as f:
+        f.write(CONFIG_YAML.format(
+            system_ids=", ".join(f'"{system_id}"' for system_id in system_ids),
+            interval=interval, broker=broker, health_port=health_port))
+
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch):
+    for name in ("SYSTEM_IDS", "HTTP_URL", "HTTP_INTERVAL", "MQTT_BROKER", "MQTT_TOPIC", "HEALTH_PORT"):
+        monkeypatch.delenv(name, raising=False)
+    path = str(tmp_path / "config.yaml")
+    write_config(path)
+    return path
+
+
+@pytest.fixture
+def daemon(config_path):
+    config = Config.load(config_path)
+    with patch("signal.signal"):
+        daemon = Daemon(config, config_path)
+    daemon.watcher = ConfigWatcher(config_path)
+    daemon.pool = MagicMock(max_workers=3)
+    daemon.auth = MagicMock()
+    daemon.fetchers = daemon._create_fetchers(config)
+    daemon.scheduler = daemon._create_scheduler(config)
+    return daemon
+
+
+def test_every_field_has_a_reload_strategy():
+    """Test that new config fields are classified, so reloads do not miss them."""
+    classified = (
+        MQTT_FIELDS | SESSION_FIELDS | FETCHER_FIELDS | SCHEDULE_FIELDS | DISCOVERY_FIELDS
+        | PUBLISH_FIELDS | LIVE_FIELDS)
+    names = {field.name for field in dataclasses.fields(Config)}
+    assert names == classified | RESTART_FIELDS
+    assert not classified & RESTART_FIELDS
+
+
+def test_reloadable_keeps_restart_fields(config_path):
+    old = Config.load(config_path)
+    new = dataclasses.replace(old, health_port=9090, system_ids=["1", "3"])
+
+    applied, changed = reloadable(old, new)
+
+    assert applied.health_port == 8080
+    assert applied.system_ids == ["1", "3"]
+    assert changed == {"system_ids"}
+    assert changed_fields(old, old) == set()
+
+
+def test_watcher_detects_file_changes(config_path, clock):
+    watcher = ConfigWatcher(config_path, interval=10, clock=clock)
+    assert not watcher.pending()
+
+    write_config(config_path, system_ids=("1", "2", "3"))
+    assert not watcher.pending()
+    clock.now += 10
+    assert watcher.pending()
+
+    watcher.acknowledge()
+    clock.now += 10
+    assert not watcher.pending()
+
+
+def test_watcher_without_interval_waits_for_request(config_path):
+    watcher = ConfigWatcher(config_path)
+    write_config(config_path, system_ids=("3",))
+    os.utime(config_path, ns=(0, 0))
+    assert not watcher.pending()
+
+    watcher.request()
+    assert watcher.pending()
+    watcher.acknowledge()
+    assert not watcher.pending()
+
+
+def test_reload_adds_and_removes_systems_without_login(daemon, config_path):
+    """Test that changing system_ids keeps the session and the other fetchers."""
+    kept = daemon.fetchers["1"]
+    daemon.scheduler.due()
+    write_config(config_path, system_ids=("1", "3"))
+
+    with patch("hyponcloud2mqtt.main.AuthSession") as auth_session:
+        config = daemon._reload_config(daemon.config, MagicMock())
+
+    auth_session.assert_not_called()
+    assert config.system_ids == ["1", "3"]
+    assert daemon.config is config
+    assert list(daemon.fetchers) == ["1", "3"]
+    assert daemon.fetchers["1"] is kept
+    assert daemon.scheduler.due() == ["3"]
+
+
+def test_reload_logs_in_again_when_api_settings_change(daemon, config_path):
+    previous = daemon.auth
+    with open(config_path, "a") as f:
+        f.write('api_username: "user"\napi_password: "secret"\n')
+
+    with patch("hyponcloud2mqtt.main.AuthSession") as auth_session:
+        daemon._reload_config(daemon.config, MagicMock())
+
+    auth_session.assert_called_once()
+    auth_session.return_value.try_login.assert_called_once()
+    assert daemon.auth is auth_session.return_value
+    previous.close.assert_called_once()
+    assert all(fetcher.auth is daemon.auth for fetcher in daemon.fetchers.values())
+
+
+def test_reload_reconnects_only_on_mqtt_changes(daemon, config_path):
+    mqtt_client = MagicMock()
+    write_config(config_path, interval=30)
+    daemon._reload_config(daemon.config, mqtt_client)
+    mqtt_client.reconfigure.assert_not_called()
+    assert daemon.scheduler.interval == 30
+
+    write_config(config_path, interval=30, broker="broker.local")
+    daemon._reload_config(daemon.config, mqtt_client)
+    mqtt_client.reconfigure.assert_called_once()
+    assert mqtt_client.reconfigure.call_args.args[0] == "broker.local"
+
+
+def test_reload_keeps_running_config_when_invalid(daemon, config_path):
+    running = daemon.config
+    write_config(config_path, interval=-1)
+
+    assert daemon._reload_config(running, MagicMock()) is running
+    assert daemon.config is running
+
+
+def test_reload_keeps_running_session_when_login_rejected(daemon, config_path):
+    """Test that rejected credentials do not stop the daemon nor replace its session."""
+    running, previous, fetchers = daemon.config, daemon.auth, daemon.fetchers
+    with open(config_path, "a") as f:
+        f.write('api_username: "user"\napi_password: "wrong"\n')
+
+    with patch("hyponcloud2mqtt.main.AuthSession") as auth_session:
+        auth_session.return_value.try_login.return_value = False
+        assert daemon._reload_config(running, MagicMock()) is running
+
+    auth_session.return_value.close.assert_called_once()
+    previous.close.assert_not_called()
+    assert daemon.auth is previous
+    assert daemon.fetchers is fetchers
+    assert daemon.config is running
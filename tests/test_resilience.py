@@ -0,0 +1,156 @@
+import pytest
+import requests
+from unittest.mock import MagicMock
+from hyponcloud2mqtt.http_client import AuthenticationError, HttpClient
+from hyponcloud2mqtt.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers, RateLimiter
+
+
+def test_rate_limiter_allows_burst_then_spaces_requests(clock):
+    limiter = RateLimiter(2, burst=2, clock=clock)
+
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == 0
+    # Concurrent callers queue one rate interval apart
+    assert limiter.reserve() == 0.5
+    assert limiter.reserve() == 1.0
+
+
+def test_rate_limiter_refills_over_time(clock):
+    sleeps = []
+    limiter = RateLimiter(1, clock=clock, sleep=sleeps.append)
+    assert limiter.burst == 1
+
+    limiter.acquire()
+    limiter.acquire()
+    assert sleeps == [1.0]
+
+    clock.now += 10
+    limiter.acquire()
+    assert sleeps == [1.0]
+
+
+def test_circuit_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("status", failure_threshold=3, reset_timeout=60, clock=clock)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_circuit_breaker_probes_when_half_open(clock):
+    breaker = CircuitBreaker("status", failure_threshold=1, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+
+    clock.now += 60
+    # A single probe goes through
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+    # A failed probe opens the circuit again for a full timeout
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    clock.now += 30
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_circuit_breakers_share_one_breaker_per_endpoint():
+    breakers = CircuitBreakers(failure_threshold=2)
+    assert breakers.get("status") is breakers.get("status")
+    assert breakers.get("status") is not breakers.get("monitor")
+    assert CircuitBreakers(failure_threshold=0).get("status") is None
+
+
+def test_http_client_skips_requests_while_circuit_open():
+    session = MagicMock()
+    session.get.side_effect = requests.ConnectionError("down")
+    breakers = CircuitBreakers(failure_threshold=2, reset_timeout=60)
+    clients = [
+        HttpClient(f"http://api.example.com/plant/{system_id}/status", session, breakers=breakers)
+        for system_id in range(5)]
+
+    assert all(client.fetch_data() is None for client in clients)
+
+    # Systems share the breaker of the endpoint
+    assert session.get.call_count == 2
+
+
+def test_http_client_expired_token_is_not_a_failure():
+    session = MagicMock()
+    session.get.return_value.content = b'{"code": 50008}'
+    breakers = CircuitBreakers(failure_threshold=1)
+    client = HttpClient("http://api.example.com/plant/1/status", session, breakers=breakers)
+
+    for _ in range(3):
+        with pytest.raises(AuthenticationError):
+            client.fetch_data()
+
+    assert breakers.get("status").state == CLOSED
+
+
+def test_http_client_plant_errors_are_not_failures():
+    """Test that plants rejected by the API do not open the breaker of every system."""
+    session = MagicMock()
+    session.get.return_value.content = b'{"code": 40001, "message": "Plant not found"}'
+    not_found = MagicMock(status_code=404)
+    not_found.raise_for_status.side_effect = requests.HTTPError("404 Not Found", response=not_found)
+    breakers = CircuitBreakers(failure_threshold=2)
+    clients = [
+        HttpClient(f"http://api.example.com/plant/{system_id}/status", session, breakers=breakers)
+        for system_id in range(5)]
+
+    assert all(client.fetch_data() is None for client in clients)
+    session.get.return_value = not_found
+    assert all(client.fetch_data() is None for client in clients)
+
+    assert breakers.get("status").state == CLOSED
+    assert session.get.call_count == 10
+
+
+def test_http_client_server_errors_are_failures():
+    session = MagicMock()
+    response = MagicMock(status_code=503)
+    response.raise_for_status.side_effect = requests.HTTPError("503 Service Unavailable", response=response)
+    session.get.return_value = response
+    breakers = CircuitBreakers(failure_threshold=2)
+    client = HttpClient("http://api.example.com/plant/1/status", session, breakers=breakers)
+
+    client.fetch_data()
+    client.fetch_data()
+
+    assert breakers.get("status").state == OPEN
+
+
+def test_http_client_neutral_probe_keeps_circuit_half_open():
+    """Test that an expired token or a plant error on a probe neither closes nor reopens the circuit."""
+    session = MagicMock()
+    session.get.return_value.content = b'{"code": 50008}'
+    breakers = CircuitBreakers(failure_threshold=1, reset_timeout=0)
+    breaker = breakers.get("status")
+    breaker.record_failure()
+    client = HttpClient("http://api.example.com/plant/1/status", session, breakers=breakers)
+
+    with pytest.raises(AuthenticationError):
+        client.fetch_data()
+    assert breaker.state == HALF_OPEN
+
+    session.get.return_value.content = b'{"code": 40001}'
+    assert client.fetch_data() is None
+    assert breaker.state == HALF_OPEN
+
+    # The probe slot was released, the next request probes again
+    session.get.return_value.content = b'{"code": 20000, "data": {}}'
+    assert client.fetch_data() is not None
+    assert breaker.state == CLOSED
@@ -0,0 +1,129 @@
+import pytest
+from hyponcloud2mqtt.scheduler import AdaptivePolling, Scheduler
+
+
+def test_all_systems_due_immediately_without_phase_spread(clock):
+    scheduler = Scheduler(60, ["a", "b"], clock=clock)
+
+    assert scheduler.due() == ["a", "b"]
+    assert scheduler.due() == []
+    assert scheduler.next_deadline() == 1060.0
+
+
+def test_fixed_rate_does_not_drift_with_fetch_duration(clock):
+    scheduler = Scheduler(60, ["a"], clock=clock)
+
+    for _ in range(100):
+        assert scheduler.due() == ["a"]
+        # Each fetch lasts 5 seconds, then the loop sleeps until the deadline
+        clock.now += 5
+        clock.now = scheduler.next_deadline()
+
+    assert scheduler.next_deadline() == 1000.0 + 100 * 60
+
+
+def test_phase_spread_offsets_systems_over_interval(clock):
+    scheduler = Scheduler(60, ["a", "b", "c"], phase_spread=True, clock=clock)
+
+    assert scheduler.due() == ["a"]
+    clock.now += 20
+    assert scheduler.due() == ["b"]
+    clock.now += 20
+    assert scheduler.due() == ["c"]
+    assert scheduler.next_deadline() == 1060.0
+
+
+def test_jitter_delays_deadline_without_accumulating(clock):
+    scheduler = Scheduler(60, ["a"], jitter=10, clock=clock)
+
+    for _ in range(50):
+        deadline = scheduler.next_deadline()
+        clock.now = deadline
+        assert scheduler.due() == ["a"]
+        assert 0 <= scheduler.next_deadline() - deadline <= 70
+
+    # Base timeline is untouched by jitter: 50 runs, 50 intervals
+    assert 1000.0 + 50 * 60 <= scheduler.next_deadline() <= 1000.0 + 50 * 60 + 10
+
+
+def test_overrun_skip_jumps_to_next_future_deadline(clock):
+    scheduler = Scheduler(60, ["a"], clock=clock)
+    scheduler.due()
+
+    clock.now = 1000.0 + 150  # Missed the deadlines at 1060 and 1120
+    assert scheduler.due() == ["a"]
+    assert scheduler.lag["a"] == pytest.approx(90)
+    assert scheduler.next_deadline() == 1180.0
+
+
+def test_overrun_catch_up_runs_missed_cycles(clock):
+    scheduler = Scheduler(60, ["a"], overrun="catch_up", clock=clock)
+    scheduler.due()
+
+    clock.now = 1000.0 + 150
+    assert scheduler.due() == ["a"]
+    assert scheduler.due() == ["a"]
+    assert scheduler.due() == []
+    assert scheduler.next_deadline() == 1180.0
+
+
+def test_unknown_overrun_policy():
+    with pytest.raises(ValueError):
+        Scheduler(60, ["a"], overrun="later")
+
+
+def test_set_interval_reschedules_from_last_run(clock):
+    scheduler = Scheduler(60, ["a", "b"], clock=clock)
+    scheduler.due()
+
+    scheduler.set_interval("a", 600)
+    assert scheduler.interval_of("a") == 600
+    clock.now = 1060.0
+    assert scheduler.due() == ["b"]
+    clock.now = 1600.0
+    assert "a" in scheduler.due()
+    scheduler.set_interval("b", 600)
+    assert scheduler.next_deadline() == 2200.0
+
+
+def test_set_shorter_interval_makes_system_due_at_once(clock):
+    scheduler = Scheduler(600, ["a"], clock=clock)
+    scheduler.due()
+
+    clock.now = 1100.0
+    scheduler.set_interval("a", 60)
+    assert scheduler.due() == ["a"]
+    assert scheduler.next_deadline() == 1160.0
+
+
+def test_added_system_due_at_once_and_removed_system_forgotten(clock):
+    scheduler = Scheduler(60, ["a"], clock=clock)
+    scheduler.due()
+
+    clock.now = 1010.0
+    scheduler.add("b")
+    scheduler.remove("a")
+    assert scheduler.due() == ["b"]
+    assert scheduler.next_deadline() == 1070.0
+
+    scheduler.remove("b")
+    assert scheduler.next_deadline() == 1070.0
+
+
+def test_adaptive_polling_backs_off_while_idle():
+    adaptive = AdaptivePolling(60, 300)
+
+    assert adaptive.update("a", {"power_pv": 1200}) is None
+    assert adaptive.update("a", {"power_pv": 0}) == 120
+    assert adaptive.update("a", {"power_pv": 0}) == 240
+    assert adaptive.update("a", {"power_pv": 0}) == 300
+    assert adaptive.update("a", {"power_pv": 0}) is None
+    # Tightens back as soon as power appears
+    assert adaptive.update("a", {"power_pv": 15}) == 60
+
+
+def test_adaptive_polling_idle_when_devices_offline():
+    assert AdaptivePolling.is_idle({"power_pv": 5, "inverter_online": 0, "inverter_offline": 2})
+    assert AdaptivePolling.is_idle({"gateway_online": 0, "gateway_offline": 1})
+    assert not AdaptivePolling.is_idle({"power_pv": 5, "inverter_online": 1, "inverter_offline": 1})
+    assert not AdaptivePolling.is_idle({})
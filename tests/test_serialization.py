@@ -0,0 +1,65 @@
+import logging
+import pytest
+from hyponcloud2mqtt import serialization
+from hyponcloud2mqtt.mqtt_client import MqttClient
+
+PAYLOAD = {"power_pv": 1200, "percent": 2.5, "name": "Toit sud", "ok": True, "none": None}
+
+
+@pytest.fixture(autouse=True)
+def restore_backend():
+    backend = serialization.backend()
+    yield
+    serialization.use(backend.name)
+
+
+@pytest.mark.parametrize("name", list(serialization.available_backends()))
+def test_backends_round_trip_to_bytes(name):
+    backend = serialization.use(name)
+
+    encoded = serialization.dumps(PAYLOAD)
+
+    assert backend.name == name
+    assert isinstance(encoded, bytes)
+    assert serialization.loads(encoded) == PAYLOAD
+    assert serialization.loads(encoded.decode()) == PAYLOAD
+    with pytest.raises(ValueError):
+        serialization.loads(b"<html>Bad gateway</html>")
+    with pytest.raises(TypeError):
+        serialization.dumps({"value": object()})
+
+
+def test_auto_prefers_fastest_installed_backend():
+    assert serialization.use("auto").name == next(iter(serialization.available_backends()))
+    assert "json" in serialization.available_backends()
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(RuntimeError, match="not installed"):
+        serialization.use("simdjson")
+
+
+def test_dry_run_logs_compact_payload_unless_debug(caplog):
+    client = MqttClient("broker", 1883, "topic", "availability_topic", dry_run=True)
+
+    with caplog.at_level(logging.INFO, logger="hyponcloud2mqtt.mqtt_client"):
+        assert client.publish(PAYLOAD, topic="hypon/1")
+    assert "\n" not in caplog.records[-1].getMessage()
+    assert '"power_pv"' in caplog.records[-1].getMessage()
+
+    caplog.clear()
+    with caplog.at_level(logging.DEBUG, logger="hyponcloud2mqtt.mqtt_client"):
+        client.publish(PAYLOAD, topic="hypon/1")
+    assert '\n  "power_pv": 1200' in caplog.records[-1].getMessage()
+
+
+def test_write_json_file_replaces_atomically(tmp_path):
+    path = tmp_path / "state.json"
+    serialization.write_json_file(str(path), {"b": 1, "a": 2}, sort_keys=True)
+    assert path.read_text() == '{"a": 2, "b": 1}'
+
+    # A failed write keeps the previous file and leaves no temporary file behind
+    with pytest.raises(TypeError):
+        serialization.write_json_file(str(path), {"a": object()})
+    assert path.read_text() == '{"a": 2, "b": 1}'
+    assert [p.name for p in tmp_path.iterdir()] == ["state.json"]
@@ -0,0 +1,155 @@
+import json
+import socket
+import threading
+import time
+from unittest.mock import MagicMock, patch
+import pytest
+from benchmarks.fake_api import FakeHyponApi
+from benchmarks.mqtt_sink import MqttSink
+from hyponcloud2mqtt import metrics
+from hyponcloud2mqtt.config import Config
+from hyponcloud2mqtt.health_server import HealthContext, HealthHTTPHandler, HealthServer
+from hyponcloud2mqtt.supervisor import Supervisor, SupervisorHealthContext, merge_metrics, partition
+
+SYSTEM_IDS = [f"plant_{i}" for i in range(100)]
+
+
+def make_config(**kwargs):
+    defaults = dict(
+        http_url="http://mock.url",
+        system_ids=list(SYSTEM_IDS),
+        http_interval=60,
+        mqtt_broker="localhost",
+        mqtt_port=1883,
+        mqtt_topic="hypon",
+        mqtt_availability_topic="hypon/status",
+        worker_processes=4,
+    )
+    defaults.update(kwargs)
+    return Config(**defaults)
+
+
+def test_partition_by_count_makes_equal_contiguous_shards():
+    shards = partition(SYSTEM_IDS[:10], 3, "count")
+    assert shards == [SYSTEM_IDS[0:4], SYSTEM_IDS[4:7], SYSTEM_IDS[7:10]]
+
+
+def test_partition_by_hash_is_consistent():
+    shards = partition(SYSTEM_IDS, 4, "hash")
+    assert sorted(sum(shards, [])) == sorted(SYSTEM_IDS)
+    assert all(shards)
+
+    # Adding a worker only moves systems to the new worker
+    grown = partition(SYSTEM_IDS, 5, "hash")
+    for index in range(4):
+        assert set(grown[index]) <= set(shards[index])
+
+
+def test_worker_config_derives_client_id_and_port():
+    with patch("signal.signal"):
+        supervisor = Supervisor(make_config(
+            mqtt_client_id="hypon", health_port=9000, ha_discovery_state_path="/data/discovery.json",
+            capture_path="/data/capture.jsonl.gz", outbox_path="/data/outbox.db"))
+
+    config = supervisor.worker_config(2)
+
+    assert config.system_ids == supervisor.shards[2]
+    assert config.mqtt_client_id == "hypon-2"
+    assert (config.health_host, config.health_port) == ("127.0.0.1", 9003)
+    assert config.worker_processes == 1
+    assert config.ha_discovery_state_path == "/data/discovery.json.2"
+    assert config.capture_path == "/data/capture.jsonl.gz.2"
+    assert config.outbox_path == "/data/outbox.db.2"
+    # Unlike state files, the token cache is shared
+    assert config.token_cache_path is None
+
+
+def test_merge_metrics_adds_worker_label():
+    exposition = (
+        "# HELP hypon_requests_total Requests\n"
+        "# TYPE hypon_requests_total counter\n"
+        'hypon_requests_total{endpoint="monitor"} 3.0\n'
+        "# HELP hypon_inflight In flight\n"
+        "# TYPE hypon_inflight gauge\n"
+        "hypon_inflight 1.0\n")
+
+    merged = merge_metrics({"0": exposition, "1": exposition})
+
+    assert merged.count("# TYPE hypon_requests_total counter") == 1
+    assert 'hypon_requests_total{worker="1",endpoint="monitor"} 3.0' in merged
+    assert 'hypon_inflight{worker="0"} 1.0' in merged
+    # Samples stay grouped under their family
+    lines = merged.splitlines()
+    assert lines.index('hypon_requests_total{worker="1",endpoint="monitor"} 3.0') < lines.index(
+        "# HELP hypon_inflight In flight")
+
+
+@pytest.fixture
+def worker_servers():
+    # Workers expose at least one sample, even when run before any fetch test
+    metrics.SYSTEM_LAST_SUCCESS.set(1.0, system_id="1")
+    servers = []
+    for ready in (True, False):
+        mqtt_client = MagicMock(connected=True, dry_run=False)
+        context = HealthContext(mqtt_client, ["1"])
+        if ready:
+            context.record_fetch("1", True)
+        server = HealthServer(("127.0.0.1", 0), HealthHTTPHandler, context)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    yield servers
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_supervisor_health_aggregates_workers(worker_servers):
+    workers = {str(i): (server.server_address[1], True) for i, server in enumerate(worker_servers)}
+    context = SupervisorHealthContext(lambda: workers)
+
+    assert context.snapshot("readyz")[0] == 200
+    assert context.snapshot("livez")[0] == 200
+    status, body = context.health()
+    assert status == 200
+    assert set(json.loads(body)["workers"]) == {"0", "1"}
+    assert b'worker="0"' in context.metrics()
+
+
+def test_supervisor_health_fails_on_dead_worker(worker_servers):
+    workers = {"0": (worker_servers[0].server_address[1], True), "1": (1, False)}
+    context = SupervisorHealthContext(lambda: workers)
+
+    assert context.snapshot("livez")[0] == 503
+    assert context.snapshot("readyz")[0] == 200
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_supervisor_runs_each_shard_in_its_own_process():
+    with FakeHyponApi() as api, MqttSink() as sink:
+        config = make_config(
+            http_url=api.url, system_ids=["a", "b", "c", "d"], worker_processes=2,
+            mqtt_broker="127.0.0.1", mqtt_port=sink.port, api_username="user", api_password="pass",
+            ha_discovery_enabled=False, health_port=_free_port())
+        with patch("signal.signal"):
+            supervisor = Supervisor(config)
+        thread = threading.Thread(target=supervisor.run)
+        thread.start()
+        try:
+            deadline = time.monotonic() + 30
+            expected = {f"hypon/{system_id}" for system_id in config.system_ids}
+            while not expected <= set(sink.stats.topic_counts()) and time.monotonic() < deadline:
+                time.sleep(0.1)
+        finally:
+            supervisor.running = False
+            thread.join(timeout=60)
+
+    assert expected <= set(sink.stats.topic_counts())
+    assert not any(process.is_alive() for process in supervisor._processes.values())
+    # The workers share one login through the token cache, removed on stop
+    assert api.stats.logins == 1
+    assert supervisor.token_cache_path is None
@@ -0,0 +1,78 @@
+import importlib.util
+import socket
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from unittest.mock import MagicMock
+from benchmarks.fake_api import FakeHyponApi
+from hyponcloud2mqtt import transport
+from hyponcloud2mqtt.transport import HttpxAdapter, build_adapter
+
+needs_httpx = pytest.mark.skipif(transport.httpx is None, reason="httpx is not installed")
+HAS_H2 = importlib.util.find_spec("h2") is not None
+
+
+def make_config(**kwargs):
+    config = MagicMock()
+    config.verify_ssl = True
+    config.http_pool_connections = 4
+    config.http_retries = 3
+    config.http_retry_backoff = 0.25
+    config.http2 = False
+    config.capture_path = None
+    config.replay_path = None
+    for key, value in kwargs.items():
+        setattr(config, key, value)
+    return config
+
+
+def test_default_adapter_retries_connection_errors_only():
+    adapter = build_adapter(make_config(), pool_maxsize=24)
+
+    assert isinstance(adapter, HTTPAdapter)
+    assert adapter._pool_connections == 4
+    assert adapter._pool_maxsize == 24
+    retry = adapter.max_retries
+    assert (retry.total, retry.connect, retry.read, retry.status) == (3, 3, 0, 0)
+    assert retry.backoff_factor == 0.25
+
+
+@needs_httpx
+@pytest.mark.skipif(HAS_H2, reason="h2 is installed")
+def test_http2_without_h2_is_a_configuration_error():
+    with pytest.raises(RuntimeError, match="http2"):
+        build_adapter(make_config(http2=True), pool_maxsize=10)
+
+
+@needs_httpx
+@pytest.mark.skipif(not HAS_H2, reason="h2 is not installed")
+def test_http2_uses_httpx_adapter():
+    assert isinstance(build_adapter(make_config(http2=True), pool_maxsize=10), HttpxAdapter)
+
+
+@needs_httpx
+def test_httpx_adapter_serves_requests_session():
+    session = requests.Session()
+    session.mount("http://", HttpxAdapter(http2=False))
+    with FakeHyponApi() as api:
+        response = session.get(f"{api.url}/plant/1/status", timeout=(5, 5))
+        missing = session.get(f"{api.url}/unknown", timeout=5)
+
+    assert response.status_code == 200
+    assert response.json()["code"] == 20000
+    assert response.headers["content-type"] == "application/json"
+    assert missing.status_code == 404
+    with pytest.raises(requests.HTTPError):
+        missing.raise_for_status()
+
+
+@needs_httpx
+def test_httpx_adapter_maps_connection_errors():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    session = requests.Session()
+    session.mount("http://", HttpxAdapter(http2=False))
+
+    with pytest.raises(requests.ConnectionError):
+        session.get(f"http://127.0.0.1:{port}/plant/1/status", timeout=(1, 1))
@@ -0,0 +1,63 @@
+import threading
+from hyponcloud2mqtt.worker_pool import WorkerPool
+
+
+def test_submit_returns_result():
+    pool = WorkerPool(2)
+    try:
+        assert pool.submit(lambda a, b: a + b, 1, 2).result(timeout=1) == 3
+    finally:
+        pool.shutdown()
+
+
+def test_stats_report_busy_workers_and_queue_depth():
+    pool = WorkerPool(2)
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def task():
+        started.release()
+        release.wait(timeout=5)
+
+    try:
+        futures = [pool.submit(task) for _ in range(5)]
+        started.acquire(timeout=1)
+        started.acquire(timeout=1)
+
+        assert pool.stats() == {
+            "max_workers": 2, "busy_workers": 2, "queue_depth": 3}
+
+        release.set()
+        for future in futures:
+            future.result(timeout=1)
+
+        assert pool.busy_workers == 0
+        assert pool.queue_depth == 0
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_threads_are_reused_across_calls():
+    pool = WorkerPool(1)
+    try:
+        names = {pool.submit(lambda: threading.current_thread().name).result(timeout=1)
+                 for _ in range(5)}
+        assert len(names) == 1
+    finally:
+        pool.shutdown()
+
+
+def test_failing_task_releases_counters():
+    pool = WorkerPool(1)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    try:
+        future = pool.submit(fail)
+        assert isinstance(future.exception(timeout=1), RuntimeError)
+        assert pool.stats()["busy_workers"] == 0
+        assert pool.stats()["queue_depth"] == 0
+    finally:
+        pool.shutdown()